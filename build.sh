@@ -3,3 +3,4 @@ set -o errexit
 pip install -r requirements.txt
 python manage.py collectstatic --no-input
 python manage.py migrate
+# Caches are warmed by start.sh, on the instance that serves them
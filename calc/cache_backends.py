@@ -0,0 +1,106 @@
+# calc/cache_backends.py
+"""
+FileBasedCache for the workers of one host, with the guarantees the fill
+locks (quote_cache), circuit breakers and rate-limit buckets rely on:
+
+- add() and incr()/decr() are atomic across processes: each runs under a
+  file lock, one of LOCK_STRIPES picked by the key's file name. incr()
+  keeps the entry's expiry instead of resetting it to the default timeout.
+- Culling looks at the directory at most every CULL_INTERVAL seconds per
+  process instead of on every set, so MAX_ENTRIES can be overshot for that
+  long. It drops expired entries first, then those closest to expiring;
+  entries stored without a timeout (instrument and tier versions, open
+  breakers) are never culled.
+
+The guarantees stop at the host's disk: workers on several hosts must share
+a networked cache instead (REDIS_URL in settings).
+"""
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.move import file_move_safe
+from .file_locks import file_lock
+
+LOCK_STRIPES = 64
+CULL_INTERVAL = 60
+
+
+class HostFileCache(FileBasedCache):
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._lock_dir = os.path.join(self._dir, 'locks')
+        self._culled_at = 0.0
+
+    def _file_lock(self, fname):
+        stripe = int(os.path.basename(fname)[:8], 16) % LOCK_STRIPES
+        os.makedirs(self._lock_dir, 0o700, exist_ok=True)
+        return file_lock(os.path.join(self._lock_dir, f'{stripe}.lock'))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._file_lock(self._key_to_file(key, version)):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        with self._file_lock(fname):
+            try:
+                with open(fname, 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except (FileNotFoundError, EOFError):
+                value = None
+            if value is None or (expiry is not None and expiry < time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            self._replace(fname, expiry, value)
+        return value
+
+    def _replace(self, fname, expiry, value):
+        """Write value with an absolute expiry, as set() does with a timeout"""
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        renamed = False
+        try:
+            with open(fd, 'wb') as f:
+                f.write(pickle.dumps(expiry, self.pickle_protocol))
+                f.write(zlib.compress(pickle.dumps(value, self.pickle_protocol)))
+            file_move_safe(tmp_path, fname, allow_overwrite=True)
+            renamed = True
+        finally:
+            if not renamed:
+                os.remove(tmp_path)
+
+    def _cull(self):
+        now = time.monotonic()
+        if now - self._culled_at < CULL_INTERVAL:
+            return
+        self._culled_at = now
+
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+
+        expiring = []
+        for fname in filelist:
+            try:
+                with open(fname, 'rb') as f:
+                    expiry = pickle.load(f)
+            except FileNotFoundError:
+                continue
+            except Exception:
+                expiry = 0  # Unreadable: cull it first
+            if expiry is not None:
+                expiring.append((expiry, fname))
+        expiring.sort()
+
+        wall_time = time.time()
+        culled = 0
+        target = len(filelist) // self._cull_frequency if self._cull_frequency else len(filelist)
+        for expiry, fname in expiring:
+            if expiry >= wall_time and culled >= target:
+                break
+            culled += self._delete(fname)
@@ -0,0 +1,158 @@
+# calc/cache_codecs.py
+"""
+Compact binary forms of the values kept in the shared cache, used by
+tiered_cache for the namespaces listed in CODECS. The cache layer encodes on
+write and decodes on read, so callers keep working with plain dicts/tuples.
+
+encode() returns None for a value outside the fixed schema; it is then
+stored as is. decode() returns None for a payload it cannot read (older
+format, other instrument version), which the cache treats as a miss.
+"""
+import math
+import struct
+from datetime import datetime, timezone
+from . import search_index
+
+QUOTE_FORMAT = 1
+SEARCH_FORMAT = 1
+
+# Interned strings, written as their position: only ever append to these
+SYMBOL_TYPES = ('stock', 'index')
+DATA_SOURCES = ('nse', 'nse_bulk', 'yahoo', 'current_estimates', 'snapshot')
+MATCH_MODES = ('exact', 'fuzzy')
+
+QUOTE_FIELDS = frozenset((
+    'symbol', 'company_name', 'last_price', 'change', 'change_amount', 'change_percent',
+    'volume', 'market_cap', 'quote_time', 'success', 'data_source', 'type',
+))
+
+# format, type id, source id, flags, last_price, change, change_amount,
+# change_percent, market_cap, quote_time, fetched_at, volume,
+# symbol length, company name length; then the UTF-8 strings
+QUOTE_HEADER = struct.Struct('<BBBBdddddddqBH')
+NAME_IS_SYMBOL = 1
+
+# format, match mode, instrument version, hit count
+SEARCH_HEADER = struct.Struct('<BBqH')
+# search index entry id, priority, score x 1000 (NO_SCORE when unscored)
+SEARCH_HIT = struct.Struct('<IBH')
+NO_SCORE = 0xFFFF
+
+
+class QuoteEntryCodec:
+    """{'quote': <provider schema quote>, 'fetched_at': epoch} in about 100 bytes"""
+
+    def encode(self, entry):
+        quote = entry.get('quote') if isinstance(entry, dict) else None
+        if (not isinstance(quote, dict) or set(quote) != QUOTE_FIELDS or quote['success'] is not True
+                or quote['type'] not in SYMBOL_TYPES or quote['data_source'] not in DATA_SOURCES):
+            return None
+        quote_time = quote['quote_time']
+        if quote_time is None:
+            quote_time = math.nan
+        elif isinstance(quote_time, datetime) and quote_time.tzinfo is not None:
+            quote_time = quote_time.timestamp()
+        else:
+            # Naive or non-datetime times would not come back identical
+            return None
+
+        symbol = quote['symbol'].encode('utf-8')
+        flags = 0
+        name = b''
+        if quote['company_name'] == quote['symbol']:
+            flags |= NAME_IS_SYMBOL
+        else:
+            name = quote['company_name'].encode('utf-8')
+        if len(symbol) > 0xFF or len(name) > 0xFFFF:
+            return None
+
+        try:
+            header = QUOTE_HEADER.pack(
+                QUOTE_FORMAT, SYMBOL_TYPES.index(quote['type']), DATA_SOURCES.index(quote['data_source']), flags,
+                quote['last_price'], quote['change'], quote['change_amount'], quote['change_percent'],
+                quote['market_cap'] or 0, quote_time, entry['fetched_at'], quote['volume'] or 0,
+                len(symbol), len(name),
+            )
+        except (struct.error, TypeError, KeyError):
+            return None
+        return header + symbol + name
+
+    def decode(self, payload):
+        try:
+            (version, type_id, source_id, flags, last_price, change, change_amount, change_percent,
+             market_cap, quote_time, fetched_at, volume, symbol_size, name_size) = QUOTE_HEADER.unpack_from(payload)
+        except struct.error:
+            return None
+        if version != QUOTE_FORMAT:
+            return None
+
+        position = QUOTE_HEADER.size
+        symbol = payload[position:position + symbol_size].decode('utf-8')
+        position += symbol_size
+        name = symbol if flags & NAME_IS_SYMBOL else payload[position:position + name_size].decode('utf-8')
+        return {
+            'quote': {
+                'symbol': symbol,
+                'company_name': name,
+                'last_price': last_price,
+                'change': change,
+                'change_amount': change_amount,
+                'change_percent': change_percent,
+                'volume': volume,
+                'market_cap': int(market_cap) if market_cap.is_integer() else market_cap,
+                'quote_time': None if math.isnan(quote_time) else datetime.fromtimestamp(quote_time, timezone.utc),
+                'success': True,
+                'data_source': DATA_SOURCES[source_id],
+                'type': SYMBOL_TYPES[type_id],
+            },
+            'fetched_at': fetched_at,
+        }
+
+
+class SearchHitsCodec:
+    """
+    (hits, match_mode) from the search index as 7 bytes per hit: each hit is
+    its entry id in the index of the same instrument version, so symbols,
+    names and tickers are never copied into the cache.
+    """
+
+    def encode(self, value):
+        hits, match_mode = value
+        index, version = search_index.current_index()
+        if index is None or match_mode not in MATCH_MODES or not isinstance(version, int):
+            return None
+
+        parts = [SEARCH_HEADER.pack(SEARCH_FORMAT, MATCH_MODES.index(match_mode), version, len(hits))]
+        for hit in hits:
+            entry_id = index.entry_id(hit.symbol, hit.kind)
+            if entry_id is None:
+                return None
+            score = NO_SCORE if hit.score is None else round(hit.score * 1000)
+            parts.append(SEARCH_HIT.pack(entry_id, hit.priority, score))
+        return b''.join(parts)
+
+    def decode(self, payload):
+        try:
+            fmt, mode_id, version, count = SEARCH_HEADER.unpack_from(payload)
+        except struct.error:
+            return None
+        index, current_version = search_index.current_index()
+        if fmt != SEARCH_FORMAT or index is None or version != current_version:
+            return None
+
+        try:
+            hits = [
+                index.hit(entry_id, priority, None if score == NO_SCORE else score / 1000)
+                for entry_id, priority, score in SEARCH_HIT.iter_unpack(payload[SEARCH_HEADER.size:])
+            ]
+        except (struct.error, IndexError):
+            return None
+        if len(hits) != count:
+            return None
+        return hits, MATCH_MODES[mode_id]
+
+
+CODECS = {
+    'quotes': QuoteEntryCodec(),
+    'search': SearchHitsCodec(),
+}
@@ -0,0 +1,26 @@
+# calc/cache_locks.py
+"""
+Locks kept in the shared cache. A lock's value is a random token, so a
+caller only ever releases the lock it acquired, never one that another
+worker took after ours expired.
+"""
+import uuid
+from django.core.cache import cache
+
+
+def acquire_lock(key, timeout):
+    """Token if key was free and is now held for timeout seconds, else None"""
+    token = uuid.uuid4().hex
+    return token if cache.add(key, token, timeout) else None
+
+
+def release_lock(key, token):
+    """Release key if it still holds token (a None token is a no-op)"""
+    # Between the get and the delete the lock can only change hands if it
+    # expired, i.e. its holder already overran the lock timeout
+    if token is not None and cache.get(key) == token:
+        cache.delete(key)
+
+
+def lock_held(key):
+    return cache.get(key) is not None
@@ -0,0 +1,221 @@
+# calc/cache_persistence.py
+"""
+Carry caches over restarts: the cached quotes, the search index and the
+search demand counters are written to CACHE_PERSIST_DIR periodically and at
+shutdown, and loaded back when a worker boots (see wsgi.py) and by
+warm_caches before the server starts (start.sh), so a fresh container starts
+warm instead of refetching everything from the providers. The directory has
+to outlive the container for that, e.g. a mounted disk.
+
+Every worker loads, but only one process per host saves: the first to take
+the saver lock in CACHE_PERSIST_DIR keeps it until it exits, and the others
+only take over if it dies.
+
+Quotes are copied as stored in the shared cache (their cache_codecs form)
+and restored with their remaining TTL; quotes past their hard TTL are
+dropped. The search index is reused only if it was built from exactly the
+current universe.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from .cache_codecs import CODECS
+from .file_locks import file_lock
+from .instruments import get_universe
+from .quote_cache import quote_cache_key, quote_ttls
+from .refresh import restore_search_demand, search_counts
+from .search_index import StockSearchIndex, current_index, get_search_index
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+QUOTES_FILE = 'quotes.bin'
+SEARCH_INDEX_FILE = 'search_index.pickle'
+SAVER_LOCK_FILE = 'saver.lock'
+
+# Seconds between periodic saves; 0 saves only at shutdown
+DEFAULT_PERSIST_INTERVAL = 300
+
+
+def persist_dir():
+    return Path(getattr(settings, 'CACHE_PERSIST_DIR', Path(tempfile.gettempdir()) / 'rm_calc_cache'))
+
+
+def _universe_fingerprint(universe):
+    digest = hashlib.sha1()
+    for mapping in (universe.stocks, universe.indices):
+        for key, value in mapping.items():
+            digest.update(f'{key}\0{value}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _write(path, data):
+    """Pickle data to path atomically, as write_snapshot does"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read(path):
+    # Only ever files this module wrote into the app's own persist dir
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache file {path}: {str(e)}")
+        return None
+    if not isinstance(data, dict) or data.get('format') != FORMAT_VERSION:
+        return None
+    return data
+
+
+def _universe_pairs(universe):
+    return [(symbol, 'stock') for symbol in universe.stocks] + [(ticker, 'index') for ticker in universe.indices.values()]
+
+
+def save_caches(directory=None):
+    """Write the cached quotes, search index and demand counters; returns the number of quotes saved"""
+    directory = Path(directory or persist_dir())
+    universe = get_universe()
+    pairs = _universe_pairs(universe)
+
+    # Straight from the shared cache, so nothing is re-encoded and the
+    # tiers' hit counters only count real lookups
+    keys = {quote_cache_key(symbol, asset_type): asset_type for symbol, asset_type in pairs}
+    quotes = {key: (keys[key], stored) for key, stored in cache.get_many(list(keys)).items()}
+
+    _write(directory / QUOTES_FILE, {
+        'format': FORMAT_VERSION,
+        'saved_at': time.time(),
+        'quotes': quotes,
+        'search_demand': search_counts(universe.stocks),
+    })
+
+    index, version = current_index()
+    if index is not None and version == universe.version:
+        _write(directory / SEARCH_INDEX_FILE, {
+            'format': FORMAT_VERSION,
+            'fingerprint': _universe_fingerprint(universe),
+            'index': index,
+        })
+    return len(quotes)
+
+
+def load_caches(directory=None):
+    """
+    Restore what save_caches wrote, without overwriting anything already in
+    the shared cache. Returns {'quotes': restored, 'search_index': reused}.
+    """
+    directory = Path(directory or persist_dir())
+    restored = {'quotes': 0, 'search_index': False}
+
+    data = _read(directory / QUOTES_FILE)
+    if data is not None:
+        codec = CODECS['quotes']
+        now = time.time()
+        present = cache.get_many(list(data['quotes']))
+        for key, (asset_type, stored) in data['quotes'].items():
+            if key in present:
+                continue
+            entry = codec.decode(stored) if isinstance(stored, bytes) else stored
+            if entry is None:
+                continue
+            remaining = int(quote_ttls(asset_type)[1] - (now - entry['fetched_at']))
+            if remaining > 0:
+                cache.add(key, stored, remaining)
+                restored['quotes'] += 1
+        restore_search_demand(data.get('search_demand', {}))
+
+    data = _read(directory / SEARCH_INDEX_FILE)
+    if data is not None and isinstance(data.get('index'), StockSearchIndex):
+        universe = get_universe()
+        if data['fingerprint'] == _universe_fingerprint(universe):
+            get_search_index(lambda: data['index'], version=universe.version)
+            restored['search_index'] = True
+    return restored
+
+
+def _save_quietly():
+    try:
+        save_caches()
+    except Exception as e:
+        logger.warning(f"Cache persistence failed: {str(e)}")
+
+
+def _save_periodically(interval, stop):
+    """
+    Become the host's saver as soon as the lock is free, then save every
+    interval seconds (only once at shutdown if interval is 0) until stop
+    """
+    directory = persist_dir()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Cache persistence disabled, {directory} is not writable: {str(e)}")
+        return
+    retry = interval or DEFAULT_PERSIST_INTERVAL
+    while True:
+        with file_lock(directory / SAVER_LOCK_FILE, blocking=False) as saver:
+            if saver:
+                while not stop.wait(interval or None):
+                    _save_quietly()
+                _save_quietly()
+                return
+        if stop.wait(retry):
+            return
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def start():
+    """
+    Worker boot: load the persisted caches, and save them every
+    CACHE_PERSIST_INTERVAL seconds and at interpreter exit if this process
+    is the host's saver. Idempotent.
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+    try:
+        restored = load_caches()
+        logger.info(
+            f"Restored {restored['quotes']} cached quotes"
+            f"{' and the search index' if restored['search_index'] else ''}"
+        )
+    except Exception as e:
+        logger.warning(f"Could not restore persisted caches: {str(e)}")
+
+    interval = getattr(settings, 'CACHE_PERSIST_INTERVAL', DEFAULT_PERSIST_INTERVAL)
+    stop = threading.Event()
+    saver = threading.Thread(
+        target=_save_periodically, args=(interval, stop), name='cache-persist', daemon=True
+    )
+    saver.start()
+
+    def _stop():
+        # The saver writes once more on its way out
+        stop.set()
+        saver.join(timeout=30)
+
+    atexit.register(_stop)
@@ -0,0 +1,131 @@
+# calc/circuit_breaker.py
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .rate_limiter import throttle
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# failure_threshold failures within failure_window seconds open the circuit;
+# after recovery_timeout seconds one probe request is let through (half-open),
+# and its outcome closes the circuit or opens it for another round.
+# Override per breaker name (or 'default') with CIRCUIT_BREAKERS in settings.
+DEFAULT_BREAKER_CONFIG = {
+    'failure_threshold': 5,
+    'failure_window': 60,
+    'recovery_timeout': 30,
+}
+
+# Responses that mean the endpoint is refusing us, not that a symbol is unknown
+FAILURE_STATUSES = {401, 403, 429}
+
+
+class CircuitOpenError(Exception):
+    """The endpoint's circuit is open; the request was not sent"""
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker whose state lives in the shared cache, so
+    every worker process trips and recovers together.
+    """
+
+    def __init__(self, name, failure_threshold=5, failure_window=60, recovery_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.recovery_timeout = recovery_timeout
+        self.opened_key = f'breaker:{name}:opened_at'
+        self.failures_key = f'breaker:{name}:failures'
+        self.probe_key = f'breaker:{name}:probe'
+
+    def state(self):
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return CLOSED
+        if time.time() - opened_at < self.recovery_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def allow(self):
+        """True if a request may go out now"""
+        state = self.state()
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        # Half-open: one probe per recovery period across all workers
+        return cache.add(self.probe_key, 1, self.recovery_timeout)
+
+    def record_success(self):
+        # One round trip on the common path; only write when there is state to clear
+        if cache.get_many([self.opened_key, self.failures_key]):
+            cache.delete_many([self.opened_key, self.failures_key, self.probe_key])
+
+    def record_failure(self):
+        if cache.get(self.opened_key) is not None:
+            # A failed half-open probe: open for another recovery period
+            cache.set(self.opened_key, time.time(), None)
+            cache.delete(self.probe_key)
+            return
+        cache.add(self.failures_key, 0, self.failure_window)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            # The window expired between add and incr
+            cache.add(self.failures_key, 1, self.failure_window)
+            failures = 1
+        if failures >= self.failure_threshold:
+            cache.set(self.opened_key, time.time(), None)
+            cache.delete(self.failures_key)
+
+    def report(self):
+        return {'state': self.state(), 'failures': cache.get(self.failures_key, 0)}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Breaker for an endpoint ('provider:endpoint'), configured from CIRCUIT_BREAKERS"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                overrides = getattr(settings, 'CIRCUIT_BREAKERS', {})
+                config = {**DEFAULT_BREAKER_CONFIG, **overrides.get('default', {}), **overrides.get(name, {})}
+                breaker = _breakers[name] = CircuitBreaker(name, **config)
+    return breaker
+
+
+def guarded_get(session, breaker_name, url, **kwargs):
+    """
+    session.get(url) behind the named breaker and the provider's shared rate
+    limit (the part of the name before ':'). Raises CircuitOpenError without
+    sending anything while the circuit is open; timeouts, connection errors,
+    5xx and FAILURE_STATUSES count as failures. Interactive callers wait at
+    most the request timeout for a rate-limit token.
+    """
+    breaker = get_breaker(breaker_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit {breaker_name} is open")
+    throttle(breaker_name.split(':')[0], timeout=kwargs.get('timeout'))
+    try:
+        response = session.get(url, **kwargs)
+    except Exception:
+        breaker.record_failure()
+        raise
+    _record(breaker, response.status_code)
+    return response
+
+
+def _record(breaker, status_code):
+    if status_code in FAILURE_STATUSES or status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
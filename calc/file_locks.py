@@ -0,0 +1,62 @@
+# calc/file_locks.py
+"""
+Exclusive locks between the processes of one host, on a lock file.
+
+Uses fcntl.flock where the platform has it: the kernel releases the lock if
+its holder dies. Elsewhere the lock is the lock file itself, created with
+O_EXCL and removed on release; a crashed holder leaves it behind, so a lock
+file older than stale_after seconds is taken over.
+"""
+import contextlib
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX (Windows)
+    fcntl = None
+
+STALE_AFTER = 60
+POLL_INTERVAL = 0.01
+
+
+@contextlib.contextmanager
+def file_lock(path, blocking=True, stale_after=STALE_AFTER):
+    """
+    Hold the lock on path for the with block. Yields True once held; with
+    blocking=False yields False right away if another process holds it.
+    """
+    path = os.fspath(path)
+    if fcntl is not None:
+        with open(path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return
+
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale_after:
+                    os.unlink(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if not blocking:
+                yield False
+                return
+            time.sleep(POLL_INTERVAL)
+    try:
+        yield True
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
@@ -0,0 +1,89 @@
+# calc/http_client.py
+import atexit
+import threading
+from urllib.parse import urlsplit
+import httpx
+from django.conf import settings
+from . import http_replay
+
+try:
+    import h2  # noqa: F401 -- enables HTTP/2 in httpx
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# Connection pool per host: at most max_connections open, max_keepalive_connections
+# kept warm for keepalive_expiry seconds. Override per host (or 'default')
+# with HTTP_POOL_LIMITS in settings.
+DEFAULT_POOL_LIMITS = {
+    'max_connections': 10,
+    'max_keepalive_connections': 5,
+    'keepalive_expiry': 30,
+}
+
+DEFAULT_TIMEOUT = 10
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _host(url):
+    return urlsplit(url).netloc.lower()
+
+
+def _client_options(host):
+    overrides = getattr(settings, 'HTTP_POOL_LIMITS', {})
+    limits = {**DEFAULT_POOL_LIMITS, **overrides.get('default', {}), **overrides.get(host, {})}
+    # httpx negotiates gzip/deflate, and brotli when the brotli package is installed
+    return {
+        'http2': HTTP2,
+        'limits': httpx.Limits(**limits),
+        'timeout': DEFAULT_TIMEOUT,
+        'follow_redirects': True,
+    }
+
+
+def get_client(url):
+    """Shared sync client for url's host; thread safe, cookies persist per host"""
+    host = _host(url)
+    client = _clients.get(host)
+    if client is None:
+        with _lock:
+            client = _clients.get(host)
+            if client is None:
+                client = _clients[host] = httpx.Client(**_client_options(host))
+    return client
+
+
+def fetch(url, *, headers=None, params=None, timeout=DEFAULT_TIMEOUT):
+    """GET url over the shared pool; each phase (connect, read, ...) gets timeout seconds"""
+    return http_replay.intercept(
+        url, params,
+        lambda: get_client(url).get(url, headers=headers, params=params, timeout=timeout),
+    )
+
+
+class PooledSession:
+    """
+    Drop-in for the requests.Session the fetchers used: same .headers and
+    .get(url, timeout=...), served from the shared per-host pools. Responses
+    are httpx.Response (status_code, json(), text, headers).
+    """
+
+    def __init__(self):
+        self.headers = {}
+
+    def get(self, url, params=None, headers=None, timeout=DEFAULT_TIMEOUT):
+        return fetch(url, headers={**self.headers, **(headers or {})}, params=params, timeout=timeout)
+
+
+def close_clients():
+    """Close the sync pools"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_clients)
@@ -0,0 +1,163 @@
+# calc/http_replay.py
+"""
+Record/replay for upstream calls, so fetch paths can be benchmarked and
+regression-tested without network access.
+
+mode 'record' passes calls through and saves every response under
+fixtures_dir; mode 'replay' serves the saved responses instead of calling
+out, after `latency` (+/- `jitter`) seconds, failing `error_rate` of the
+calls: with HTTP status `error_status` if set, else as a connection error.
+Configure with HTTP_REPLAY in settings (or configure() from a command).
+"""
+import hashlib
+import json
+import pickle
+import random
+import threading
+import time
+from pathlib import Path
+import httpx
+from django.conf import settings
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+DEFAULT_REPLAY_CONFIG = {
+    'mode': None,
+    'fixtures_dir': 'fixtures/http',
+    'latency': 0.0,
+    'jitter': 0.0,
+    'error_rate': 0.0,
+    'error_status': None,
+}
+
+_config = None
+_config_lock = threading.Lock()
+
+
+class FixtureMissingError(httpx.ConnectError):
+    """Replay mode found no recorded response; behaves like the host being unreachable"""
+
+
+def get_config():
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = {**DEFAULT_REPLAY_CONFIG, **getattr(settings, 'HTTP_REPLAY', {})}
+    return _config
+
+
+def configure(**overrides):
+    """Override the settings for this process, e.g. configure(mode='replay', latency=0.2)"""
+    global _config
+    base = get_config()
+    with _config_lock:
+        _config = {**base, **overrides}
+
+
+def mode():
+    return get_config()['mode']
+
+
+def _fixture_path(kind, host, key, suffix):
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+    return Path(get_config()['fixtures_dir']) / kind / host / f'{digest}{suffix}'
+
+
+def _request_key(url, params):
+    return json.dumps([url, sorted((params or {}).items())], default=str)
+
+
+def _injected_delay():
+    config = get_config()
+    return max(config['latency'] + random.uniform(-config['jitter'], config['jitter']), 0)
+
+
+def _injected_failure(url):
+    """Response (or exception) standing in for a failed call, or None to serve the fixture"""
+    config = get_config()
+    if random.random() >= config['error_rate']:
+        return None
+    request = httpx.Request('GET', url)
+    if config['error_status']:
+        return httpx.Response(config['error_status'], request=request)
+    return httpx.ConnectError('Injected failure', request=request)
+
+
+def _save_response(url, params, response):
+    path = _fixture_path('http', httpx.URL(url).host, _request_key(url, params), '.json')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'url': url,
+        'params': params,
+        'status_code': response.status_code,
+        'headers': {'content-type': response.headers.get('content-type', '')},
+        'body': response.text,
+        'recorded_at': time.time(),
+    }))
+
+
+def _load_response(url, params):
+    path = _fixture_path('http', httpx.URL(url).host, _request_key(url, params), '.json')
+    if not path.exists():
+        raise FixtureMissingError(f"No recorded response for {url}", request=httpx.Request('GET', url))
+    fixture = json.loads(path.read_text())
+    return httpx.Response(
+        fixture['status_code'],
+        headers=fixture['headers'],
+        content=fixture['body'].encode('utf-8'),
+        request=httpx.Request('GET', url),
+    )
+
+
+def _replay(url, params):
+    failure = _injected_failure(url)
+    if isinstance(failure, Exception):
+        raise failure
+    return failure or _load_response(url, params)
+
+
+def intercept(url, params, send):
+    """Sync HTTP GET through the recorder: send() performs the real request"""
+    if mode() == REPLAY:
+        time.sleep(_injected_delay())
+        return _replay(url, params)
+    response = send()
+    if mode() == RECORD:
+        _save_response(url, params, response)
+    return response
+
+
+def replayable(name):
+    """
+    Record/replay a library call that does its own HTTP (yfinance). Results
+    are pickled, keyed by name and arguments; fixtures are local test data
+    written by this module, never downloaded.
+    """
+    def decorator(fn):
+        def wrapper(*args, **kwargs):
+            current = mode()
+            if current is None:
+                return fn(*args, **kwargs)
+            path = _fixture_path('calls', name, repr((args, sorted(kwargs.items()))), '.pickle')
+            if current == REPLAY:
+                time.sleep(_injected_delay())
+                failure = _injected_failure(f'https://{name}/')
+                if isinstance(failure, Exception):
+                    raise failure
+                if failure is not None:
+                    raise RuntimeError(f"Injected HTTP {failure.status_code} from {name}")
+                if not path.exists():
+                    raise FixtureMissingError(
+                        f"No recorded result for {name}", request=httpx.Request('GET', f'https://{name}/')
+                    )
+                with open(path, 'rb') as fixture:
+                    return pickle.load(fixture)
+            result = fn(*args, **kwargs)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'wb') as fixture:
+                pickle.dump(result, fixture)
+            return result
+        return wrapper
+    return decorator
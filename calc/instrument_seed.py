@@ -0,0 +1,197 @@
+# calc/instrument_seed.py
+# Built-in universe used until an exchange master file has been imported
+# (python manage.py import_instruments), and for the index list, which the
+# exchange equity master does not carry.
+
+# Index name -> yfinance ticker
+SEED_INDICES = {
+    # Broad-based Indices
+    'NIFTY': '^NSEI',
+    'NIFTY50': '^NSEI',
+    'NIFTY100': '^CNX100',
+    'NIFTY200': '^CNX200',
+    'NIFTY500': '^CNX500',
+    'NIFTY TOTAL MARKET': '^CNXTM',
+    'NIFTY NEXT 50': '^NSMIDCP',
+    'NIFTY MIDCAP 100': '^NSEMDCP50',
+    'NIFTY MIDCAP 150': '^NSEMDCP150',
+    'NIFTY SMALLCAP 100': '^NSESMLCAP',
+    'NIFTY SMALLCAP 250': '^NSESML250',
+    'NIFTY MICROCAP 250': '^NSEMIC250',
+    'NIFTY LARGEMIDCAP 250': '^NSELMC250',
+    
+    # Sectoral Indices
+    'NIFTY AUTO': '^CNXAUTO',
+    'NIFTY BANK': '^NSEBANK',
+    'NIFTY FIN SERVICE': '^CNXFINANCE',
+    'NIFTY FMCG': '^CNXFMCG',
+    'NIFTY IT': '^CNXIT',
+    'NIFTY MEDIA': '^CNXMEDIA',
+    'NIFTY METAL': '^CNXMETAL',
+    'NIFTY PHARMA': '^CNXPHARMA',
+    'NIFTY PSU BANK': '^CNXPSUBANK',
+    'NIFTY PVT BANK': '^CNXPVTBANK',
+    'NIFTY REALTY': '^CNXREALTY',
+    'NIFTY ENERGY': '^CNXENERGY',
+    'NIFTY INFRA': '^CNXINFRA',
+    'NIFTY COMMODITIES': '^CNXCOMMODITY',
+    'NIFTY CONSUMPTION': '^CNXCONSUMPTION',
+    'NIFTY CPSE': '^CNXCPSE',
+    'NIFTY INDIA CONSUMPTION': '^CNXCONSUMER',
+    'NIFTY OIL GAS': '^CNXOILGAS',
+    'NIFTY HEALTHCARE': '^CNXHEALTH',
+    'NIFTY SERVICES': '^CNXSERVICE',
+    'NIFTY MNC': '^CNXMNC',
+    'NIFTY PSE': '^CNXPSE',
+    'NIFTY SME EMERGE': '^CNXSME',
+    
+    # Thematic Indices
+    'FINNIFTY': '^NSEBANK',  # Financial Services
+    'BANKNIFTY': '^NSEBANK',
+    'NIFTY ALPHA 50': '^CNXALPHA50',
+    'NIFTY DIVIDEND OPPORTUNITIES 50': '^CNXDIV50',
+    'NIFTY GROWTH SECTORS 15': '^CNXGROWTH15',
+    'NIFTY HIGH BETA 50': '^CNXHIGHBETA50',
+    'NIFTY LOW VOLATILITY 50': '^CNXLOWVOL50',
+    'NIFTY MOMENTUM 30': '^CNXMOMENTUM30',
+    'NIFTY QUALITY 30': '^CNXQUALITY30',
+    'NIFTY VALUE 50': '^CNXVALUE50',
+    
+    # BSE Indices
+    'SENSEX': '^BSESN',
+    'BSE100': '^BSE100',
+    'BSE200': '^BSE200',
+    'BSE500': '^BSE500',
+    'BSE MIDCAP': '^BSEMID',
+    'BSE SMALLCAP': '^BSESML',
+}
+
+# NIFTY 500 symbol -> company name
+SEED_STOCKS = {
+    # NIFTY 50 Stocks
+    'ADANIENT': 'Adani Enterprises Limited',
+    'ADANIPORTS': 'Adani Ports and Special Economic Zone Limited',
+    'APOLLOHOSP': 'Apollo Hospitals Enterprise Limited',
+    'ASIANPAINT': 'Asian Paints Limited',
+    'AXISBANK': 'Axis Bank Limited',
+    'BAJAJ-AUTO': 'Bajaj Auto Limited',
+    'BAJFINANCE': 'Bajaj Finance Limited',
+    'BAJAJFINSV': 'Bajaj Finserv Limited',
+    'BPCL': 'Bharat Petroleum Corporation Limited',
+    'BHARTIARTL': 'Bharti Airtel Limited',
+    'BRITANNIA': 'Britannia Industries Limited',
+    'CIPLA': 'Cipla Limited',
+    'COALINDIA': 'Coal India Limited',
+    'DIVISLAB': 'Divi\'s Laboratories Limited',
+    'DRREDDY': 'Dr. Reddy\'s Laboratories Limited',
+    'EICHERMOT': 'Eicher Motors Limited',
+    'GRASIM': 'Grasim Industries Limited',
+    'HCLTECH': 'HCL Technologies Limited',
+    'HDFCBANK': 'HDFC Bank Limited',
+    'HDFCLIFE': 'HDFC Life Insurance Company Limited',
+    'HEROMOTOCO': 'Hero MotoCorp Limited',
+    'HINDALCO': 'Hindalco Industries Limited',
+    'HINDUNILVR': 'Hindustan Unilever Limited',
+    'ICICIBANK': 'ICICI Bank Limited',
+    'ITC': 'ITC Limited',
+    'INDUSINDBK': 'IndusInd Bank Limited',
+    'INFY': 'Infosys Limited',
+    'JSWSTEEL': 'JSW Steel Limited',
+    'KOTAKBANK': 'Kotak Mahindra Bank Limited',
+    'LT': 'Larsen & Toubro Limited',
+    'M&M': 'Mahindra & Mahindra Limited',
+    'MARUTI': 'Maruti Suzuki India Limited',
+    'NESTLEIND': 'Nestle India Limited',
+    'NTPC': 'NTPC Limited',
+    'ONGC': 'Oil and Natural Gas Corporation Limited',
+    'POWERGRID': 'Power Grid Corporation of India Limited',
+    'RELIANCE': 'Reliance Industries Limited',
+    'SBILIFE': 'SBI Life Insurance Company Limited',
+    'SHREECEM': 'Shree Cement Limited',
+    'SBIN': 'State Bank of India',
+    'SUNPHARMA': 'Sun Pharmaceutical Industries Limited',
+    'TCS': 'Tata Consultancy Services Limited',
+    'TATACONSUM': 'Tata Consumer Products Limited',
+    'TMPV': 'Tata Motors Passenger Vehicles Limited',
+    'TATASTEEL': 'Tata Steel Limited',
+    'TECHM': 'Tech Mahindra Limited',
+    'TITAN': 'Titan Company Limited',
+    'ULTRACEMCO': 'UltraTech Cement Limited',
+    'UPL': 'UPL Limited',
+    'WIPRO': 'Wipro Limited',
+    
+    # Additional popular stocks
+    'ABB': 'ABB India Limited',
+    'ACC': 'ACC Limited',
+    'AUBANK': 'AU Small Finance Bank Limited',
+    'ABBOTINDIA': 'Abbott India Limited',
+    'ADANIGREEN': 'Adani Green Energy Limited',
+    'ADANIPOWER': 'Adani Power Limited',
+    'ADANIENSOL': 'Adani Energy Solutions Limited',
+    'ATGL': 'Adani Total Gas Limited',
+    'AMBUJACEM': 'Ambuja Cements Limited',
+    'APOLLOTYRE': 'Apollo Tyres Limited',
+    'ASHOKLEY': 'Ashok Leyland Limited',
+    'AUROPHARMA': 'Aurobindo Pharma Limited',
+    'BANDHANBNK': 'Bandhan Bank Limited',
+    'BERGEPAINT': 'Berger Paints India Limited',
+    'BIOCON': 'Biocon Limited',
+    'BOSCHLTD': 'Bosch Limited',
+    'CHOLAFIN': 'Cholamandalam Investment and Finance Company Limited',
+    'COLPAL': 'Colgate Palmolive (India) Limited',
+    'CONCOR': 'Container Corporation of India Limited',
+    'COROMANDEL': 'Coromandel International Limited',
+    'DABUR': 'Dabur India Limited',
+    'DLF': 'DLF Limited',
+    'DMART': 'Avenue Supermarts Limited',
+    'FEDERALBNK': 'Federal Bank Limited',
+    'GAIL': 'GAIL (India) Limited',
+    'GLAND': 'Gland Pharma Limited',
+    'GMRAIRPORT': 'GMR Airports Limited',
+    'GODREJCP': 'Godrej Consumer Products Limited',
+    'GODREJPROP': 'Godrej Properties Limited',
+    'HAVELLS': 'Havells India Limited',
+    'HDFCAMC': 'HDFC Asset Management Company Limited',
+    'ICICIPRULI': 'ICICI Prudential Life Insurance Company Limited',
+    'IDFCFIRSTB': 'IDFC First Bank Limited',
+    'IGL': 'Indraprastha Gas Limited',
+    'INDIAMART': 'IndiaMART InterMESH Limited',
+    'IOC': 'Indian Oil Corporation Limited',
+    'IRCTC': 'Indian Railway Catering and Tourism Corporation Limited',
+    'JINDALSTEL': 'Jindal Steel & Power Limited',
+    'JSWENERGY': 'JSW Energy Limited',
+    'LICI': 'Life Insurance Corporation of India',
+    'LTIM': 'LTIMindtree Limited',
+    'LUPIN': 'Lupin Limited',
+    'MARICO': 'Marico Limited',
+    'MFSL': 'Max Financial Services Limited',
+    'MPHASIS': 'Mphasis Limited',
+    'MRF': 'MRF Limited',
+    'NAUKRI': 'Info Edge (India) Limited',
+    'NMDC': 'NMDC Limited',
+    'OBEROIRLTY': 'Oberoi Realty Limited',
+    'OFSS': 'Oracle Financial Services Software Limited',
+    'PAGEIND': 'Page Industries Limited',
+    'PEL': 'Piramal Enterprises Limited',
+    'PERSISTENT': 'Persistent Systems Limited',
+    'PETRONET': 'Petronet LNG Limited',
+    'PIDILITIND': 'Pidilite Industries Limited',
+    'PIIND': 'PI Industries Limited',
+    'PNB': 'Punjab National Bank',
+    'POLYCAB': 'Polycab India Limited',
+    'PVRINOX': 'PVR INOX Limited',
+    'RBLBANK': 'RBL Bank Limited',
+    'RECLTD': 'REC Limited',
+    'SAIL': 'Steel Authority of India Limited',
+    'SBICARD': 'SBI Cards and Payment Services Limited',
+    'SIEMENS': 'Siemens Limited',
+    'SRF': 'SRF Limited',
+    'TORNTPHARM': 'Torrent Pharmaceuticals Limited',
+    'TRENT': 'Trent Limited',
+    'TVSMOTOR': 'TVS Motor Company Limited',
+    'VEDL': 'Vedanta Limited',
+    'VOLTAS': 'Voltas Limited',
+    'WHIRLPOOL': 'Whirlpool of India Limited',
+    'ZEEL': 'Zee Entertainment Enterprises Limited',
+    'ETERNAL': 'Eternal Limited',
+}
@@ -0,0 +1,95 @@
+# calc/instruments.py
+import threading
+import time
+from django.core.cache import cache
+from .instrument_seed import SEED_INDICES, SEED_STOCKS
+from .models import Instrument
+
+# Bumped by import_instruments; workers compare it to their copy's version
+VERSION_KEY = 'instruments:version'
+
+# Seconds a process trusts its copy before checking the shared version
+CHECK_INTERVAL = 60
+
+# Symbols are unique per exchange only; quotes, StockData and the search
+# index are keyed by bare symbol, so the universe is this exchange's listing
+EXCHANGE = 'NSE'
+
+
+class Universe:
+    """Active instruments, preloaded once per process"""
+
+    def __init__(self, stocks, indices, lot_sizes, yahoo_tickers, version):
+        # symbol -> company name
+        self.stocks = stocks
+        # index name -> yfinance ticker
+        self.indices = indices
+        # symbol -> F&O lot size, only for symbols with derivatives
+        self.lot_sizes = lot_sizes
+        # symbol -> yfinance ticker
+        self.yahoo_tickers = yahoo_tickers
+        self.version = version
+
+
+def _seed_universe(version):
+    return Universe(
+        dict(SEED_STOCKS),
+        dict(SEED_INDICES),
+        {},
+        {symbol: f'{symbol}.NS' for symbol in SEED_STOCKS},
+        version,
+    )
+
+
+def _load_universe(version):
+    # Ordered, so every process builds identical search index entry ids
+    rows = Instrument.objects.filter(exchange=EXCHANGE, is_active=True).order_by('symbol').values_list(
+        'symbol', 'name', 'asset_type', 'lot_size', 'yahoo_ticker'
+    )
+    stocks, indices, lot_sizes, yahoo_tickers = {}, {}, {}, {}
+    for symbol, name, asset_type, lot_size, yahoo_ticker in rows:
+        if asset_type == Instrument.INDEX:
+            indices[symbol] = yahoo_ticker
+            continue
+        stocks[symbol] = name
+        yahoo_tickers[symbol] = yahoo_ticker or f'{symbol}.NS'
+        if lot_size:
+            lot_sizes[symbol] = lot_size
+
+    if not stocks:
+        # Nothing imported yet (fresh database): use the built-in lists
+        return _seed_universe(version)
+    return Universe(stocks, indices or dict(SEED_INDICES), lot_sizes, yahoo_tickers, version)
+
+
+_universe = None
+_checked_at = 0.0
+_universe_lock = threading.Lock()
+
+
+def get_universe():
+    """
+    The active EXCHANGE universe, loaded with one query per process and
+    reloaded when an import bumps the shared version (checked at most every
+    CHECK_INTERVAL s).
+    """
+    global _universe, _checked_at
+    now = time.monotonic()
+    if _universe is not None and now - _checked_at < CHECK_INTERVAL:
+        return _universe
+
+    with _universe_lock:
+        if _universe is None or now - _checked_at >= CHECK_INTERVAL:
+            version = cache.get(VERSION_KEY, 0)
+            if _universe is None or _universe.version != version:
+                _universe = _load_universe(version)
+            _checked_at = now
+    return _universe
+
+
+def invalidate_universe():
+    """Make every process reload the universe on its next check"""
+    global _universe
+    cache.set(VERSION_KEY, time.time_ns(), None)
+    with _universe_lock:
+        _universe = None
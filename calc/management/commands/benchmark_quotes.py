@@ -0,0 +1,128 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from calc import http_replay
+from calc.quote_cache import get_quotes, quote_cache_key
+from calc.quote_providers import ESTIMATES, get_quote_router
+from calc.rate_limiter import DEFAULT_RATE_LIMITS, INTERACTIVE, request_priority
+from calc.tiered_cache import get_tier, tier_report
+from calc.views import get_nifty_500_stocks, search_index_hits
+
+DEFAULT_QUERIES = ['REL', 'HDFC', 'TATA', 'INFY', 'NIFTY', 'BANK', 'ADANI', 'SBIN']
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure refresh throughput and search latency. Replays recorded upstream '
+        'responses by default, so runs are reproducible without network access; '
+        'use --mode record once (online) to capture the fixtures. Use a local '
+        'cache: injected errors trip the circuit breakers kept there.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            choices=['replay', 'record', 'live'],
+            default='replay',
+            help='replay fixtures, record them from live calls, or call upstream directly'
+        )
+        parser.add_argument('--fixtures', help='Fixture directory (default: HTTP_REPLAY setting)')
+        parser.add_argument('--latency', type=float, help='Seconds added to each replayed call')
+        parser.add_argument('--jitter', type=float, help='Random +/- seconds around --latency')
+        parser.add_argument('--error-rate', type=float, help='Fraction of replayed calls that fail')
+        parser.add_argument('--error-status', type=int, help='HTTP status for injected failures (default: connection error)')
+        parser.add_argument('--symbols', type=int, default=100, help='Symbols to refresh')
+        parser.add_argument('--batch-size', type=int, default=25, help='Symbols per refresh batch')
+        parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES, help='Search queries to time')
+        parser.add_argument('--rounds', type=int, default=3, help='Times each query is run')
+        parser.add_argument(
+            '--ignore-rate-limits',
+            action='store_true',
+            help='Measure the fetch path itself rather than the configured request budgets'
+        )
+
+    def handle(self, *args, **options):
+        overrides = {'mode': None if options['mode'] == 'live' else options['mode']}
+        for option, key in (('fixtures', 'fixtures_dir'), ('latency', 'latency'), ('jitter', 'jitter'),
+                            ('error_rate', 'error_rate'), ('error_status', 'error_status')):
+            if options[option] is not None:
+                overrides[key] = options[option]
+        http_replay.configure(**overrides)
+
+        rate_limits = getattr(settings, 'RATE_LIMITS', {})
+        if options['ignore_rate_limits']:
+            rate_limits = {
+                provider: {'rate': 1e6, 'burst': 1e6, 'reserve': 0}
+                for provider in {**DEFAULT_RATE_LIMITS, **rate_limits}
+            }
+
+        with override_settings(RATE_LIMITS=rate_limits):
+            self._refresh_throughput(options['symbols'], options['batch_size'])
+            self._search_latency(options['queries'], options['rounds'])
+
+        for provider, health in get_quote_router().health_report().items():
+            self.stdout.write(
+                f"  {provider}: calls={health['calls']} p50={health['p50']}s "
+                f"p95={health['p95']}s errors={health['error_rate']:.0%}"
+            )
+        for namespace, counters in tier_report().items():
+            self.stdout.write(
+                f"  cache {namespace}: l1={counters['l1_hits']} l2={counters['l2_hits']} "
+                f"misses={counters['misses']} hit_ratio={counters['hit_ratio']}"
+            )
+
+    def _refresh_throughput(self, count, batch_size):
+        """The update_stock_database fetch path, without the database writes"""
+        router = get_quote_router()
+        symbols = list(get_nifty_500_stocks())[:count]
+        live = estimated = failed = 0
+
+        started = time.monotonic()
+        for start in range(0, len(symbols), batch_size):
+            for quote in router.get_many(symbols[start:start + batch_size], 'stock').values():
+                if not quote.get('success'):
+                    failed += 1
+                elif quote.get('data_source') == ESTIMATES:
+                    estimated += 1
+                else:
+                    live += 1
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Refresh: {len(symbols)} symbols in {elapsed:.2f}s "
+            f"({len(symbols) / elapsed if elapsed else 0:.1f}/s) - "
+            f"{live} live, {estimated} estimated, {failed} failed"
+        ))
+
+    def _search_latency(self, queries, rounds):
+        """Index lookup plus a cold quote fan-out, as search_stocks does it"""
+        max_quotes = getattr(settings, 'STOCK_SEARCH_MAX_QUOTES', 10)
+        deadline = getattr(settings, 'STOCK_SEARCH_DEADLINE', 3.0)
+        latencies, pending = [], 0
+
+        for _ in range(rounds):
+            for query in queries:
+                hits, _ = search_index_hits(query.upper())
+                pairs = [(hit.ticker, 'index') for hit in hits if hit.kind == 'index']
+                pairs += [(hit.symbol, 'stock') for hit in hits if hit.kind == 'stock'][:max_quotes]
+                get_tier('quotes').delete_many([quote_cache_key(symbol, asset_type) for symbol, asset_type in pairs])
+
+                started = time.monotonic()
+                with request_priority(INTERACTIVE):
+                    quotes = get_quotes(pairs, timeout=deadline)
+                latencies.append(time.monotonic() - started)
+                pending += sum(1 for quote in quotes.values() if quote is None)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Search: {len(latencies)} searches p50={_percentile(latencies, 50) * 1000:.0f}ms "
+            f"p95={_percentile(latencies, 95) * 1000:.0f}ms max={max(latencies, default=0) * 1000:.0f}ms "
+            f"({pending} quotes past the {deadline}s deadline)"
+        ))
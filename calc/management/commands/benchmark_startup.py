@@ -0,0 +1,84 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Libraries a worker must not load just to boot; they are imported by the
+# providers that need them, when those run
+HEAVY_MODULES = ['yfinance', 'pandas', 'numpy']
+
+# Runs in a fresh interpreter, as a worker boots: the WSGI app plus the URLconf
+# (which imports the views). os._exit skips the shutdown hooks, so the probe
+# leaves no persisted caches behind.
+PROBE = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+from risk_calculator.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/statm') as statm:
+        rss_kb = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+except OSError:
+    pass
+print(json.dumps({'seconds': elapsed, 'rss_kb': rss_kb, 'heavy': [m for m in %r if m in sys.modules]}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure worker boot: import time and RSS of a fresh process loading the '
+        'WSGI app and views. Fails when a limit is exceeded or a heavy data '
+        'library is imported at boot, so regressions are caught in CI.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes to measure')
+        parser.add_argument('--max-import-ms', type=float, help='Fail if the median boot takes longer')
+        parser.add_argument('--max-rss-mb', type=float, help='Fail if the median RSS is larger')
+        parser.add_argument(
+            '--allow-heavy',
+            action='store_true',
+            help=f"Do not fail when {', '.join(HEAVY_MODULES)} are imported at boot"
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'risk_calculator.settings')}
+        samples = []
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-c', PROBE % HEAVY_MODULES],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=120,
+            )
+            if result.returncode != 0:
+                raise CommandError(f"Boot probe failed:\n{result.stderr}")
+            samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+        import_ms = statistics.median(sample['seconds'] for sample in samples) * 1000
+        rss_mb = statistics.median(sample['rss_kb'] for sample in samples) / 1024
+        heavy = sorted({module for sample in samples for module in sample['heavy']})
+        self.stdout.write(
+            f"Worker boot over {len(samples)} runs: median import {import_ms:.0f}ms "
+            f"(min {min(s['seconds'] for s in samples) * 1000:.0f}ms, "
+            f"max {max(s['seconds'] for s in samples) * 1000:.0f}ms), RSS {rss_mb:.1f}MB"
+        )
+        if heavy:
+            self.stdout.write(f"Heavy modules loaded at boot: {', '.join(heavy)}")
+
+        failures = []
+        if heavy and not options['allow_heavy']:
+            failures.append(f"{', '.join(heavy)} imported at boot")
+        if options['max_import_ms'] is not None and import_ms > options['max_import_ms']:
+            failures.append(f"import {import_ms:.0f}ms > {options['max_import_ms']:.0f}ms")
+        if options['max_rss_mb'] is not None and rss_mb > options['max_rss_mb']:
+            failures.append(f"RSS {rss_mb:.1f}MB > {options['max_rss_mb']:.1f}MB")
+        if failures:
+            raise CommandError('Startup regression: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Startup within limits'))
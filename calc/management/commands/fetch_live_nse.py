@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
 from calc.nse_live_fetcher import NSELiveFetcher
 from calc.models import StockData
-from decimal import Decimal
+from calc.stock_store import bulk_upsert_stocks, mark_checked
+from calc.refresh import refresh_order
 
 class Command(BaseCommand):
     help = 'Fetch live NSE stock data'
@@ -18,70 +19,69 @@ class Command(BaseCommand):
             action='store_true',
             help='Update existing stocks only'
         )
+        parser.add_argument(
+            '--snapshot',
+            action='store_true',
+            help='Read prices from bulk NSE index payloads (NIFTY 500 and sectoral indices) '
+                 'instead of one quote request per symbol; --max-stocks is ignored'
+        )
+        parser.add_argument(
+            '--ignore-market-hours',
+            action='store_true',
+            help='Refresh everything now instead of only what the NSE session schedule says is due'
+        )
     
     def handle(self, *args, **options):
         fetcher = NSELiveFetcher()
         max_stocks = options['max_stocks']
         update_existing = options['update_existing']
+        force = options['ignore_market_hours']
         
-        if update_existing:
-            # Update only existing stocks
+        if options['snapshot']:
             existing_symbols = list(StockData.objects.values_list('symbol', flat=True))
+            if existing_symbols and not refresh_order(existing_symbols, force=force):
+                self.stdout.write('Nothing due: prices already settled for this session')
+                return
+            # Existing symbols outside every snapshot index still get a per-symbol quote
+            stocks = fetcher.fetch_snapshot(extra_symbols=existing_symbols)
+            if update_existing:
+                existing = set(existing_symbols)
+                stocks = [stock for stock in stocks if stock['symbol'] in existing]
+            self._save_stocks(stocks)
+        elif update_existing:
+            # Update only existing stocks that are due for a refresh
+            existing_symbols = refresh_order(
+                list(StockData.objects.values_list('symbol', flat=True)), force=force
+            )
             self.stdout.write(f"Updating {len(existing_symbols)} existing stocks...")
             
-            updated_count = 0
+            stocks = []
             for symbol in existing_symbols:
                 try:
                     stock_data = fetcher.get_stock_data(symbol)
                     if stock_data:
-                        StockData.objects.filter(symbol=symbol).update(
-                            company_name=stock_data['company_name'],
-                            last_price=Decimal(str(stock_data['last_price'])),
-                            change=Decimal(str(stock_data['change'])),
-                            pchange=Decimal(str(stock_data['pchange'])),
-                            volume=stock_data['volume'],
-                            market_cap=stock_data.get('market_cap', 0),
-                        )
-                        updated_count += 1
-                        self.stdout.write(f"Updated: {symbol}")
+                        stocks.append(stock_data)
                 except Exception as e:
                     self.stdout.write(f"Error updating {symbol}: {e}")
             
-            self.stdout.write(
-                self.style.SUCCESS(f'Updated {updated_count} existing stocks')
-            )
+            self._save_stocks(stocks)
         else:
             # Fetch new stocks
             stocks = fetcher.fetch_all_stocks(max_stocks)
-            
-            created_count = 0
-            updated_count = 0
-            
-            for stock_data in stocks:
-                try:
-                    stock, created = StockData.objects.update_or_create(
-                        symbol=stock_data['symbol'],
-                        defaults={
-                            'company_name': stock_data['company_name'],
-                            'last_price': Decimal(str(stock_data['last_price'])),
-                            'change': Decimal(str(stock_data['change'])),
-                            'pchange': Decimal(str(stock_data['pchange'])),
-                            'volume': stock_data['volume'],
-                            'market_cap': stock_data.get('market_cap', 0),
-                        }
-                    )
-                    
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-                        
-                except Exception as e:
-                    self.stdout.write(f"Error saving {stock_data['symbol']}: {e}")
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Processed {len(stocks)} stocks: '
-                    f'{created_count} created, {updated_count} updated'
-                )
+            self._save_stocks(stocks)
+    
+    def _save_stocks(self, stocks):
+        try:
+            counts = bulk_upsert_stocks(stocks)
+            mark_checked(stock['symbol'] for stock in stocks)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error saving {len(stocks)} stocks: {e}"))
+            raise
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Processed {len(stocks)} stocks: '
+                f"{counts['created']} created, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged ({counts['touched']} rows written)"
             )
+        )
@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
 from calc.yahoo_nse_fetcher import YahooNSEFetcher
 from calc.models import StockData
-from decimal import Decimal
+from calc.stock_store import bulk_upsert_stocks, mark_checked
+import time
 
 class Command(BaseCommand):
     help = 'Fetch live NSE stock data from Yahoo Finance'
@@ -18,68 +19,96 @@ class Command(BaseCommand):
             action='store_true',
             help='Only update prices for existing stocks'
         )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Download prices with chunked multi-ticker requests; metadata is '
+                 'only fetched for new symbols unless --refresh-metadata is given'
+        )
+        parser.add_argument(
+            '--refresh-metadata',
+            action='store_true',
+            help='With --batch: also refresh company names and market caps (run daily)'
+        )
     
     def handle(self, *args, **options):
         fetcher = YahooNSEFetcher()
         max_stocks = options['max_stocks']
         update_only = options['update_prices_only']
         
-        if update_only:
+        if options['batch']:
+            self._handle_batch(fetcher, max_stocks, update_only, options['refresh_metadata'])
+        elif update_only:
             # Update existing stocks only
             existing_symbols = list(StockData.objects.values_list('symbol', flat=True))
             self.stdout.write(f"Updating prices for {len(existing_symbols)} existing stocks...")
             
-            updated_count = 0
+            stocks = []
             for symbol in existing_symbols:
                 try:
                     stock_data = fetcher.get_stock_by_symbol(symbol)
                     if stock_data:
-                        StockData.objects.filter(symbol=symbol).update(
-                            last_price=Decimal(str(stock_data['last_price'])),
-                            change=Decimal(str(stock_data['change'])),
-                            pchange=Decimal(str(stock_data['pchange'])),
-                            volume=stock_data['volume'],
-                        )
-                        updated_count += 1
-                        self.stdout.write(f"Updated: {symbol} - ₹{stock_data['last_price']:.2f}")
+                        # Prices only, names and market caps are left as they are
+                        stocks.append({
+                            'symbol': symbol,
+                            'last_price': stock_data['last_price'],
+                            'change': stock_data['change'],
+                            'pchange': stock_data['pchange'],
+                            'volume': stock_data['volume'],
+                            'quote_time': stock_data.get('quote_time'),
+                        })
+                        self.stdout.write(f"Fetched: {symbol} - ₹{stock_data['last_price']:.2f}")
                 except Exception as e:
                     self.stdout.write(f"Error updating {symbol}: {e}")
             
-            self.stdout.write(
-                self.style.SUCCESS(f'Updated prices for {updated_count} stocks')
-            )
+            self._save_stocks(stocks)
         else:
             # Fetch new stocks
             stocks = fetcher.fetch_all_stocks(max_stocks)
-            
-            created_count = 0
-            updated_count = 0
-            
-            for stock_data in stocks:
-                try:
-                    stock, created = StockData.objects.update_or_create(
-                        symbol=stock_data['symbol'],
-                        defaults={
-                            'company_name': stock_data['company_name'],
-                            'last_price': Decimal(str(stock_data['last_price'])),
-                            'change': Decimal(str(stock_data['change'])),
-                            'pchange': Decimal(str(stock_data['pchange'])),
-                            'volume': stock_data['volume'],
-                            'market_cap': stock_data.get('market_cap', 0),
-                        }
-                    )
-                    
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-                        
-                except Exception as e:
-                    self.stdout.write(f"Error saving {stock_data['symbol']}: {e}")
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Processed {len(stocks)} stocks: '
-                    f'{created_count} created, {updated_count} updated'
-                )
+            self._save_stocks(stocks)
+    
+    def _save_stocks(self, stocks, note=''):
+        try:
+            counts = bulk_upsert_stocks(stocks)
+            mark_checked(stock['symbol'] for stock in stocks)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Error saving {len(stocks)} stocks: {e}"))
+            raise
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Processed {len(stocks)} stocks{note}: '
+                f"{counts['created']} created, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged ({counts['touched']} rows written)"
             )
+        )
+    
+    def _handle_batch(self, fetcher, max_stocks, update_only, refresh_metadata):
+        known = set(StockData.objects.values_list('symbol', flat=True))
+        if update_only:
+            symbols = [f"{symbol}.NS" for symbol in sorted(known)]
+        else:
+            symbols = fetcher.nse_symbols[:max_stocks] if max_stocks else fetcher.nse_symbols
+        
+        start = time.monotonic()
+        stocks = fetcher.fetch_batch(symbols)
+        
+        # Names and market caps change rarely: only look them up for new
+        # symbols, or for everything on the daily --refresh-metadata run
+        needs_metadata = [
+            stock['symbol'] for stock in stocks
+            if refresh_metadata or stock['symbol'] not in known
+        ]
+        metadata = fetcher.fetch_metadata(needs_metadata) if needs_metadata else {}
+        
+        rows = []
+        for stock_data in stocks:
+            stock_data.update(metadata.get(stock_data['symbol'], {}))
+            if update_only and stock_data['symbol'] not in known:
+                continue
+            rows.append(stock_data)
+        
+        self._save_stocks(
+            rows,
+            note=f' in {time.monotonic() - start:.1f}s (metadata refreshed for {len(metadata)})'
+        )
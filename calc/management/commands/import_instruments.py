@@ -0,0 +1,163 @@
+import csv
+import io
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from calc.http_client import fetch
+from calc.instrument_seed import SEED_INDICES, SEED_STOCKS
+from calc.instruments import EXCHANGE, invalidate_universe
+from calc.models import Instrument
+
+# NSE publishes the equity master as EQUITY_L.csv and F&O lots as fo_mktlots.csv
+EQUITY_MASTER_URL = 'https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv'
+
+DIFF_FIELDS = ['name', 'asset_type', 'isin', 'series', 'lot_size', 'nse_symbol', 'yahoo_ticker', 'is_active']
+
+
+def _read_csv(source):
+    """Rows of a CSV file path or URL, with header names stripped and upper-cased"""
+    if source.startswith(('http://', 'https://')):
+        response = fetch(source, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
+        if response.status_code != 200:
+            raise CommandError(f"Download of {source} failed: HTTP {response.status_code}")
+        text = response.text
+    else:
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            text = f.read()
+    reader = csv.DictReader(io.StringIO(text))
+    for row in reader:
+        yield {(key or '').strip().upper(): (value or '').strip() for key, value in row.items()}
+
+
+def _stock(symbol, name, isin='', series=''):
+    # No lot_size: only a lots file sets it, so an equity-only import keeps
+    # the lot sizes already in the master
+    return {
+        'name': name or symbol,
+        'asset_type': Instrument.STOCK,
+        'isin': isin,
+        'series': series,
+        'nse_symbol': symbol,
+        'yahoo_ticker': f'{symbol}.NS',
+        'is_active': True,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the instrument master from the exchange equity list (EQUITY_L.csv) '
+        'and F&O lot sizes (fo_mktlots.csv), writing only what changed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--equity',
+            default=EQUITY_MASTER_URL,
+            help='Path or URL of the NSE equity master CSV'
+        )
+        parser.add_argument(
+            '--fo-lots',
+            help='Path or URL of the NSE F&O market lots CSV'
+        )
+        parser.add_argument(
+            '--series',
+            default='EQ,BE',
+            help='Comma-separated series to import'
+        )
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Load the built-in NIFTY 500 list instead of an exchange file (offline setup)'
+        )
+        parser.add_argument(
+            '--keep-missing',
+            action='store_true',
+            help='Do not deactivate stocks that are absent from the file'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the changes without writing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            incoming = {symbol: _stock(symbol, name) for symbol, name in SEED_STOCKS.items()}
+        else:
+            incoming = self._read_equity(options['equity'], options['series'])
+        if options['fo_lots']:
+            self._apply_lot_sizes(incoming, options['fo_lots'])
+
+        # The equity master has no indices; they come from the built-in list
+        for name, ticker in SEED_INDICES.items():
+            incoming[name] = {
+                'name': name,
+                'asset_type': Instrument.INDEX,
+                'isin': '',
+                'series': '',
+                'nse_symbol': name,
+                'yahoo_ticker': ticker,
+                'is_active': True,
+            }
+
+        existing = {instrument.symbol: instrument for instrument in Instrument.objects.filter(exchange=EXCHANGE)}
+        to_create, to_update = [], []
+        for symbol, values in incoming.items():
+            instrument = existing.get(symbol)
+            if instrument is None:
+                to_create.append(Instrument(exchange=EXCHANGE, symbol=symbol, **values))
+            elif any(getattr(instrument, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(instrument, field, value)
+                to_update.append(instrument)
+
+        to_deactivate = []
+        if not options['keep_missing']:
+            to_deactivate = [
+                instrument for symbol, instrument in existing.items()
+                if symbol not in incoming and instrument.is_active and instrument.asset_type == Instrument.STOCK
+            ]
+            for instrument in to_deactivate:
+                instrument.is_active = False
+
+        self.stdout.write(
+            f"{len(incoming)} instruments in source: {len(to_create)} new, "
+            f"{len(to_update)} changed, {len(to_deactivate)} delisted, "
+            f"{len(incoming) - len(to_create) - len(to_update)} unchanged"
+        )
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            Instrument.objects.bulk_create(to_create, batch_size=500)
+            fields = DIFF_FIELDS if options['fo_lots'] else [field for field in DIFF_FIELDS if field != 'lot_size']
+            Instrument.objects.bulk_update(to_update + to_deactivate, fields, batch_size=500)
+
+        if to_create or to_update or to_deactivate:
+            invalidate_universe()
+        self.stdout.write(self.style.SUCCESS('Instrument master updated'))
+
+    def _read_equity(self, source, series):
+        wanted = {value.strip().upper() for value in series.split(',') if value.strip()}
+        incoming = {}
+        for row in _read_csv(source):
+            symbol = row.get('SYMBOL', '').upper()
+            if not symbol or (wanted and row.get('SERIES', '').upper() not in wanted):
+                continue
+            incoming[symbol] = _stock(symbol, row.get('NAME OF COMPANY'), row.get('ISIN NUMBER', ''), row.get('SERIES', ''))
+        if not incoming:
+            raise CommandError(f"No instruments read from {source}")
+        return incoming
+
+    def _apply_lot_sizes(self, incoming, source):
+        # Stocks the lots file leaves out no longer trade F&O
+        for values in incoming.values():
+            values['lot_size'] = None
+        # fo_mktlots.csv: UNDERLYING, SYMBOL, then one lot-size column per expiry month
+        for row in _read_csv(source):
+            values = incoming.get(row.get('SYMBOL', '').upper())
+            if values is None:
+                continue
+            for key, value in row.items():
+                if key not in ('UNDERLYING', 'SYMBOL') and value.isdigit():
+                    values['lot_size'] = int(value)
+                    break
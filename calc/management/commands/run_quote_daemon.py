@@ -0,0 +1,225 @@
+import itertools
+import queue
+import signal
+import threading
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from calc.instruments import get_universe
+from calc.market_calendar import get_scheduler
+from calc.models import StockData
+from calc.quote_cache import get_quotes_batch
+from calc.quote_providers import ESTIMATES
+from calc.refresh import refresh_order
+from calc.stock_store import bulk_upsert_stocks, mark_checked, quote_row
+from calc.views import get_nifty_500_stocks
+
+TIER_RANK = {'index': 0, 'fno': 1, 'rest': 2}
+
+STATS_CACHE_KEY = 'quote_daemon:stats'
+
+# Seconds before a symbol whose fetch failed is queued again
+RETRY_DELAY = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the quote ingestion daemon: refresh due stocks and indices '
+        'continuously with a worker pool, in batches through the quote router'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent fetch workers'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Symbols per fetch; large batches let one bulk index request cover them'
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=5.0,
+            help='Seconds between bulk writes of fetched quotes'
+        )
+        parser.add_argument(
+            '--stats-interval',
+            type=float,
+            default=60.0,
+            help='Seconds between throughput/lag reports'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = get_scheduler()
+        self._prepare(options['batch_size'], scheduler)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        workers = [
+            threading.Thread(target=self._work, name=f'quote-worker-{i}', daemon=True)
+            for i in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        self.stdout.write(self.style.SUCCESS(f"Quote daemon started with {len(workers)} workers"))
+
+        next_schedule = next_flush = 0
+        next_stats = time.monotonic() + options['stats_interval']
+        fetched_at_last_report = 0
+        while not self.stop.is_set():
+            now = time.monotonic()
+            if now >= next_schedule:
+                close_old_connections()
+                self._schedule(scheduler)
+                next_schedule = now + min(scheduler.seconds_until_next_run(), 15)
+            if now >= next_flush:
+                self._flush()
+                next_flush = now + options['flush_interval']
+            if now >= next_stats:
+                fetched = self.stats['fetched']
+                self._report((fetched - fetched_at_last_report) * 60 / options['stats_interval'])
+                fetched_at_last_report = fetched
+                next_stats = now + options['stats_interval']
+            self.stop.wait(0.5)
+
+        # Graceful shutdown: workers finish the batch in hand, queued jobs are dropped
+        self.stdout.write('Stopping: waiting for in-flight fetches...')
+        for worker in workers:
+            worker.join(timeout=20)
+        self._flush()
+        self._report(0.0)
+        self.stdout.write(self.style.SUCCESS('Quote daemon stopped'))
+
+    def _prepare(self, batch_size, scheduler):
+        """Queues, counters and bookkeeping shared by the loop and the workers"""
+        self.stop = threading.Event()
+        self.jobs = queue.PriorityQueue()
+        self.results = queue.Queue()
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.sequence = itertools.count()
+        self.stats = {
+            'started_at': time.time(), 'fetched': 0, 'failed': 0, 'written': 0,
+            'queue_depth': 0, 'lag_avg': 0.0, 'lag_max': 0.0, 'per_minute': 0.0,
+        }
+        self.lags = []
+        self.retry_after = {}
+        # Indices have no StockData row, so their last refresh is kept here
+        self.index_checked = {}
+        self.batch_size = batch_size
+        self.scheduler = scheduler
+
+    def _request_stop(self, signum, frame):
+        self.stop.set()
+
+    def _schedule(self, scheduler):
+        stocks = list(dict.fromkeys(
+            list(get_nifty_500_stocks()) + list(StockData.objects.values_list('symbol', flat=True))
+        ))
+        now = scheduler.calendar.now()
+        enqueued_at = time.monotonic()
+        with self.pending_lock:
+            def ready(symbol):
+                return symbol not in self.pending and self.retry_after.get(symbol, 0) <= enqueued_at
+
+            # Due stocks, most overdue first, batched per cadence tier
+            tiers = {}
+            for symbol in refresh_order(stocks, scheduler=scheduler):
+                if ready(symbol):
+                    tiers.setdefault(scheduler.tier_for(symbol), []).append(symbol)
+            batches = [('stock', tier, symbols) for tier, symbols in tiers.items()]
+
+            indices = [
+                ticker for ticker in get_universe().indices.values()
+                if ready(ticker) and scheduler.is_due(ticker, self.index_checked.get(ticker), now)
+            ]
+            batches.append(('index', 'index', indices))
+
+            for asset_type, tier, symbols in batches:
+                rank = TIER_RANK.get(tier, len(TIER_RANK))
+                for start in range(0, len(symbols), self.batch_size):
+                    batch = symbols[start:start + self.batch_size]
+                    self.pending.update(batch)
+                    self.jobs.put((rank, next(self.sequence), asset_type, batch, enqueued_at))
+        self.stats['queue_depth'] = self.jobs.qsize()
+
+    def _work(self):
+        while not self.stop.is_set():
+            try:
+                _, _, asset_type, symbols, enqueued_at = self.jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # The router sends a large stock batch to the bulk index snapshot
+            # and fails over per symbol only for what it did not cover; the
+            # quotes also land in the shared cache that searches read
+            try:
+                quotes = get_quotes_batch(symbols, asset_type, refresh=True)
+            except Exception as e:
+                self.stderr.write(f"Error fetching {len(symbols)} {asset_type} quotes: {e}")
+                quotes = {}
+            lag = time.monotonic() - enqueued_at
+            for symbol in symbols:
+                self.results.put((asset_type, symbol, quotes.get(symbol), lag))
+            self.jobs.task_done()
+
+    def _flush(self):
+        """Write everything the workers fetched since the last flush in one upsert"""
+        rows, done = [], []
+        names = get_nifty_500_stocks()
+        checked_at = self.scheduler.calendar.now()
+        while True:
+            try:
+                asset_type, symbol, quote, lag = self.results.get_nowait()
+            except queue.Empty:
+                break
+            done.append(symbol)
+            self.lags.append(lag)
+            if asset_type == 'index':
+                # Index quotes only live in the quote cache
+                row = quote if quote and quote.get('success') and quote.get('data_source') != ESTIMATES else None
+                if row:
+                    self.index_checked[symbol] = checked_at
+            else:
+                row = quote_row(symbol, quote, names.get(symbol)) if quote else None
+                if row:
+                    rows.append(row)
+            if row:
+                self.stats['fetched'] += 1
+            else:
+                self.stats['failed'] += 1
+                self.retry_after[symbol] = time.monotonic() + RETRY_DELAY
+
+        if rows:
+            try:
+                counts = bulk_upsert_stocks(rows)
+                mark_checked((row['symbol'] for row in rows), checked_at)
+                self.stats['written'] += counts['touched']
+            except Exception as e:
+                self.stderr.write(f"Error saving {len(rows)} quotes: {e}")
+            close_old_connections()
+
+        with self.pending_lock:
+            self.pending.difference_update(done)
+
+    def _report(self, per_minute):
+        if self.lags:
+            self.stats['lag_avg'] = round(sum(self.lags) / len(self.lags), 2)
+            self.stats['lag_max'] = round(max(self.lags), 2)
+            self.lags = []
+        self.stats['per_minute'] = round(per_minute, 1)
+        self.stats['queue_depth'] = self.jobs.qsize()
+        # Web workers (or an admin shell) can read the daemon's health from the cache
+        cache.set(STATS_CACHE_KEY, dict(self.stats, reported_at=time.time()), None)
+        self.stdout.write(
+            f"fetched={self.stats['fetched']} failed={self.stats['failed']} "
+            f"written={self.stats['written']} queue={self.stats['queue_depth']} "
+            f"rate={self.stats['per_minute']}/min lag_avg={self.stats['lag_avg']}s "
+            f"lag_max={self.stats['lag_max']}s"
+        )
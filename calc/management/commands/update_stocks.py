@@ -10,7 +10,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Update stock prices from external APIs'
+    help = 'Update stock prices from external APIs, most overdue symbols first'
     
     def add_arguments(self, parser):
         parser.add_argument(
@@ -23,6 +23,18 @@ class Command(BaseCommand):
             type=str,
             help='Comma-separated list of specific symbols to update',
         )
+        parser.add_argument(
+            '--time-budget',
+            type=float,
+            help='Seconds to spend this run (default: STOCK_REFRESH_TIME_BUDGET); '
+                 'symbols left over are picked up by the next run',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=25,
+            help='Symbols fetched and saved per batch',
+        )
     
     def handle(self, *args, **options):
         self.stdout.write(
@@ -30,15 +42,24 @@ class Command(BaseCommand):
         )
         
         try:
+            symbols = None
             if options['symbols']:
-                # Update specific symbols
-                symbols = [s.strip().upper() for s in options['symbols'].split(',')]
+                # Update specific symbols, however recently they were checked
+                symbols = [s.strip().upper() for s in options['symbols'].split(',') if s.strip()]
                 self.stdout.write(f'Updating specific symbols: {symbols}')
-                # Add logic for specific symbols here
-                updated_count = len(symbols)  # Placeholder
-            else:
-                # Update all stocks
-                updated_count = update_stock_database()
+            
+            result = update_stock_database(
+                symbols=symbols,
+                time_budget=options['time_budget'],
+                force=options['force'] or bool(symbols),
+                batch_size=options['batch_size'],
+            )
+            updated_count = result['updated']
+            self.stdout.write(
+                f"{result['created']} created, {result['changed']} changed, "
+                f"{result['unchanged']} unchanged ({result['touched']} rows written), "
+                f"{result['failed']} failed, {result['remaining']} still due"
+            )
             
             self.stdout.write(
                 self.style.SUCCESS(
@@ -0,0 +1,66 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from calc.cache_persistence import load_caches, persist_dir, save_caches
+from calc.instruments import get_universe
+from calc.quote_cache import get_quotes_batch
+from calc.refresh import demand
+from calc.views import get_stock_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Prime the caches before workers take traffic: restore the persisted '
+        'caches, build the search index and fetch quotes for the indices and '
+        'the most searched stocks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=100, help='Most searched stocks to prime')
+        parser.add_argument('--batch-size', type=int, default=25, help='Symbols per quote batch')
+        parser.add_argument(
+            '--no-fetch',
+            action='store_true',
+            help='Only restore the persisted caches and build the search index'
+        )
+        parser.add_argument(
+            '--no-save',
+            action='store_true',
+            help='Do not persist the primed caches for the workers to load'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if os.environ.get('RENDER') and persist_dir().resolve().is_relative_to(settings.BASE_DIR):
+            self.stdout.write(self.style.WARNING(
+                f"CACHE_PERSIST_DIR ({persist_dir()}) is inside the app directory, which Render "
+                f"resets on every deploy and restart; point it at a mounted disk"
+            ))
+        restored = load_caches()
+        self.stdout.write(
+            f"Restored {restored['quotes']} quotes from disk, search index "
+            f"{'restored' if restored['search_index'] else 'not restored'}"
+        )
+
+        search_index = get_stock_search_index()
+        self.stdout.write(f"Search index: {search_index.stock_count} stocks, {search_index.index_count} indices")
+
+        if not options['no_fetch']:
+            universe = get_universe()
+            weights = demand(list(universe.stocks))
+            top = sorted(universe.stocks, key=lambda symbol: -weights[symbol])[:options['top']]
+            # Already cached quotes are served from the cache, only the rest are fetched
+            primed = failed = 0
+            for asset_type, symbols in (('index', list(universe.indices.values())), ('stock', top)):
+                for start in range(0, len(symbols), options['batch_size']):
+                    quotes = get_quotes_batch(symbols[start:start + options['batch_size']], asset_type)
+                    primed += sum(1 for quote in quotes.values() if quote.get('success'))
+                    failed += sum(1 for quote in quotes.values() if not quote.get('success'))
+            self.stdout.write(f"Primed {primed} quotes ({failed} unavailable)")
+
+        if not options['no_save']:
+            saved = save_caches()
+            self.stdout.write(f"Persisted {saved} quotes")
+
+        self.stdout.write(self.style.SUCCESS(f"Caches warm in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,160 @@
+# calc/market_calendar.py
+import logging
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IST = ZoneInfo('Asia/Kolkata')
+
+# NSE equity session times (IST)
+PRE_OPEN_START = time(9, 0)
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+POST_CLOSE_END = time(16, 0)
+
+PRE_OPEN = 'pre_open'
+REGULAR = 'regular'
+POST_CLOSE = 'post_close'
+CLOSED = 'closed'
+
+# Seconds between refreshes of one symbol, per session phase and tier.
+# None: refresh once after the session ends, then leave it alone.
+DEFAULT_CADENCE = {
+    PRE_OPEN: {'index': 60, 'fno': 120, 'rest': 600},
+    REGULAR: {'index': 15, 'fno': 30, 'rest': 120},
+    POST_CLOSE: {'index': 300, 'fno': 300, 'rest': 900},
+    CLOSED: {'index': None, 'fno': None, 'rest': None},
+}
+
+# Most liquid F&O underlyings, used until F&O lot sizes have been imported
+# into the instrument master; everything else that is not an index is 'rest'
+FNO_SYMBOLS = {
+    'ADANIENT', 'ADANIPORTS', 'APOLLOHOSP', 'ASIANPAINT', 'AXISBANK', 'BAJAJ-AUTO',
+    'BAJFINANCE', 'BAJAJFINSV', 'BPCL', 'BHARTIARTL', 'BRITANNIA', 'CIPLA',
+    'COALINDIA', 'DIVISLAB', 'DRREDDY', 'EICHERMOT', 'GRASIM', 'HCLTECH',
+    'HDFCBANK', 'HDFCLIFE', 'HEROMOTOCO', 'HINDALCO', 'HINDUNILVR', 'ICICIBANK',
+    'ITC', 'INDUSINDBK', 'INFY', 'JSWSTEEL', 'KOTAKBANK', 'LT', 'M&M', 'MARUTI',
+    'NESTLEIND', 'NTPC', 'ONGC', 'POWERGRID', 'RELIANCE', 'SBILIFE', 'SBIN',
+    'SUNPHARMA', 'TCS', 'TATACONSUM', 'TMPV', 'TATASTEEL', 'TECHM',
+    'TITAN', 'ULTRACEMCO', 'WIPRO',
+}
+
+
+def _system_clock():
+    return datetime.now(IST)
+
+
+# Years already reported as missing from the holiday list (once per process)
+_years_warned = set()
+
+
+class MarketCalendar:
+    """
+    NSE trading calendar: weekends and holidays are closed, trading days run
+    pre-open, the regular session and the post-close window.
+    Pass clock= (a function returning an aware datetime) to test offline.
+    """
+
+    def __init__(self, holidays=(), clock=None):
+        self.holidays = {
+            day if isinstance(day, date) else date.fromisoformat(day) for day in holidays
+        }
+        self.clock = clock or _system_clock
+        self.listed_years = {day.year for day in self.holidays}
+
+    def now(self):
+        return self.clock().astimezone(IST)
+
+    def is_trading_day(self, day):
+        if day.year not in self.listed_years and day.year not in _years_warned:
+            _years_warned.add(day.year)
+            logger.warning(
+                f"NSE_HOLIDAYS has no dates for {day.year}: every weekday is treated as "
+                f"a trading day. Add that year's NSE holiday circular to settings."
+            )
+        return day.weekday() < 5 and day not in self.holidays
+
+    def phase(self, at=None):
+        at = (at or self.now()).astimezone(IST)
+        if not self.is_trading_day(at.date()):
+            return CLOSED
+        moment = at.time()
+        if PRE_OPEN_START <= moment < MARKET_OPEN:
+            return PRE_OPEN
+        if MARKET_OPEN <= moment < MARKET_CLOSE:
+            return REGULAR
+        if MARKET_CLOSE <= moment < POST_CLOSE_END:
+            return POST_CLOSE
+        return CLOSED
+
+    def last_session_end(self, at=None):
+        """End of the most recent post-close window at or before `at`"""
+        at = (at or self.now()).astimezone(IST)
+        day = at.date()
+        while True:
+            if self.is_trading_day(day):
+                end = datetime.combine(day, POST_CLOSE_END, tzinfo=IST)
+                if end <= at:
+                    return end
+            day -= timedelta(days=1)
+
+    def next_pre_open(self, at=None):
+        """Start of the next pre-open session after `at`"""
+        at = (at or self.now()).astimezone(IST)
+        day = at.date()
+        while True:
+            start = datetime.combine(day, PRE_OPEN_START, tzinfo=IST)
+            if self.is_trading_day(day) and start > at:
+                return start
+            day += timedelta(days=1)
+
+
+class RefreshScheduler:
+    """Decides which symbols are due for a refresh right now"""
+
+    def __init__(self, calendar, cadence=None, tier_for=None):
+        self.calendar = calendar
+        self.cadence = {**DEFAULT_CADENCE, **(cadence or {})}
+        self.tier_for = tier_for or default_tier
+
+    def interval(self, symbol, phase=None):
+        """Seconds between refreshes for symbol in this phase, None when closed"""
+        phase = phase or self.calendar.phase()
+        return self.cadence[phase].get(self.tier_for(symbol))
+
+    def is_due(self, symbol, last_checked, at=None):
+        at = at or self.calendar.now()
+        if last_checked is None:
+            return True
+        interval = self.interval(symbol, self.calendar.phase(at))
+        if interval is None:
+            # Closed: one refresh after the session settles, none overnight
+            return last_checked < self.calendar.last_session_end(at)
+        return (at - last_checked).total_seconds() >= interval
+
+    def seconds_until_next_run(self, at=None):
+        """How long a polling loop can sleep before anything may be due"""
+        at = at or self.calendar.now()
+        phase = self.calendar.phase(at)
+        intervals = [seconds for seconds in self.cadence[phase].values() if seconds]
+        if intervals:
+            return min(intervals)
+        return max((self.calendar.next_pre_open(at) - at).total_seconds(), 0)
+
+
+def default_tier(symbol):
+    if symbol.startswith('^') or symbol.startswith('NIFTY') or symbol in ('SENSEX', 'BANKNIFTY', 'FINNIFTY'):
+        return 'index'
+    # Symbols with an F&O lot size trade derivatives, so they get the fno cadence
+    from .instruments import get_universe
+    if symbol in (get_universe().lot_sizes or FNO_SYMBOLS):
+        return 'fno'
+    return 'rest'
+
+
+def get_scheduler(clock=None):
+    """Scheduler configured from settings (NSE_HOLIDAYS, STOCK_REFRESH_CADENCE)"""
+    calendar = MarketCalendar(getattr(settings, 'NSE_HOLIDAYS', ()), clock=clock)
+    return RefreshScheduler(calendar, getattr(settings, 'STOCK_REFRESH_CADENCE', None))
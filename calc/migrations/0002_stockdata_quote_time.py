@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockdata',
+            name='quote_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
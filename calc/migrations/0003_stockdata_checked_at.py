@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0002_stockdata_quote_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockdata',
+            name='checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
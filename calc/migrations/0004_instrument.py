@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calc', '0003_stockdata_checked_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exchange', models.CharField(default='NSE', max_length=10)),
+                ('symbol', models.CharField(max_length=40)),
+                ('name', models.CharField(max_length=200)),
+                ('asset_type', models.CharField(choices=[('stock', 'Stock'), ('index', 'Index')], default='stock', max_length=10)),
+                ('isin', models.CharField(blank=True, db_index=True, max_length=12)),
+                ('series', models.CharField(blank=True, max_length=4)),
+                ('lot_size', models.PositiveIntegerField(blank=True, null=True)),
+                ('nse_symbol', models.CharField(blank=True, max_length=60)),
+                ('yahoo_ticker', models.CharField(blank=True, max_length=30)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['symbol'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='instrument',
+            index=models.Index(fields=['asset_type', 'is_active'], name='instrument_type_active_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='instrument',
+            constraint=models.UniqueConstraint(fields=('exchange', 'symbol'), name='unique_exchange_symbol'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 # calc/models.py
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.db import models
 from django.contrib.auth.models import User
@@ -87,6 +87,11 @@ class StockData(models.Model):
     pchange = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     volume = models.BigIntegerField(default=0)
     market_cap = models.BigIntegerField(null=True, blank=True)
+    # When the provider says the quote was struck; updated_at only moves when
+    # a refresh actually changes the row
+    quote_time = models.DateTimeField(null=True, blank=True)
+    # Last time a refresh fetched this symbol, changed or not
+    checked_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
@@ -107,6 +112,46 @@ class StockData(models.Model):
         return 'green' if self.change >= 0 else 'red'
 
 
+class Instrument(models.Model):
+    """
+    Canonical tradable universe, loaded from the exchange master file by the
+    import_instruments command. Everything that needs a list of symbols
+    reads it through calc.instruments.get_universe().
+    """
+    STOCK = 'stock'
+    INDEX = 'index'
+    ASSET_TYPE_CHOICES = [
+        (STOCK, 'Stock'),
+        (INDEX, 'Index'),
+    ]
+
+    exchange = models.CharField(max_length=10, default='NSE')
+    symbol = models.CharField(max_length=40)
+    name = models.CharField(max_length=200)
+    asset_type = models.CharField(max_length=10, choices=ASSET_TYPE_CHOICES, default=STOCK)
+    isin = models.CharField(max_length=12, blank=True, db_index=True)
+    series = models.CharField(max_length=4, blank=True)
+    # F&O market lot; null for symbols without derivatives
+    lot_size = models.PositiveIntegerField(null=True, blank=True)
+    # Provider tickers: the NSE API symbol (index name for indices) and yfinance's
+    nse_symbol = models.CharField(max_length=60, blank=True)
+    yahoo_ticker = models.CharField(max_length=30, blank=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['symbol']
+        constraints = [
+            models.UniqueConstraint(fields=['exchange', 'symbol'], name='unique_exchange_symbol'),
+        ]
+        indexes = [
+            models.Index(fields=['asset_type', 'is_active'], name='instrument_type_active_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.exchange}:{self.symbol} - {self.name}"
+
+
 class UserSettings(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     capital = models.DecimalField(max_digits=12, decimal_places=2, default=200000)
@@ -124,3 +169,15 @@ class Calculation(models.Model):
     targets = models.TextField(blank=True)
     trade_type = models.CharField(max_length=20, default='stocks')
     created_at = models.DateTimeField(auto_now_add=True)
+
+
+# Drop the cached (capital, risk_percent) on every save, wherever it comes
+# from (update_settings, the admin, a shell), and bump the tier version so
+# other workers drop their L1 copies within a second instead of the tier TTL
+@receiver(post_save, sender='calc.UserSettings')
+@receiver(post_delete, sender='calc.UserSettings')
+def drop_cached_user_settings(sender, instance, **kwargs):
+    from .tiered_cache import get_tier
+    tier = get_tier('user_settings')
+    tier.delete(f'user_settings:{instance.user_id}')
+    tier.invalidate()
@@ -1,19 +1,59 @@
-import requests
 import json
-import time
+import logging
 from datetime import datetime
-import random
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
+from .circuit_breaker import guarded_get
+from .http_client import PooledSession
+from .instruments import get_universe
+
+logger = logging.getLogger(__name__)
+
+IST = ZoneInfo('Asia/Kolkata')
+
+# Indices whose equity-stockIndices payloads carry live prices for their
+# constituents; together they cover the NIFTY 500 and more in a few requests
+SNAPSHOT_INDICES = [
+    'NIFTY 500',
+    'NIFTY MICROCAP 250',
+    'NIFTY BANK',
+    'NIFTY FINANCIAL SERVICES',
+    'NIFTY IT',
+    'NIFTY PHARMA',
+    'NIFTY AUTO',
+    'NIFTY FMCG',
+    'NIFTY METAL',
+    'NIFTY REALTY',
+    'NIFTY ENERGY',
+]
+
+def _to_float(value):
+    """NSE numbers sometimes arrive as strings with thousands separators"""
+    if isinstance(value, str):
+        value = value.replace(',', '').strip() or 0
+    return float(value or 0)
+
+def _parse_nse_time(value):
+    """NSE timestamps look like '17-Oct-2025 15:30:00' (IST); None if absent"""
+    if not value:
+        return None
+    for fmt in ('%d-%b-%Y %H:%M:%S', '%d-%b-%Y %H:%M'):
+        try:
+            return datetime.strptime(value.strip(), fmt).replace(tzinfo=IST)
+        except ValueError:
+            continue
+    return None
 
 class NSELiveFetcher:
-    def __init__(self):
+    def __init__(self, timeout=10):
         self.base_url = "https://www.nseindia.com/api"
-        self.session = requests.Session()
+        self.timeout = timeout
+        self.session = PooledSession()
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': '*/*',
             'Accept-Language': 'en-US,en;q=0.9',
             'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
             'Referer': 'https://www.nseindia.com/',
         }
         self.session.headers.update(self.headers)
@@ -22,63 +62,39 @@ class NSELiveFetcher:
     def _initialize_session(self):
         """Initialize session by visiting NSE homepage"""
         try:
-            response = self.session.get('https://www.nseindia.com', timeout=10)
-            print(f"Session initialized: {response.status_code}")
+            response = guarded_get(self.session, 'nse:homepage', 'https://www.nseindia.com', timeout=self.timeout)
+            logger.debug(f"Session initialized: {response.status_code}")
         except Exception as e:
-            print(f"Session initialization failed: {e}")
+            logger.warning(f"Session initialization failed: {e}")
     
     def get_all_symbols(self):
         """Get all NSE symbols from equity list"""
         try:
             url = f"{self.base_url}/equity-stockIndices?index=NIFTY%20500"
-            response = self.session.get(url, timeout=15)
+            response = guarded_get(self.session, 'nse:equity-stockIndices', url, timeout=15)
             
             if response.status_code == 200:
                 data = response.json()
                 symbols = [stock['symbol'] for stock in data.get('data', [])]
-                print(f"Found {len(symbols)} symbols from NIFTY 500")
+                logger.info(f"Found {len(symbols)} symbols from NIFTY 500")
                 return symbols
             else:
-                print(f"Failed to get symbols: {response.status_code}")
+                logger.warning(f"Failed to get symbols: {response.status_code}")
                 return self._get_fallback_symbols()
                 
         except Exception as e:
-            print(f"Error getting symbols: {e}")
+            logger.error(f"Error getting symbols: {e}")
             return self._get_fallback_symbols()
     
     def _get_fallback_symbols(self):
-        """Fallback list of popular NSE stocks"""
-        return [
-            'RELIANCE', 'TCS', 'HDFCBANK', 'INFY', 'HINDUNILVR', 'ICICIBANK',
-            'KOTAKBANK', 'BHARTIARTL', 'ITC', 'SBIN', 'BAJFINANCE', 'ASIANPAINT',
-            'MARUTI', 'HCLTECH', 'WIPRO', 'ADANIPORTS', 'APOLLOHOSP', 'AXISBANK',
-            'BAJAJ-AUTO', 'BAJAJFINSV', 'BPCL', 'BRITANNIA', 'CIPLA', 'COALINDIA',
-            'DIVISLAB', 'DRREDDY', 'EICHERMOT', 'GRASIM', 'HEROMOTOCO', 'HINDALCO',
-            'HDFC', 'INDUSINDBK', 'IOC', 'JSWSTEEL', 'M&M', 'NESTLEIND', 'NTPC',
-            'ONGC', 'POWERGRID', 'SUNPHARMA', 'TATAMOTORS', 'TATASTEEL', 'TECHM',
-            'TITAN', 'ULTRACEMCO', 'UPL', 'LT', 'ADANIENT', 'ADANIGREEN',
-            'AMBUJACEM', 'APOLLOTYRE', 'ASHOKLEY', 'AUROPHARMA', 'BANKINDIA',
-            'BERGEPAINT', 'BIOCON', 'BOSCHLTD', 'CADILAHC', 'CANBK', 'CHAMBLFERT',
-            'COLPAL', 'CONCOR', 'CUMMINSIND', 'DABUR', 'DALBHARAT', 'DEEPAKNTR',
-            'DELTACORP', 'DLF', 'FEDERALBNK', 'GAIL', 'GLENMARK', 'GMRINFRA',
-            'GODREJCP', 'GODREJPROP', 'HATHWAY', 'HAVELLS', 'HDFCLIFE', 'HINDZINC',
-            'IBULHSGFIN', 'IDEA', 'IDFCFIRSTB', 'IGL', 'INDIANB', 'INDIGO',
-            'INFRATEL', 'JINDALSTEL', 'JSWENERGY', 'JUBLFOOD', 'JUSTDIAL',
-            'LICHSGFIN', 'LUPIN', 'MARICO', 'MCDOWELL-N', 'MFSL', 'MGL',
-            'MINDTREE', 'MOTHERSUMI', 'MRF', 'MUTHOOTFIN', 'NATIONALUM',
-            'NAUKRI', 'NMDC', 'OFSS', 'OIL', 'PAGEIND', 'PEL', 'PETRONET',
-            'PFC', 'PIDILITIND', 'PNB', 'POLYCAB', 'PVR', 'RAMCOCEM',
-            'RBLBANK', 'RECLTD', 'SAIL', 'SHREECEM', 'SIEMENS', 'SRF',
-            'STAR', 'SUNTV', 'TATACOMM', 'TATACONSUM', 'TATAPOWER', 'TORNTPHARM',
-            'TORNTPOWER', 'TRENT', 'TVSMOTOR', 'UBL', 'UNIONBANK', 'VEDL',
-            'VOLTAS', 'WHIRLPOOL', 'YESBANK', 'ZEEL'
-        ]
+        """Active stocks from the instrument master"""
+        return list(get_universe().stocks)
     
     def get_stock_data(self, symbol):
         """Get individual stock data"""
         try:
             url = f"{self.base_url}/quote-equity?symbol={symbol}"
-            response = self.session.get(url, timeout=10)
+            response = guarded_get(self.session, 'nse:quote-equity', url, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
@@ -90,34 +106,94 @@ class NSELiveFetcher:
                     'pchange': float(data.get('pChange', 0)),
                     'volume': int(data.get('totalTradedVolume', 0)),
                     'market_cap': data.get('marketCap', 0),
+                    'quote_time': _parse_nse_time(
+                        data.get('lastUpdateTime') or (data.get('metadata') or {}).get('lastUpdateTime')
+                    ),
                 }
             else:
-                print(f"Failed to get data for {symbol}: {response.status_code}")
+                logger.warning(f"Failed to get data for {symbol}: {response.status_code}")
                 return None
                 
         except Exception as e:
-            print(f"Error getting data for {symbol}: {e}")
+            logger.error(f"Error getting data for {symbol}: {e}")
             return None
     
+    def get_index_snapshot(self, index_name):
+        """Live prices for every constituent of an index in one request"""
+        try:
+            url = f"{self.base_url}/equity-stockIndices?index={quote(index_name)}"
+            response = guarded_get(self.session, 'nse:equity-stockIndices', url, timeout=15)
+            
+            if response.status_code != 200:
+                logger.warning(f"Failed to get snapshot for {index_name}: {response.status_code}")
+                return []
+            
+            payload = response.json()
+            # Rows carry their own lastUpdateTime, the payload timestamp covers the rest
+            payload_time = _parse_nse_time(payload.get('timestamp'))
+            stocks = []
+            for row in payload.get('data', []):
+                symbol = row.get('symbol', '')
+                # The first row is the index itself
+                if not symbol or symbol == index_name or row.get('priority') == 1:
+                    continue
+                meta = row.get('meta') or {}
+                stocks.append({
+                    'symbol': symbol,
+                    'company_name': meta.get('companyName') or row.get('companyName') or symbol,
+                    'last_price': _to_float(row.get('lastPrice')),
+                    'change': _to_float(row.get('change')),
+                    'pchange': _to_float(row.get('pChange')),
+                    'volume': int(_to_float(row.get('totalTradedVolume'))),
+                    'market_cap': int(_to_float(row.get('ffmc'))),
+                    'quote_time': _parse_nse_time(row.get('lastUpdateTime')) or payload_time,
+                })
+            return stocks
+            
+        except Exception as e:
+            logger.error(f"Error getting snapshot for {index_name}: {e}")
+            return []
+    
+    def fetch_snapshot(self, indices=None, extra_symbols=()):
+        """
+        Fetch prices from bulk index payloads. Symbols in extra_symbols that no
+        index covers fall back to one quote-equity call each.
+        """
+        stocks = {}
+        for index_name in indices or SNAPSHOT_INDICES:
+            snapshot = self.get_index_snapshot(index_name)
+            for stock in snapshot:
+                stocks.setdefault(stock['symbol'], stock)
+            logger.info(f"{index_name}: {len(snapshot)} constituents ({len(stocks)} symbols so far)")
+        
+        uncovered = [symbol for symbol in dict.fromkeys(extra_symbols) if symbol not in stocks]
+        if uncovered:
+            logger.info(f"Fetching {len(uncovered)} symbols not covered by any index...")
+        for symbol in uncovered:
+            stock_data = self.get_stock_data(symbol)
+            if stock_data:
+                stocks[symbol] = stock_data
+        
+        logger.info(f"Snapshot covers {len(stocks)} stocks")
+        return list(stocks.values())
+    
     def fetch_all_stocks(self, max_stocks=200):
         """Fetch data for multiple stocks"""
         symbols = self.get_all_symbols()[:max_stocks]
         stocks = []
         
-        print(f"Fetching data for {len(symbols)} stocks...")
+        logger.info(f"Fetching data for {len(symbols)} stocks...")
         
         for i, symbol in enumerate(symbols):
             try:
                 stock_data = self.get_stock_data(symbol)
                 if stock_data:
                     stocks.append(stock_data)
-                    print(f"[{i+1}/{len(symbols)}] Fetched: {symbol} - ₹{stock_data['last_price']:.2f}")
-                
-                time.sleep(random.uniform(0.1, 0.3))
+                    logger.debug(f"[{i+1}/{len(symbols)}] Fetched: {symbol} - ₹{stock_data['last_price']:.2f}")
                 
             except Exception as e:
-                print(f"Error fetching {symbol}: {e}")
+                logger.error(f"Error fetching {symbol}: {e}")
                 continue
         
-        print(f"Successfully fetched {len(stocks)} stocks")
+        logger.info(f"Successfully fetched {len(stocks)} stocks")
         return stocks
@@ -0,0 +1,285 @@
+# calc/quote_cache.py
+import contextvars
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from .cache_locks import acquire_lock, lock_held, release_lock
+from .quote_providers import get_quote_router
+from .quote_snapshot import get_snapshot
+from .singleflight import SingleFlight
+from .tiered_cache import get_tier
+
+logger = logging.getLogger(__name__)
+
+# Per asset type: a quote is fresh for `soft` seconds, then served stale
+# (while a background refresh runs) until `hard` seconds, when it is dropped.
+# Override with QUOTE_CACHE_TTLS in settings.
+DEFAULT_QUOTE_TTLS = {
+    'index': {'soft': 30, 'hard': 300},
+    'stock': {'soft': 60, 'hard': 900},
+}
+
+# Cross-process fill lock: how long a fetch may hold its claim on a symbol,
+# and how long (and how often) other workers wait for its result
+FILL_LOCK_TIMEOUT = 30
+FILL_WAIT = 15
+FILL_POLL_INTERVAL = 0.05
+
+# Per-process counters, handy for judging the cache from a shell or log line
+stats = {
+    'hits': 0, 'stale_hits': 0, 'misses': 0, 'errors': 0, 'refreshes': 0,
+    'coalesced': 0, 'wait_timeouts': 0, 'snapshot_hits': 0,
+}
+
+# Threads of this worker missing the same quote share one fetch
+_flight = SingleFlight()
+
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='quote-refresh')
+
+# Bounded pool for request-time fan-out (get_quotes)
+_fanout_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'QUOTE_FANOUT_WORKERS', 16), thread_name_prefix='quote-fanout'
+)
+
+
+def quote_ttls(asset_type):
+    """(soft, hard) TTL in seconds for asset_type"""
+    ttls = {**DEFAULT_QUOTE_TTLS, **getattr(settings, 'QUOTE_CACHE_TTLS', {})}
+    ttl = ttls.get(asset_type, ttls['stock'])
+    return ttl['soft'], ttl['hard']
+
+
+def quote_ttl(asset_type):
+    """Seconds a quote is served as fresh"""
+    return quote_ttls(asset_type)[0]
+
+
+def quote_cache_key(symbol, asset_type='stock'):
+    return f'quote:{asset_type}:{symbol.strip().upper()}'
+
+
+def _fetch_and_store(symbol, asset_type, key):
+    quote = get_quote_router().get_stock_data(symbol, asset_type)
+    if quote.get('success'):
+        get_tier('quotes').set(key, {'quote': quote, 'fetched_at': time.time()}, quote_ttls(asset_type)[1])
+    else:
+        stats['errors'] += 1
+        logger.warning(f"Quote fetch failed for {symbol}: {quote.get('error', 'Unknown error')}")
+    return quote
+
+
+def _wait_for_fills(keys, since):
+    """
+    Poll for quotes other workers are fetching; returns {key: quote} for the
+    ones that landed. A key stops being waited for once its fill lock is gone
+    without a quote (that fetch failed).
+    """
+    pending = set(keys)
+    landed = {}
+    deadline = time.monotonic() + FILL_WAIT
+    while pending and time.monotonic() < deadline:
+        time.sleep(FILL_POLL_INTERVAL)
+        for key in list(pending):
+            # Skips this worker's L1: the other worker's write only lands in L2
+            entry = get_tier('quotes').get_shared(key)
+            if entry is not None and entry['fetched_at'] >= since:
+                landed[key] = entry['quote']
+                pending.discard(key)
+            elif not lock_held(f'{key}:inflight'):
+                pending.discard(key)
+    if pending:
+        stats['wait_timeouts'] += 1
+    return landed
+
+
+def _fill_shared(symbol, asset_type, key):
+    # cache.add is atomic: with a shared cache backend exactly one worker
+    # process fetches, the others wait for its result to appear
+    lock_key = f'{key}:inflight'
+    since = time.time()
+    token = acquire_lock(lock_key, FILL_LOCK_TIMEOUT)
+    if token is None:
+        quote = _wait_for_fills([key], since).get(key)
+        if quote is not None:
+            stats['coalesced'] += 1
+            return quote
+        # The holder failed or overran: fetch anyway, holding the lock only
+        # if it is free now, so the holder's lock is never released by us
+        token = acquire_lock(lock_key, FILL_LOCK_TIMEOUT)
+    try:
+        return _fetch_and_store(symbol, asset_type, key)
+    finally:
+        release_lock(lock_key, token)
+
+
+def _fill(symbol, asset_type, key):
+    """Fetch and cache one quote with at most one upstream call in flight per symbol"""
+    return _flight.do(key, lambda: _fill_shared(symbol, asset_type, key))
+
+
+def _background_refresh(symbol, asset_type, key, token):
+    try:
+        stats['refreshes'] += 1
+        _fetch_and_store(symbol, asset_type, key)
+    except Exception as e:
+        logger.error(f"Background quote refresh failed for {symbol}: {str(e)}")
+    finally:
+        release_lock(f'{key}:inflight', token)
+
+
+def _schedule_refresh(symbol, asset_type, key):
+    # Shares the fill lock, so only one worker refreshes a given stale quote
+    # and concurrent misses elsewhere wait for it instead of fetching again
+    token = acquire_lock(f'{key}:inflight', FILL_LOCK_TIMEOUT)
+    if token is not None:
+        _refresh_pool.submit(_background_refresh, symbol, asset_type, key, token)
+
+
+def _snapshot_quote(symbol, asset_type):
+    """Quote from the host's shared snapshot file if it is still fresh, else None"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    quote = snapshot.get(symbol.strip().upper(), asset_type)
+    if quote is None or time.time() - quote.pop('fetched_at') >= quote_ttl(asset_type):
+        return None
+    stats['snapshot_hits'] += 1
+    return quote
+
+
+def _serve_entry(symbol, asset_type, key, entry):
+    """Quote from a cache entry, scheduling a refresh if it is past its soft TTL"""
+    age = time.time() - entry['fetched_at']
+    if age < quote_ttl(asset_type):
+        stats['hits'] += 1
+        return entry['quote']
+
+    stats['stale_hits'] += 1
+    _schedule_refresh(symbol, asset_type, key)
+    return {**entry['quote'], 'stale': True, 'age': round(age, 1)}
+
+
+def get_quote(symbol, asset_type='stock', refresh=False):
+    """
+    Quote for one symbol, shared by every caller through the cache (this
+    worker's L1 in front of the shared cache, see tiered_cache).
+    A fresh quote in the host's snapshot file (written by the ingestion side)
+    is served without touching the cache. Stale quotes are returned at once,
+    marked with 'stale' and their 'age' in seconds, while a background
+    refresh fetches a new one.
+    refresh=True skips the cached copy (used by background refresh jobs).
+    """
+    key = quote_cache_key(symbol, asset_type)
+    if not refresh:
+        quote = _snapshot_quote(symbol, asset_type)
+        if quote is not None:
+            return quote
+        entry = get_tier('quotes').get(key)
+        if entry is not None:
+            return _serve_entry(symbol, asset_type, key, entry)
+
+    stats['misses'] += 1
+    return _fill(symbol, asset_type, key)
+
+
+def get_quotes_batch(symbols, asset_type='stock', refresh=False):
+    """
+    Quotes for many symbols of one asset type: cached ones in a single cache
+    round trip, the rest in one routed get_many call. Symbols another thread
+    or worker process is already fetching wait for that fetch instead.
+    Returns {symbol: quote}.
+    """
+    keys = {symbol: quote_cache_key(symbol, asset_type) for symbol in dict.fromkeys(symbols)}
+    quotes = {}
+    if not refresh:
+        for symbol in keys:
+            quote = _snapshot_quote(symbol, asset_type)
+            if quote is not None:
+                quotes[symbol] = quote
+        entries = get_tier('quotes').get_many([key for symbol, key in keys.items() if symbol not in quotes])
+        for symbol, key in keys.items():
+            if key in entries:
+                quotes[symbol] = _serve_entry(symbol, asset_type, key, entries[key])
+
+    missing = {keys[symbol]: symbol for symbol in keys if symbol not in quotes}
+    if missing:
+        stats['misses'] += len(missing)
+        # Symbols another thread of this worker is already fetching (one by
+        # one or in its own batch) wait for that call
+        filled = _flight.do_many(list(missing), lambda led: _fill_many_shared(led, missing, asset_type))
+        quotes.update({symbol: filled[key] for symbol, key in keys.items() if symbol not in quotes})
+    return quotes
+
+
+def _fill_many_shared(led_keys, symbols_by_key, asset_type):
+    """
+    _fill_shared for a batch: fetches the keys whose fill lock this worker
+    gets, waits for the ones other workers hold, and fetches whatever those
+    did not deliver. Returns {key: quote}.
+    """
+    since = time.time()
+    tokens = {key: acquire_lock(f'{key}:inflight', FILL_LOCK_TIMEOUT) for key in led_keys}
+    try:
+        owned = [key for key, token in tokens.items() if token is not None]
+        quotes = _fetch_many_and_store(owned, symbols_by_key, asset_type) if owned else {}
+
+        held = [key for key, token in tokens.items() if token is None]
+        if held:
+            landed = _wait_for_fills(held, since)
+            stats['coalesced'] += len(landed)
+            quotes.update(landed)
+            leftover = [key for key in held if key not in landed]
+            if leftover:
+                # As in _fill_shared: fetch anyway, locking only what is free now
+                for key in leftover:
+                    tokens[key] = acquire_lock(f'{key}:inflight', FILL_LOCK_TIMEOUT)
+                quotes.update(_fetch_many_and_store(leftover, symbols_by_key, asset_type))
+        return quotes
+    finally:
+        for key, token in tokens.items():
+            release_lock(f'{key}:inflight', token)
+
+
+def _fetch_many_and_store(led_keys, symbols_by_key, asset_type):
+    """One routed get_many for the keys' symbols, cached; returns {key: quote}"""
+    fetched = get_quote_router().get_many([symbols_by_key[key] for key in led_keys], asset_type)
+    fetched_at = time.time()
+    quotes = {key: fetched[symbols_by_key[key]] for key in led_keys}
+    get_tier('quotes').set_many(
+        {
+            key: {'quote': quote, 'fetched_at': fetched_at}
+            for key, quote in quotes.items() if quote.get('success')
+        },
+        quote_ttls(asset_type)[1]
+    )
+    stats['errors'] += sum(1 for quote in quotes.values() if not quote.get('success'))
+    return quotes
+
+
+def get_quotes(pairs, timeout=None):
+    """
+    Quotes for many (symbol, asset_type) pairs, fetched concurrently.
+    Returns {pair: quote}; pairs still being fetched when `timeout` seconds
+    have passed map to None. Those fetches keep running and land in the
+    cache for the next request.
+    """
+    # Each fetch runs in a copy of the caller's context, so it keeps the
+    # caller's rate-limit priority
+    futures = {
+        pair: _fanout_pool.submit(contextvars.copy_context().run, get_quote, pair[0], pair[1])
+        for pair in dict.fromkeys(pairs)
+    }
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    quotes = {}
+    for pair, future in futures.items():
+        if future not in done:
+            quotes[pair] = None
+            continue
+        try:
+            quotes[pair] = future.result()
+        except Exception as e:
+            logger.error(f"Quote fetch raised for {pair[0]}: {str(e)}")
+            quotes[pair] = {'success': False, 'error': str(e)}
+    return quotes
@@ -0,0 +1,313 @@
+# calc/quote_providers.py
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Name of the static-price provider; quotes from it are estimates, not market data
+ESTIMATES = 'current_estimates'
+
+# Recent calls remembered per provider for the latency/error figures
+HEALTH_WINDOW = 100
+
+# Seconds a failed call is counted as costing on top of its latency, so a
+# fast provider that errors half the time ranks behind a slower reliable one
+ERROR_PENALTY = 10.0
+
+# Every Nth routed call tries a runner-up first, so a provider that has
+# recovered gets the chance to win its place back
+EXPLORE_EVERY = 20
+
+
+class ProviderError(Exception):
+    """The upstream call failed (as opposed to the symbol not being covered)"""
+
+
+def make_quote(symbol, last_price, change_amount=0.0, change_percent=0.0, *, provider,
+               symbol_type='stock', company_name=None, volume=0, market_cap=0, quote_time=None):
+    """
+    Quote in the schema every provider returns. 'change' is the percent
+    change, as the search API has always sent it; 'change_amount' is absolute.
+    """
+    return {
+        'symbol': symbol,
+        'company_name': company_name or symbol,
+        'last_price': float(last_price),
+        'change': float(change_percent),
+        'change_amount': float(change_amount),
+        'change_percent': float(change_percent),
+        'volume': int(volume or 0),
+        'market_cap': market_cap or 0,
+        'quote_time': quote_time,
+        'success': True,
+        'data_source': provider,
+        'type': symbol_type,
+    }
+
+
+def _from_exchange_row(row, provider, symbol_type):
+    """Quote from a fetcher row in StockData shape (change absolute, pchange percent)"""
+    return make_quote(
+        row['symbol'], row['last_price'], row.get('change', 0), row.get('pchange', 0),
+        provider=provider, symbol_type=symbol_type, company_name=row.get('company_name'),
+        volume=row.get('volume'), market_cap=row.get('market_cap'), quote_time=row.get('quote_time'),
+    )
+
+
+def _bare_symbol(symbol):
+    return symbol.replace('.NS', '').strip().upper()
+
+
+class QuoteProvider:
+    """
+    One upstream source of quotes. fetch_many returns {symbol: quote} for the
+    symbols it has, and raises ProviderError when the upstream call failed.
+    """
+    name = None
+    asset_types = ('stock',)
+    # Only used once every other provider has failed
+    fallback_only = False
+    # Smallest batch worth sending to this provider
+    min_batch = 1
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+
+    def supports(self, symbol, symbol_type):
+        return symbol_type in self.asset_types
+
+    def fetch_many(self, symbols, symbol_type):
+        raise NotImplementedError
+
+
+class NSELiveProvider(QuoteProvider):
+    """quote-equity per symbol through NSELiveFetcher"""
+    name = 'nse'
+
+    def __init__(self, timeout=10):
+        super().__init__(timeout)
+        self._fetcher_instance = None
+        self._lock = threading.Lock()
+
+    def _fetcher(self):
+        # One fetcher for all threads: its session sits on the shared,
+        # thread-safe connection pools, so the homepage handshake happens once
+        with self._lock:
+            if self._fetcher_instance is None:
+                from .nse_live_fetcher import NSELiveFetcher
+                self._fetcher_instance = NSELiveFetcher(timeout=self.timeout)
+        return self._fetcher_instance
+
+    def supports(self, symbol, symbol_type):
+        return symbol_type == 'stock' and not symbol.startswith('^') and not symbol.endswith('.BO')
+
+    def fetch_many(self, symbols, symbol_type):
+        fetcher = self._fetcher()
+        quotes = {}
+        for symbol in symbols:
+            row = fetcher.get_stock_data(_bare_symbol(symbol))
+            if row:
+                quotes[symbol] = _from_exchange_row(row, self.name, symbol_type)
+        if not quotes:
+            raise ProviderError(f"No response for {len(symbols)} symbols")
+        return quotes
+
+
+class NSEBulkProvider(NSELiveProvider):
+    """The NIFTY 500 equity-stockIndices payload through NSELiveFetcher"""
+    name = 'nse_bulk'
+    index_name = 'NIFTY 500'
+    # One request returns all 500 constituents: only worth it for batches
+    min_batch = 20
+
+    def fetch_many(self, symbols, symbol_type):
+        # get_index_snapshot leaves out the index's own row and keeps each
+        # row's lastUpdateTime as quote_time
+        rows = {row['symbol']: row for row in self._fetcher().get_index_snapshot(self.index_name)}
+        if not rows:
+            raise ProviderError(f"No {self.index_name} snapshot")
+        return {
+            symbol: _from_exchange_row(rows[_bare_symbol(symbol)], self.name, symbol_type)
+            for symbol in symbols if _bare_symbol(symbol) in rows
+        }
+
+
+class YahooProvider(QuoteProvider):
+    """Multi-ticker yfinance downloads through YahooNSEFetcher"""
+    name = 'yahoo'
+    asset_types = ('stock', 'index')
+
+    def supports(self, symbol, symbol_type):
+        return symbol_type in self.asset_types
+
+    def fetch_many(self, symbols, symbol_type):
+        from .yahoo_nse_fetcher import YahooNSEFetcher
+
+        # Index tickers (^NSEI) and .BO listings go as they are, bare NSE symbols get .NS
+        tickers = {
+            symbol if symbol.startswith('^') or '.' in symbol else f'{symbol}.NS': symbol
+            for symbol in symbols
+        }
+        rows = YahooNSEFetcher().fetch_batch(list(tickers))
+        if not rows:
+            raise ProviderError(f"No data for {len(symbols)} tickers")
+
+        by_ticker = {ticker.replace('.NS', ''): symbol for ticker, symbol in tickers.items()}
+        quotes = {}
+        for row in rows:
+            symbol = by_ticker.get(row['symbol'])
+            if symbol is not None:
+                quotes[symbol] = _from_exchange_row(row, self.name, symbol_type)
+        return quotes
+
+
+class EstimatesProvider(QuoteProvider):
+    """Static price table; never fails, so it is the last resort"""
+    name = ESTIMATES
+    asset_types = ('stock', 'index')
+    fallback_only = True
+
+    def fetch_many(self, symbols, symbol_type):
+        from .stock_utils import stock_fetcher
+        return stock_fetcher.get_many(symbols, symbol_type)
+
+
+PROVIDER_CLASSES = {
+    provider.name: provider
+    for provider in (NSEBulkProvider, NSELiveProvider, YahooProvider, EstimatesProvider)
+}
+
+DEFAULT_PROVIDERS = ['nse_bulk', 'nse', 'yahoo', ESTIMATES]
+
+
+class ProviderHealth:
+    """Latency and outcome of a provider's recent calls"""
+
+    def __init__(self, window=HEALTH_WINDOW):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.outcomes.append(ok)
+
+    def percentile(self, pct):
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))]
+
+    def error_rate(self):
+        with self._lock:
+            outcomes = list(self.outcomes)
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def score(self):
+        """Expected cost of a call in seconds; lower is healthier, untried is 0"""
+        return self.percentile(95) + self.error_rate() * ERROR_PENALTY
+
+    def report(self):
+        return {
+            'calls': len(self.outcomes),
+            'p50': round(self.percentile(50), 3),
+            'p95': round(self.percentile(95), 3),
+            'error_rate': round(self.error_rate(), 3),
+        }
+
+
+class QuoteRouter:
+    """
+    Sends each request to the healthiest provider that can serve it and fails
+    over to the next one for whatever it did not return. Same interface as
+    RateLimitedStockFetcher (get_stock_data / get_many).
+    """
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+        self.health = {provider.name: ProviderHealth() for provider in self.providers}
+        self._calls = itertools.count(1)
+
+    def _ranked(self, batch_size, symbol_type):
+        live = [
+            provider for provider in self.providers
+            if not provider.fallback_only and symbol_type in provider.asset_types
+            and batch_size >= provider.min_batch
+        ]
+        # Stable sort: the configured order breaks ties, e.g. before any calls
+        live.sort(key=lambda provider: self.health[provider.name].score())
+        if len(live) > 1 and next(self._calls) % EXPLORE_EVERY == 0:
+            live.insert(0, live.pop(random.randrange(1, len(live))))
+        return live + [provider for provider in self.providers if provider.fallback_only]
+
+    def get_stock_data(self, symbol, symbol_type='stock'):
+        return self.get_many([symbol], symbol_type)[symbol]
+
+    def get_many(self, symbols, symbol_type='stock'):
+        """
+        Quotes for several symbols, one call per provider tried.
+        Returns {symbol: quote}; symbols no provider had get success=False and an error.
+        """
+        missing = list(dict.fromkeys(symbols))
+        results = {}
+        for provider in self._ranked(len(missing), symbol_type):
+            batch = [symbol for symbol in missing if provider.supports(symbol, symbol_type)]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            try:
+                fetched = provider.fetch_many(batch, symbol_type)
+                ok = True
+            except Exception as e:
+                logger.warning(f"Provider {provider.name} failed for {len(batch)} symbols: {str(e)}")
+                fetched, ok = {}, False
+            # Per symbol, so batch and single calls are comparable
+            self.health[provider.name].record((time.monotonic() - started) / len(batch), ok)
+
+            results.update(
+                (symbol, quote) for symbol, quote in fetched.items() if quote.get('success')
+            )
+            missing = [symbol for symbol in missing if symbol not in results]
+            if not missing:
+                break
+
+        for symbol in missing:
+            results[symbol] = {
+                'symbol': symbol,
+                'success': False,
+                'error': 'No provider returned data',
+                'type': symbol_type,
+            }
+        return results
+
+    def health_report(self):
+        """{provider: {'calls', 'p50', 'p95', 'error_rate'}} for this process"""
+        return {name: health.report() for name, health in self.health.items()}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_quote_router():
+    """Process-wide router over the providers named in QUOTE_PROVIDERS"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                timeout = getattr(settings, 'QUOTE_PROVIDER_TIMEOUT', 5)
+                _router = QuoteRouter(
+                    PROVIDER_CLASSES[name](timeout=timeout)
+                    for name in getattr(settings, 'QUOTE_PROVIDERS', DEFAULT_PROVIDERS)
+                )
+    return _router
@@ -0,0 +1,244 @@
+# calc/quote_snapshot.py
+"""
+Quote snapshot shared by every worker on a host through one memory-mapped
+file. The ingestion side rewrites it once per refresh pass
+(stock_store.publish_snapshot); request workers map it read-only and read
+quotes straight out of the page cache.
+
+Layout (little endian, sections padded to 8 bytes):
+    header   magic, format version, count, written_at, symbols size,
+             company names size
+    offsets  uint32 x (count + 1): symbol i is symbols[offsets[i]:offsets[i+1]]
+    symbols  UTF-8 symbols, sorted
+    offsets  uint32 x (count + 1), the same for company names
+    names    UTF-8 company names, in symbol order
+    columns  count doubles each: last_price, change_amount, change_percent,
+             quote_time, fetched_at (epoch seconds, NaN when unknown),
+             then count int64 each: volume, market_cap (0 when unknown)
+A new snapshot is written to a temporary file and renamed over the old one,
+so a reader always sees one complete snapshot: readers that mapped the old
+file keep it until they notice the swap.
+"""
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from .file_locks import file_lock
+
+MAGIC = b'RMQSNAP1'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<8sIIdII')
+FLOAT_COLUMNS = ('last_price', 'change_amount', 'change_percent', 'quote_time', 'fetched_at')
+INT_COLUMNS = ('volume', 'market_cap')
+
+# Seconds a reader trusts its mapping before checking whether the file was swapped
+RELOAD_CHECK_INTERVAL = 1.0
+
+SNAPSHOT_SOURCE = 'snapshot'
+
+
+def snapshot_path():
+    return Path(getattr(settings, 'QUOTE_SNAPSHOT_PATH', Path(tempfile.gettempdir()) / 'rm_calc_quotes.snap'))
+
+
+def _pad(size):
+    return (size + 7) & ~7
+
+
+def _epoch(value):
+    if value is None:
+        return math.nan
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def _pack_strings(strings):
+    """(offsets section, blob section, blob size) for a list of strings"""
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    blob = b''.join(encoded)
+    return (
+        struct.pack(f'<{len(offsets)}I', *offsets).ljust(_pad(4 * len(offsets)), b'\0'),
+        blob.ljust(_pad(len(blob)), b'\0'),
+        len(blob),
+    )
+
+
+def _unpack_strings(view, position, count, size):
+    """(strings, position after them) for a section written by _pack_strings"""
+    offsets = view[position:position + 4 * (count + 1)].cast('I')
+    position += _pad(4 * (count + 1))
+    blob = view[position:position + size]
+    strings = [bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(count)]
+    return strings, position + _pad(size)
+
+
+def write_snapshot(entries, path=None):
+    """
+    Write {symbol: {'last_price', 'change_amount', 'change_percent', 'volume',
+    'quote_time', 'fetched_at', 'company_name', 'market_cap'}} as a new
+    snapshot and swap it in atomically.
+    """
+    path = Path(path or snapshot_path())
+    symbols = sorted(entries)
+    count = len(symbols)
+    symbol_offsets, symbol_blob, symbols_size = _pack_strings(symbols)
+    name_offsets, name_blob, names_size = _pack_strings(
+        [entries[symbol].get('company_name') or symbol for symbol in symbols]
+    )
+
+    parts = [
+        HEADER.pack(MAGIC, FORMAT_VERSION, count, time.time(), symbols_size, names_size),
+        symbol_offsets, symbol_blob, name_offsets, name_blob,
+    ]
+    for column in FLOAT_COLUMNS:
+        parts.append(struct.pack(f'<{count}d', *(_epoch(entries[symbol].get(column)) for symbol in symbols)))
+    for column in INT_COLUMNS:
+        parts.append(struct.pack(f'<{count}q', *(int(entries[symbol].get(column) or 0) for symbol in symbols)))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b''.join(parts))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class QuoteSnapshot:
+    """Read-only view of one snapshot file; columns are memoryviews over the mapping"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is not a quote snapshot")
+        magic, version, count, self.written_at, symbols_size, names_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} quote snapshot")
+        self.count = count
+
+        view = memoryview(self._map)
+        symbols, position = _unpack_strings(view, HEADER.size, count, symbols_size)
+        # The only per-process copies: symbol -> row and the company names,
+        # built once per mapping
+        self.names, position = _unpack_strings(view, position, count, names_size)
+        self.rows = {symbol: i for i, symbol in enumerate(symbols)}
+
+        self.columns = {}
+        for column in FLOAT_COLUMNS:
+            self.columns[column] = view[position:position + 8 * count].cast('d')
+            position += 8 * count
+        for column in INT_COLUMNS:
+            self.columns[column] = view[position:position + 8 * count].cast('q')
+            position += 8 * count
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, symbol):
+        return symbol in self.rows
+
+    def get(self, symbol, symbol_type='stock'):
+        """Quote for symbol in the provider schema, or None"""
+        row = self.rows.get(symbol)
+        if row is None:
+            return None
+        columns = self.columns
+        quote_time = columns['quote_time'][row]
+        return {
+            'symbol': symbol,
+            'company_name': self.names[row],
+            'last_price': columns['last_price'][row],
+            'change': columns['change_percent'][row],
+            'change_amount': columns['change_amount'][row],
+            'change_percent': columns['change_percent'][row],
+            'volume': columns['volume'][row],
+            'market_cap': columns['market_cap'][row],
+            'quote_time': None if math.isnan(quote_time) else datetime.fromtimestamp(quote_time, timezone.utc),
+            'success': True,
+            'data_source': SNAPSHOT_SOURCE,
+            'type': symbol_type,
+            'fetched_at': columns['fetched_at'][row],
+        }
+
+    def entries(self):
+        """Every row as a dict, for merging into the next snapshot"""
+        return {
+            symbol: {
+                **{column: self.columns[column][row] for column in FLOAT_COLUMNS + INT_COLUMNS},
+                'company_name': self.names[row],
+            }
+            for symbol, row in self.rows.items()
+        }
+
+
+_snapshot = None
+_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """This process's mapping of the current snapshot (None if there is none yet)"""
+    global _snapshot, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return _snapshot
+
+    with _snapshot_lock:
+        if now - _checked_at >= RELOAD_CHECK_INTERVAL:
+            path = snapshot_path()
+            try:
+                stat = os.stat(path)
+                if _snapshot is None or _snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+                    _snapshot = QuoteSnapshot(path)
+            except (OSError, ValueError):
+                _snapshot = None
+            _checked_at = now
+    return _snapshot
+
+
+def update_snapshot(rows, fetched_at=None):
+    """
+    Merge refresh rows (StockData shape: change absolute, pchange percent)
+    into the snapshot, rewriting the file once. Writers on the host take turns
+    through a lock file. A row without company_name or market_cap keeps the
+    ones already in the snapshot.
+    """
+    path = snapshot_path()
+    fetched_at = fetched_at or time.time()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with file_lock(f'{path}.lock'):
+        try:
+            entries = QuoteSnapshot(path).entries() if path.exists() else {}
+        except ValueError:
+            entries = {}
+        for row in rows:
+            if row.get('last_price') is None:
+                continue
+            previous = entries.get(row['symbol'], {})
+            entries[row['symbol']] = {
+                'company_name': row.get('company_name') or previous.get('company_name'),
+                'market_cap': row['market_cap'] if row.get('market_cap') is not None else previous.get('market_cap'),
+                'last_price': float(row['last_price']),
+                'change_amount': float(row.get('change') or 0),
+                'change_percent': float(row.get('pchange') or 0),
+                'volume': row.get('volume') or 0,
+                'quote_time': _epoch(row.get('quote_time')),
+                'fetched_at': fetched_at,
+            }
+        write_snapshot(entries, path)
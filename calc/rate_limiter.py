@@ -0,0 +1,131 @@
+# calc/rate_limiter.py
+import contextlib
+import contextvars
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .cache_locks import acquire_lock, release_lock
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Per provider: `rate` requests per second on average, bursts of up to
+# `burst`, and `reserve` tokens that only interactive callers may spend, so
+# a refresh job can never use up the budget a user search needs.
+# Override with RATE_LIMITS in settings.
+DEFAULT_RATE_LIMITS = {
+    'nse': {'rate': 3.0, 'burst': 6, 'reserve': 2},
+    'yahoo': {'rate': 2.0, 'burst': 4, 'reserve': 1},
+}
+FALLBACK_RATE_LIMIT = {'rate': 1.0, 'burst': 2, 'reserve': 0}
+
+# The bucket's read-modify-write happens under a short cache lock
+LOCK_TIMEOUT = 2
+LOCK_POLL_INTERVAL = 0.005
+
+# Priority of the calls made by the current request or job. Searches set
+# INTERACTIVE; anything that does not say otherwise is background work.
+current_priority = contextvars.ContextVar('rate_limit_priority', default=BACKGROUND)
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """Run the enclosed provider calls at `priority`"""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class RateLimitedError(Exception):
+    """No token became available within the caller's timeout"""
+
+
+class TokenBucket:
+    """Token bucket kept in the shared cache, so all worker processes draw from one budget"""
+
+    def __init__(self, name, rate, burst, reserve=0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1)
+        self.key = f'ratelimit:{name}'
+        self.lock_key = f'ratelimit:{name}:lock'
+
+    @contextlib.contextmanager
+    def _locked(self):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        token = acquire_lock(self.lock_key, LOCK_TIMEOUT)
+        while token is None and time.monotonic() <= deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            token = acquire_lock(self.lock_key, LOCK_TIMEOUT)
+        # Still no lock: a holder died mid-update and its lock is about to
+        # expire. Go ahead unlocked (at worst one extra token is spent), but
+        # never release a lock this call does not own.
+        try:
+            yield
+        finally:
+            release_lock(self.lock_key, token)
+
+    def _take(self, priority):
+        """Take a token if one is free at this priority; else seconds until one is"""
+        # Background callers leave `reserve` tokens in the bucket
+        floor = 0 if priority == INTERACTIVE else self.reserve
+        with self._locked():
+            now = time.time()
+            state = cache.get(self.key) or {'tokens': float(self.burst), 'at': now}
+            tokens = min(self.burst, state['tokens'] + max(now - state['at'], 0) * self.rate)
+            if tokens - 1 >= floor:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (floor + 1 - tokens) / self.rate
+            # Idle buckets simply expire, which is the same as a full bucket
+            cache.set(self.key, {'tokens': tokens, 'at': now}, int(self.burst / self.rate) + 60)
+        return wait
+
+    def acquire(self, priority=None, timeout=None):
+        """
+        Block until a token is available. Returns False if that would take
+        longer than timeout seconds (None waits as long as it takes).
+        """
+        priority = priority or current_priority.get()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take(priority)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining < wait:
+                    return False
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    """Shared token bucket for provider, configured from RATE_LIMITS"""
+    bucket = _buckets.get(provider)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(provider)
+            if bucket is None:
+                limits = {**DEFAULT_RATE_LIMITS, **getattr(settings, 'RATE_LIMITS', {})}
+                bucket = _buckets[provider] = TokenBucket(provider, **limits.get(provider, FALLBACK_RATE_LIMIT))
+    return bucket
+
+
+def throttle(provider, timeout=None):
+    """
+    Wait for a token from provider's bucket. Interactive callers give up with
+    RateLimitedError after timeout seconds; background ones wait as long as it takes.
+    """
+    if current_priority.get() != INTERACTIVE:
+        timeout = None
+    if not get_rate_limiter(provider).acquire(timeout=timeout):
+        raise RateLimitedError(f"No {provider} request slot within {timeout}s")
@@ -0,0 +1,84 @@
+# calc/refresh.py
+import math
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from .models import CalculationHistory, StockData
+from .market_calendar import get_scheduler
+
+# Demand = saved calculations in the last DEMAND_WINDOW_DAYS (each worth
+# SAVE_WEIGHT searches) plus searches counted in the cache
+DEMAND_WINDOW_DAYS = 30
+SAVE_WEIGHT = 5
+SEARCH_DEMAND_TIMEOUT = 30 * 24 * 3600
+
+
+def _demand_key(symbol):
+    return f'search_demand:{symbol}'
+
+
+def record_search_demand(symbols):
+    """Count a search hit for each symbol (cheap cache increments)"""
+    for symbol in symbols:
+        key = _demand_key(symbol)
+        if not cache.add(key, 1, SEARCH_DEMAND_TIMEOUT):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Expired between add and incr
+                cache.set(key, 1, SEARCH_DEMAND_TIMEOUT)
+
+
+def search_counts(symbols):
+    """{symbol: recorded searches} for the symbols searched at least once"""
+    searched = cache.get_many([_demand_key(symbol) for symbol in symbols])
+    return {symbol: searched[_demand_key(symbol)] for symbol in symbols if _demand_key(symbol) in searched}
+
+
+def restore_search_demand(counts):
+    """Put back counts saved by search_counts, keeping any recorded since"""
+    for symbol, count in counts.items():
+        cache.add(_demand_key(symbol), count, SEARCH_DEMAND_TIMEOUT)
+
+
+def demand(symbols):
+    """{symbol: demand score} from saved calculations and recorded searches"""
+    since = timezone.now() - timedelta(days=DEMAND_WINDOW_DAYS)
+    saved = dict(
+        CalculationHistory.objects.filter(timestamp__gte=since)
+        .values('symbol').annotate(count=Count('id')).values_list('symbol', 'count')
+    )
+    searched = cache.get_many([_demand_key(symbol) for symbol in symbols])
+    return {
+        symbol: saved.get(symbol, 0) * SAVE_WEIGHT + searched.get(_demand_key(symbol), 0)
+        for symbol in symbols
+    }
+
+
+def refresh_order(symbols, force=False, scheduler=None):
+    """
+    Symbols most due for a refresh first: seconds since last checked, weighted
+    by demand. Never-fetched symbols come first; symbols the market-hours
+    scheduler says are not due yet are left out unless force.
+    """
+    scheduler = scheduler or get_scheduler()
+    now = scheduler.calendar.now()
+    checked = {
+        symbol: checked_at or updated_at
+        for symbol, checked_at, updated_at
+        in StockData.objects.values_list('symbol', 'checked_at', 'updated_at')
+    }
+    weights = demand(symbols)
+
+    scored = []
+    for symbol in dict.fromkeys(symbols):
+        last = checked.get(symbol)
+        if not force and not scheduler.is_due(symbol, last, now):
+            continue
+        weight = 1 + math.log1p(weights[symbol])
+        score = math.inf if last is None else (now - last).total_seconds() * weight
+        scored.append((score, weight, symbol))
+
+    scored.sort(reverse=True)
+    return [symbol for _, _, symbol in scored]
@@ -0,0 +1,228 @@
+# calc/search_index.py
+import heapq
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+SearchHit = namedtuple(
+    'SearchHit', ['symbol', 'name', 'kind', 'ticker', 'priority', 'score'], defaults=(None,)
+)
+
+# Every substring up to this length is indexed directly, so short queries are
+# a single dict lookup. Longer queries intersect their trigram postings and
+# verify the (few) surviving candidates.
+MAX_GRAM = 3
+
+# Fuzzy matching: queries shorter than this are too ambiguous to correct,
+# and suggestions scoring below FUZZY_MIN_SCORE are dropped.
+FUZZY_MIN_LENGTH = 4
+FUZZY_MIN_SCORE = 0.7
+FUZZY_CANDIDATES = 12
+
+# Words that carry no signal in company names
+NAME_STOPWORDS = {'LIMITED', 'LTD', 'INDIA', 'OF', 'AND', 'THE', 'COMPANY', 'CORPORATION'}
+
+
+def _grams(text):
+    """All distinct substrings of text up to MAX_GRAM characters"""
+    grams = set()
+    for size in range(1, MAX_GRAM + 1):
+        for i in range(len(text) - size + 1):
+            grams.add(text[i:i + size])
+    return grams
+
+
+def _compact(text):
+    """Uppercase text with spaces and punctuation removed"""
+    return ''.join(ch for ch in text.upper() if ch.isalnum())
+
+
+def _trigrams(text):
+    """Padded trigrams, so word starts and ends weigh in"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b):
+    """Levenshtein distance counting adjacent transpositions as one edit"""
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        row = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+def _similarity(query, key):
+    """0..1 score of query against key, also trying key's prefix for partial input"""
+    score = 1 - _edit_distance(query, key) / max(len(query), len(key))
+    if len(key) > len(query):
+        prefix = key[:len(query)]
+        score = max(score, 0.95 * (1 - _edit_distance(query, prefix) / len(query)))
+    return score
+
+
+class StockSearchIndex:
+    """
+    In-memory n-gram index over stock symbols, company names and index aliases.
+    Built once per process; lookups never scan the whole universe.
+    """
+
+    def __init__(self, stocks, indices):
+        self.entries = []
+        self._entry_ids = {}
+        self._symbol_grams = defaultdict(set)
+        self._name_grams = defaultdict(set)
+        self._fuzzy_keys = []
+        self._fuzzy_grams = defaultdict(set)
+        self.stock_count = 0
+        self.index_count = 0
+
+        for alias, ticker in indices.items():
+            self._add(alias, f'{alias} Index', 'index', ticker)
+            self.index_count += 1
+        for symbol, company_name in stocks.items():
+            self._add(symbol, company_name, 'stock', symbol)
+            self.stock_count += 1
+
+    def _add(self, symbol, name, kind, ticker):
+        entry_id = len(self.entries)
+        symbol_key = symbol.upper()
+        name_key = name.upper()
+        self.entries.append((symbol_key, name, kind, ticker, name_key))
+        self._entry_ids[(symbol_key, kind)] = entry_id
+
+        for gram in _grams(symbol_key):
+            self._symbol_grams[gram].add(entry_id)
+        # Index names are just "<alias> Index", only stock names are searchable
+        if kind == 'stock':
+            for gram in _grams(name_key):
+                self._name_grams[gram].add(entry_id)
+
+        # Spelling-insensitive keys: compact symbol and compact name sans stopwords
+        keys = {_compact(symbol)}
+        if kind == 'stock':
+            words = [w for w in name_key.replace('.', ' ').split() if w not in NAME_STOPWORDS]
+            keys.add(_compact(' '.join(words)))
+        keys.discard('')
+        for key in keys:
+            key_id = len(self._fuzzy_keys)
+            grams = _trigrams(key)
+            self._fuzzy_keys.append((entry_id, key, len(grams)))
+            for gram in grams:
+                self._fuzzy_grams[gram].add(key_id)
+
+    def entry_id(self, symbol, kind):
+        """Position of an entry; the same in every process built from the same universe"""
+        return self._entry_ids.get((symbol, kind))
+
+    def hit(self, entry_id, priority, score=None):
+        symbol, name, kind, ticker, _ = self.entries[entry_id]
+        return SearchHit(symbol, name, kind, ticker, priority, score)
+
+    def _lookup(self, postings, query, field):
+        """Entry ids whose field contains query as a substring"""
+        if len(query) <= MAX_GRAM:
+            return postings.get(query, set())
+
+        grams = sorted(
+            (postings.get(query[i:i + MAX_GRAM], set()) for i in range(len(query) - MAX_GRAM + 1)),
+            key=len
+        )
+        candidates = set(grams[0])
+        for ids in grams[1:]:
+            if not candidates:
+                break
+            candidates &= ids
+        return {i for i in candidates if query in self.entries[i][field]}
+
+    def search(self, query, stock_limit=15, index_limit=3):
+        """
+        Ranked candidates for query: matching indices first, then stocks by
+        exact symbol (1), symbol substring (2) and company name (3).
+        """
+        query = query.strip().upper()
+        if not query:
+            return []
+
+        index_hits = []
+        stock_hits = {}
+        for entry_id in self._lookup(self._symbol_grams, query, 0):
+            symbol, name, kind, ticker, _ = self.entries[entry_id]
+            if kind == 'index':
+                # Short fragments like "NI" would match every NIFTY index
+                if query == symbol or len(query) >= 3:
+                    index_hits.append(SearchHit(symbol, name, kind, ticker, 1))
+            else:
+                priority = 1 if symbol == query else 2
+                stock_hits[entry_id] = SearchHit(symbol, name, kind, ticker, priority)
+
+        for entry_id in self._lookup(self._name_grams, query, 4):
+            if entry_id not in stock_hits:
+                symbol, name, kind, ticker, _ = self.entries[entry_id]
+                stock_hits[entry_id] = SearchHit(symbol, name, kind, ticker, 3)
+
+        def rank(hit):
+            return (hit.priority, not hit.symbol.startswith(query), len(hit.symbol), hit.symbol)
+
+        return (
+            heapq.nsmallest(index_limit, index_hits, key=rank)
+            + heapq.nsmallest(stock_limit, stock_hits.values(), key=rank)
+        )
+
+    def suggest(self, query, limit=10, min_score=FUZZY_MIN_SCORE):
+        """
+        Typo-tolerant suggestions ranked by score (priority 4). Candidates come
+        from shared trigrams, only the best few are edit-distance scored.
+        """
+        query = _compact(query)
+        if len(query) < FUZZY_MIN_LENGTH:
+            return []
+
+        query_grams = _trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._fuzzy_grams.get(gram, ()))
+
+        # Dice coefficient over trigrams picks the candidates worth scoring
+        def dice(key_id):
+            return 2 * shared[key_id] / (len(query_grams) + self._fuzzy_keys[key_id][2])
+
+        best = {}
+        for key_id in heapq.nlargest(FUZZY_CANDIDATES, shared, key=dice):
+            entry_id, key, _ = self._fuzzy_keys[key_id]
+            score = _similarity(query, key)
+            if score >= min_score and score > best.get(entry_id, 0):
+                best[entry_id] = score
+
+        hits = []
+        for entry_id, score in best.items():
+            symbol, name, kind, ticker, _ = self.entries[entry_id]
+            hits.append(SearchHit(symbol, name, kind, ticker, 4, round(score, 3)))
+
+        hits.sort(key=lambda hit: (-hit.score, hit.kind != 'index', hit.symbol))
+        return hits[:limit]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_search_index(build, version=None):
+    """Process-wide index, built on first use by calling build() and rebuilt when version changes"""
+    global _index, _index_version
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                _index = build()
+                _index_version = version
+    return _index
+
+
+def current_index():
+    """(index, version) as last built in this process, (None, None) before the first build"""
+    return _index, _index_version
@@ -1,22 +1,23 @@
-import requests
 import json
 from datetime import datetime
 import time
+from .circuit_breaker import guarded_get
+from .http_client import PooledSession
 
 class NSEStockDataFetcher:
     """
     NSE Stock Data Fetcher with fallback mechanisms
     """
     
-    def __init__(self):
+    def __init__(self, timeout=10):
         self.base_url = "https://www.nseindia.com/api"
-        self.session = requests.Session()
+        self.timeout = timeout
+        self.session = PooledSession()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': '*/*',
             'Accept-Language': 'en-US,en;q=0.9',
             'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
         })
     
     def get_all_stocks(self):
@@ -31,7 +32,7 @@ class NSEStockDataFetcher:
         """Try to fetch from NSE API"""
         try:
             url = f"{self.base_url}/equity-stockIndices?index=NIFTY%20500"
-            response = self.session.get(url, timeout=10)
+            response = guarded_get(self.session, 'nse:equity-stockIndices', url, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
@@ -202,7 +203,7 @@ class NSEStockDataFetcher:
         """Get detailed quote for a specific stock"""
         try:
             url = f"{self.base_url}/quote-equity?symbol={symbol}"
-            response = self.session.get(url, timeout=10)
+            response = guarded_get(self.session, 'nse:quote-equity', url, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
@@ -0,0 +1,141 @@
+# calc/stock_store.py
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .models import StockData
+from .quote_providers import ESTIMATES
+from .quote_snapshot import update_snapshot
+
+logger = logging.getLogger(__name__)
+
+# StockData columns a refresh may write, and how incoming values are normalised
+# so they compare equal to what the database hands back
+UPSERT_FIELDS = {
+    'company_name': str,
+    'last_price': lambda value: Decimal(str(value)).quantize(Decimal('0.01')),
+    'change': lambda value: Decimal(str(value)).quantize(Decimal('0.01')),
+    'pchange': lambda value: Decimal(str(value)).quantize(Decimal('0.01')),
+    'volume': lambda value: int(value or 0),
+    'market_cap': lambda value: int(value) if value is not None else None,
+    'is_active': bool,
+    'quote_time': lambda value: value,
+}
+
+# Fields that do not make a row "changed" on their own: a newer provider
+# timestamp with the same price is not worth a write
+IGNORED_FOR_CHANGES = {'quote_time'}
+
+
+def _normalise(row):
+    values = {}
+    for field, convert in UPSERT_FIELDS.items():
+        # None means the source did not provide it, not that it should be cleared
+        if row.get(field) is not None:
+            values[field] = convert(row[field])
+    return values
+
+
+def quote_row(symbol, quote, company_name=None):
+    """
+    bulk_upsert_stocks row for a quote from the quote cache/router, or None
+    if it failed. Static estimates stand in for search results, they must not
+    overwrite market data in the database.
+    """
+    if not quote.get('success') or quote.get('data_source') == ESTIMATES:
+        return None
+    return {
+        'symbol': symbol,
+        'company_name': company_name or quote.get('company_name'),
+        'last_price': quote['last_price'],
+        'change': quote['change_amount'],
+        'pchange': quote['change'],
+        'volume': quote.get('volume', 0),
+        'market_cap': quote.get('market_cap'),
+        'is_active': True,
+        'quote_time': quote.get('quote_time'),
+    }
+
+
+def bulk_upsert_stocks(rows, batch_size=500, snapshot=True):
+    """
+    Insert or update StockData from refresh rows (dicts with 'symbol' plus any
+    of UPSERT_FIELDS) using chunked INSERT ... ON CONFLICT statements in one
+    transaction. Fields a row leaves out are not touched on existing rows, and
+    rows whose values match what is stored are not written at all, so their
+    updated_at keeps meaning "last changed". With snapshot=True all rows are
+    also merged into the shared quote snapshot; a refresh pass that upserts
+    in several batches passes False and calls publish_snapshot once at the end.
+    Returns {'created': n, 'updated': n, 'unchanged': n, 'touched': n}.
+    """
+    latest = {}
+    for row in rows:
+        latest[row['symbol']] = _normalise(row)
+
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+    symbols = list(latest)
+
+    with transaction.atomic():
+        for start in range(0, len(symbols), batch_size):
+            chunk = symbols[start:start + batch_size]
+            existing = {
+                stock['symbol']: stock
+                for stock in StockData.objects.filter(symbol__in=chunk).values('symbol', *UPSERT_FIELDS)
+            }
+
+            # ON CONFLICT updates the same columns for a whole statement, so
+            # rows are grouped by which fields they carry
+            groups = {}
+            for symbol in chunk:
+                values = latest[symbol]
+                current = existing.get(symbol)
+                if current is None:
+                    counts['created'] += 1
+                    values.setdefault('company_name', symbol)
+                elif all(
+                    current[field] == value
+                    for field, value in values.items() if field not in IGNORED_FOR_CHANGES
+                ):
+                    counts['unchanged'] += 1
+                    continue
+                else:
+                    counts['updated'] += 1
+                groups.setdefault(tuple(sorted(values)), []).append(StockData(symbol=symbol, **values))
+
+            for fields, objs in groups.items():
+                StockData.objects.bulk_create(
+                    objs,
+                    update_conflicts=True,
+                    unique_fields=['symbol'],
+                    update_fields=[*fields, 'updated_at'],
+                )
+
+    counts['touched'] = counts['created'] + counts['updated']
+
+    if snapshot:
+        publish_snapshot({'symbol': symbol, **values} for symbol, values in latest.items())
+
+    logger.info(
+        f"Stock upsert: {counts['created']} created, {counts['updated']} updated, "
+        f"{counts['unchanged']} unchanged"
+    )
+    return counts
+
+
+def publish_snapshot(rows):
+    """
+    Merge refresh rows into the shared quote snapshot, one file rewrite per
+    call. Every fetched quote goes there, changed or not, so its fetched_at
+    tells readers how fresh it is.
+    """
+    try:
+        update_snapshot(rows)
+    except Exception as e:
+        logger.warning(f"Quote snapshot update failed: {str(e)}")
+
+
+def mark_checked(symbols, when=None):
+    """Record that symbols were just refreshed, in one UPDATE"""
+    return StockData.objects.filter(symbol__in=list(symbols)).update(
+        checked_at=when or timezone.now()
+    )
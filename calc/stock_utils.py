@@ -1,6 +1,3 @@
-import os
-import time
-import requests
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,38 +11,42 @@ except ImportError:
     cache = DummyCache()
 
 class RateLimitedStockFetcher:
-    def __init__(self):
-        self.api_key = os.environ.get('ALPHA_VANTAGE_API_KEY', 'demo')
-        self.base_url = "https://www.alphavantage.co/query"
-        self.session = requests.Session()
-        self.last_request_time = 0
-        self.min_delay = 12.0
-        
+    # Updated with current prices (Aug 2024)
+    STATIC_PRICES = {
+        "RELIANCE": 1420.00, "TCS": 4150.00, "HDFCBANK": 1750.00,
+        "INFY": 1850.00, "ICICIBANK": 1280.00, "HINDUNILVR": 2400.00,
+        "BHARTIARTL": 1650.00, "ITC": 485.00, "SBIN": 850.00,
+        "BAJFINANCE": 7800.00, "ASIANPAINT": 2950.00, "MARUTI": 11200.00
+    }
+
     def get_stock_data(self, symbol, symbol_type="stock"):
-        clean_symbol = symbol.replace(".NS", "").replace(".BO", "").upper()
-        
-        # Updated with current prices (Aug 2024)
-        static_prices = {
-            "RELIANCE": 1420.00, "TCS": 4150.00, "HDFCBANK": 1750.00,
-            "INFY": 1850.00, "ICICIBANK": 1280.00, "HINDUNILVR": 2400.00,
-            "BHARTIARTL": 1650.00, "ITC": 485.00, "SBIN": 850.00,
-            "BAJFINANCE": 7800.00, "ASIANPAINT": 2950.00, "MARUTI": 11200.00
-        }
-        
-        price = static_prices.get(clean_symbol, 150.00)
-        
-        return {
-            "symbol": clean_symbol,
-            "company_name": f"{clean_symbol} Limited",
-            "last_price": price,
-            "change": 0.00,
-            "change_amount": 0.00,
-            "change_percent": 0.00,
-            "volume": 0,
-            "market_cap": 0,
-            "success": True,
-            "data_source": "current_estimates",
-            "type": symbol_type
-        }
+        return self.get_many([symbol], symbol_type)[symbol]
+
+    def get_many(self, symbols, symbol_type="stock"):
+        """
+        Quotes from the static price table for several symbols in one pass.
+        Live providers and their bulk endpoints are grouped and routed by
+        QuoteRouter (calc/quote_providers.py), which uses this as its
+        last-resort fallback. Returns {symbol: quote}.
+        """
+        results = {}
+        for symbol in dict.fromkeys(symbols):
+            clean_symbol = symbol.replace(".NS", "").replace(".BO", "").upper()
+            price = self.STATIC_PRICES.get(clean_symbol, 150.00)
+
+            results[symbol] = {
+                "symbol": clean_symbol,
+                "company_name": f"{clean_symbol} Limited",
+                "last_price": price,
+                "change": 0.00,
+                "change_amount": 0.00,
+                "change_percent": 0.00,
+                "volume": 0,
+                "market_cap": 0,
+                "success": True,
+                "data_source": "current_estimates",
+                "type": symbol_type
+            }
+        return results
 
 stock_fetcher = RateLimitedStockFetcher()
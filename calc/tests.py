@@ -1,3 +1,956 @@
-from django.test import TestCase
+import io
+import json
+import math
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from . import cache_persistence, quote_cache, search_index, tiered_cache, views
+from .cache_codecs import QuoteEntryCodec, SearchHitsCodec
+from .circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .market_calendar import (
+    CLOSED as SESSION_CLOSED, IST, POST_CLOSE, PRE_OPEN, REGULAR, MarketCalendar, RefreshScheduler,
+)
+from .instrument_seed import SEED_INDICES
+from .instruments import get_universe, invalidate_universe
+from .models import Instrument, StockData, UserSettings
+from .quote_cache import get_quote, get_quotes, get_quotes_batch, quote_cache_key
+from .quote_providers import ProviderError, QuoteProvider, QuoteRouter, make_quote
+from .quote_snapshot import QuoteSnapshot, update_snapshot, write_snapshot
+from .rate_limiter import BACKGROUND, INTERACTIVE, TokenBucket
+from .refresh import record_search_demand, refresh_order, search_counts
+from .search_index import StockSearchIndex
+from .singleflight import SingleFlight
+from .stock_store import bulk_upsert_stocks
 
-# Create your tests here.
+STOCKS = {
+    'RELIANCE': 'Reliance Industries Limited',
+    'HDFCBANK': 'HDFC Bank Limited',
+    'HDFCLIFE': 'HDFC Life Insurance Company Limited',
+    'HDFCAMC': 'HDFC Asset Management Company Limited',
+    'TCS': 'Tata Consultancy Services Limited',
+    'TATASTEEL': 'Tata Steel Limited',
+}
+INDICES = {'NIFTY BANK': '^NSEBANK', 'NIFTY IT': '^CNXIT'}
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def ist(day, hour, minute=0, second=0):
+    return datetime(2026, 10, day, hour, minute, second, tzinfo=IST)
+
+
+class MarketCalendarTests(SimpleTestCase):
+    # Tuesday 2026-10-20 is a holiday; the 17th and 18th are a weekend
+    def setUp(self):
+        self.now = ist(19, 10)
+        self.calendar = MarketCalendar(['2026-10-20'], clock=lambda: self.now)
+
+    def test_phase_follows_the_session(self):
+        self.assertEqual(self.calendar.phase(ist(19, 8, 59)), SESSION_CLOSED)
+        self.assertEqual(self.calendar.phase(ist(19, 9, 5)), PRE_OPEN)
+        self.assertEqual(self.calendar.phase(ist(19, 9, 15)), REGULAR)
+        self.assertEqual(self.calendar.phase(ist(19, 15, 45)), POST_CLOSE)
+        self.assertEqual(self.calendar.phase(ist(19, 16)), SESSION_CLOSED)
+        self.assertEqual(self.calendar.phase(), REGULAR)
+
+    def test_weekends_and_holidays_are_closed(self):
+        self.assertEqual(self.calendar.phase(ist(17, 11)), SESSION_CLOSED)
+        self.assertEqual(self.calendar.phase(ist(20, 11)), SESSION_CLOSED)
+
+    def test_phase_converts_to_ist(self):
+        # 04:00 UTC is 09:30 IST
+        self.assertEqual(self.calendar.phase(datetime(2026, 10, 19, 4, tzinfo=timezone.utc)), REGULAR)
+
+    def test_last_session_end(self):
+        # Monday morning: Friday's close, over the weekend
+        self.assertEqual(self.calendar.last_session_end(ist(19, 10)), ist(16, 16))
+        # The holiday has no session of its own
+        self.assertEqual(self.calendar.last_session_end(ist(20, 12)), ist(19, 16))
+        self.assertEqual(self.calendar.last_session_end(ist(19, 16)), ist(19, 16))
+
+
+class RefreshSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = ist(19, 10)
+        calendar = MarketCalendar(['2026-10-20'], clock=lambda: self.now)
+        self.scheduler = RefreshScheduler(calendar, tier_for=lambda symbol: 'fno')
+
+    def test_never_checked_is_due(self):
+        self.assertTrue(self.scheduler.is_due('TCS', None))
+
+    def test_regular_session_uses_the_tier_interval(self):
+        # fno: every 30s in the regular session
+        self.assertFalse(self.scheduler.is_due('TCS', self.now - timedelta(seconds=20)))
+        self.assertTrue(self.scheduler.is_due('TCS', self.now - timedelta(seconds=30)))
+
+    def test_closed_refreshes_once_after_the_session(self):
+        self.now = ist(19, 20)
+        self.assertTrue(self.scheduler.is_due('TCS', ist(19, 15, 59)))
+        self.assertFalse(self.scheduler.is_due('TCS', ist(19, 16, 5)))
+        # Still not due on the holiday
+        self.assertFalse(self.scheduler.is_due('TCS', ist(19, 16, 5), at=ist(20, 11)))
+
+
+class StockSearchIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = StockSearchIndex(STOCKS, INDICES)
+
+    def symbols(self, hits):
+        return [hit.symbol for hit in hits]
+
+    def test_exact_symbol_ranks_first(self):
+        hits = self.index.search('tcs')
+        self.assertEqual(hits[0].symbol, 'TCS')
+        self.assertEqual(hits[0].priority, 1)
+
+    def test_symbol_prefix_then_company_name(self):
+        self.assertEqual(self.symbols(self.index.search('HDFC')), ['HDFCAMC', 'HDFCBANK', 'HDFCLIFE'])
+        hits = self.index.search('STEEL')
+        self.assertEqual([(hit.symbol, hit.priority) for hit in hits], [('TATASTEEL', 2)])
+        hits = self.index.search('CONSULTANCY')
+        self.assertEqual([(hit.symbol, hit.priority) for hit in hits], [('TCS', 3)])
+
+    def test_indices_come_before_stocks(self):
+        hits = self.index.search('BANK')
+        self.assertEqual(hits[0].symbol, 'NIFTY BANK')
+        self.assertEqual(hits[0].kind, 'index')
+        self.assertIn('HDFCBANK', self.symbols(hits))
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search('RELAINCE'), [])
+        self.assertEqual(self.index.search('  '), [])
+
+
+class StockSuggestTests(SimpleTestCase):
+    def setUp(self):
+        self.index = StockSearchIndex(STOCKS, INDICES)
+
+    def test_typos_match_through_suggest(self):
+        hits = self.index.suggest('RELAINCE')
+        self.assertEqual(hits[0].symbol, 'RELIANCE')
+        self.assertEqual(hits[0].priority, 4)
+
+    def test_suggest_ignores_spacing(self):
+        self.assertEqual(self.index.search('HDFC BNK'), [])
+        self.assertEqual(self.index.suggest('HDFC BNK')[0].symbol, 'HDFCBANK')
+
+    def test_scores_are_ranked(self):
+        scores = [hit.score for hit in self.index.suggest('HDFCBNK')]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_short_queries_get_no_suggestions(self):
+        self.assertEqual(self.index.suggest('ZZ'), [])
+
+
+class FakeRouter:
+    """QuoteRouter stand-in: records each get_many call, optionally slowly"""
+
+    def __init__(self, delay=0, missing=()):
+        self.delay = delay
+        self.missing = set(missing)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get_many(self, symbols, symbol_type='stock'):
+        with self._lock:
+            self.calls.append(list(symbols))
+        time.sleep(self.delay)
+        return {
+            symbol: {'symbol': symbol, 'success': False, 'error': 'missing'} if symbol in self.missing
+            else make_quote(symbol, 100.0 + len(self.calls), provider='nse', symbol_type=symbol_type)
+            for symbol in symbols
+        }
+
+    def get_stock_data(self, symbol, symbol_type='stock'):
+        return self.get_many([symbol], symbol_type)[symbol]
+
+
+class _ImmediatePool:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class QuoteCacheTestCase(SimpleTestCase):
+    """Quote cache against a fake router, a clean cache and no snapshot file"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        tiered_cache._tiers.clear()
+        self.router = FakeRouter()
+        for target, value in (
+            ('calc.quote_cache.get_quote_router', lambda: self.router),
+            ('calc.quote_cache.get_snapshot', lambda: None),
+            ('calc.quote_cache._refresh_pool', _ImmediatePool()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Runs first: fetches a deadline left behind finish against this
+        # test's router, not the next test's
+        self.addCleanup(self.wait_for_fetches)
+
+    def wait_for_fetches(self, timeout=2):
+        deadline = time.monotonic() + timeout
+        while quote_cache._flight.in_flight() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def store(self, symbol, age, asset_type='stock'):
+        quote = make_quote(symbol, 50.0, provider='nse', symbol_type=asset_type)
+        tiered_cache.get_tier('quotes').set(
+            quote_cache_key(symbol, asset_type), {'quote': quote, 'fetched_at': time.time() - age}, 900
+        )
+
+
+class StaleWhileRevalidateTests(QuoteCacheTestCase):
+    def test_fresh_quote_is_served_from_the_cache(self):
+        self.store('TCS', age=10)
+        self.assertEqual(get_quote('TCS')['last_price'], 50.0)
+        self.assertEqual(self.router.calls, [])
+
+    def test_stale_quote_is_served_and_refreshed(self):
+        self.store('TCS', age=120)
+        quote = get_quote('TCS')
+        self.assertTrue(quote['stale'])
+        self.assertEqual(quote['last_price'], 50.0)
+        self.assertGreaterEqual(quote['age'], 120)
+        # The refresh replaced the entry with a fresh one
+        self.assertEqual(self.router.calls, [['TCS']])
+        fresh = get_quote('TCS')
+        self.assertNotIn('stale', fresh)
+        self.assertEqual(fresh['last_price'], 101.0)
+
+    def test_one_refresh_per_stale_quote(self):
+        self.store('TCS', age=120)
+        # Another worker holds the fill lock: no second refresh is queued
+        quote_cache.acquire_lock(f"{quote_cache_key('TCS')}:inflight", 30)
+        get_quote('TCS')
+        get_quote('TCS')
+        self.assertEqual(self.router.calls, [])
+
+    def test_quotes_expire_after_the_hard_ttl(self):
+        get_quote('TCS')
+        tiered_cache._tiers.clear()
+        soft, hard = quote_cache.quote_ttls('stock')
+        with mock.patch('time.time', return_value=time.time() + hard + 1):
+            get_quote('TCS')
+        self.assertEqual(len(self.router.calls), 2)
+
+
+def run_concurrently(fn, count=5):
+    """fn() from count threads released together; their results in order"""
+    start = threading.Barrier(count)
+    results = [None] * count
+
+    def call(i):
+        start.wait()
+        results[i] = fn()
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_run(self):
+        flight = SingleFlight()
+        runs = []
+
+        def slow():
+            runs.append(1)
+            time.sleep(0.1)
+            return 'quote'
+        self.assertEqual(run_concurrently(lambda: flight.do('TCS', slow)), ['quote'] * 5)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.05)
+            raise ValueError('upstream down')
+
+        def call():
+            try:
+                flight.do('TCS', fail)
+            except ValueError as e:
+                return str(e)
+        self.assertEqual(run_concurrently(call, 3), ['upstream down'] * 3)
+
+    def test_do_many_runs_only_keys_not_in_flight(self):
+        flight = SingleFlight()
+        batches = []
+
+        def fetch(keys):
+            batches.append(sorted(keys))
+            time.sleep(0.1)
+            return {key: key.lower() for key in keys}
+        leader = threading.Thread(target=flight.do_many, args=(['TCS', 'INFY'], fetch))
+        leader.start()
+        time.sleep(0.03)
+        self.assertEqual(flight.do_many(['TCS', 'SBIN'], fetch), {'TCS': 'tcs', 'SBIN': 'sbin'})
+        leader.join()
+        self.assertEqual(batches, [['INFY', 'TCS'], ['SBIN']])
+
+
+class QuoteCoalescingTests(QuoteCacheTestCase):
+    def test_concurrent_misses_fetch_once(self):
+        self.router.delay = 0.1
+        results = run_concurrently(lambda: get_quote('TCS')['last_price'])
+        self.assertEqual(results, [101.0] * 5)
+        self.assertEqual(self.router.calls, [['TCS']])
+
+    def test_batch_waits_for_a_fill_held_by_another_worker(self):
+        key = quote_cache_key('TCS')
+        token = quote_cache.acquire_lock(f'{key}:inflight', 30)
+
+        def other_worker():
+            time.sleep(0.1)
+            self.store('TCS', age=0)
+            quote_cache.release_lock(f'{key}:inflight', token)
+        threading.Thread(target=other_worker).start()
+
+        quotes = get_quotes_batch(['TCS', 'INFY'])
+        self.assertEqual(self.router.calls, [['INFY']])
+        self.assertEqual(quotes['TCS']['last_price'], 50.0)
+        self.assertTrue(quotes['INFY']['success'])
+
+    def test_batch_fetches_what_the_other_worker_did_not_deliver(self):
+        key = quote_cache_key('TCS')
+        token = quote_cache.acquire_lock(f'{key}:inflight', 30)
+        threading.Timer(0.1, quote_cache.release_lock, args=(f'{key}:inflight', token)).start()
+
+        quotes = get_quotes_batch(['TCS', 'INFY'])
+        self.assertEqual(self.router.calls, [['INFY'], ['TCS']])
+        self.assertTrue(quotes['TCS']['success'])
+        self.assertFalse(quote_cache.lock_held(f'{key}:inflight'))
+
+
+class QuoteDeadlineTests(QuoteCacheTestCase):
+    def test_late_quotes_are_pending_and_land_in_the_cache(self):
+        self.store('TCS', age=0)
+        self.router.delay = 0.2
+        quotes = get_quotes([('TCS', 'stock'), ('INFY', 'stock')], timeout=0.05)
+        self.assertEqual(quotes[('TCS', 'stock')]['last_price'], 50.0)
+        self.assertIsNone(quotes[('INFY', 'stock')])
+
+        time.sleep(0.3)
+        self.router.delay = 0
+        self.assertTrue(get_quote('INFY')['success'])
+        self.assertEqual(self.router.calls, [['INFY']])
+
+
+class DirectSearchTests(QuoteCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        universe = mock.Mock(stocks=STOCKS, indices=INDICES, version='direct-search-tests')
+        patcher = mock.patch('calc.views.get_universe', return_value=universe)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, query):
+        request = RequestFactory().get('/api/search-stocks/', {'q': query, 'fuzzy': '0'})
+        request.user = mock.Mock(is_authenticated=True)
+        return json.loads(views.search_stocks(request).content)['stocks']
+
+    def test_unknown_ticker_is_probed_upstream(self):
+        stocks = self.search('NEWCO')
+        self.assertEqual(sorted(self.router.calls), [['NEWCO'], ['NEWCO.BO'], ['NEWCO.NS']])
+        self.assertEqual(stocks[0]['note'], 'Direct search result')
+
+    def test_junk_queries_are_not_probed(self):
+        self.assertEqual(self.search('<script>'), [])
+        self.assertEqual(self.router.calls, [])
+
+    @override_settings(STOCK_SEARCH_DEADLINE=0.05)
+    def test_probe_respects_the_deadline(self):
+        self.router.delay = 0.2
+        self.assertEqual(self.search('NEWCO'), [])
+
+
+class BulkUpsertStocksTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        snapshot = override_settings(QUOTE_SNAPSHOT_PATH=str(Path(directory) / 'quotes.snap'))
+        snapshot.enable()
+        self.addCleanup(snapshot.disable)
+
+    def row(self, symbol, price, **values):
+        return {'symbol': symbol, 'company_name': STOCKS[symbol], 'last_price': price,
+                'change': 1.5, 'pchange': 0.5, 'volume': 1000, **values}
+
+    def test_counts_created_and_updated(self):
+        counts = bulk_upsert_stocks([self.row('TCS', 4150), self.row('RELIANCE', 1420)])
+        self.assertEqual(counts['created'], 2)
+        self.assertEqual(counts['touched'], 2)
+
+        counts = bulk_upsert_stocks([self.row('TCS', 4160), self.row('RELIANCE', 1425)])
+        self.assertEqual((counts['created'], counts['updated']), (0, 2))
+        self.assertEqual(StockData.objects.get(symbol='RELIANCE').last_price, Decimal('1425.00'))
+
+    def test_unchanged_rows_are_not_written(self):
+        bulk_upsert_stocks([self.row('TCS', 4150), self.row('RELIANCE', 1420)])
+        written_at = StockData.objects.get(symbol='TCS').updated_at
+        counts = bulk_upsert_stocks([self.row('TCS', 4150.001), self.row('RELIANCE', 1425)])
+        self.assertEqual(counts, {'created': 0, 'updated': 1, 'unchanged': 1, 'touched': 1})
+        self.assertEqual(StockData.objects.get(symbol='TCS').updated_at, written_at)
+
+    def test_quote_time_alone_is_not_a_change(self):
+        bulk_upsert_stocks([self.row('TCS', 4150, quote_time=ist(19, 10))])
+        counts = bulk_upsert_stocks([self.row('TCS', 4150, quote_time=ist(19, 10, 5))])
+        self.assertEqual(counts['unchanged'], 1)
+
+    def test_yahoo_fetch_marks_saved_stocks_checked(self):
+        from .management.commands.fetch_yahoo_stocks import Command
+        Command(stdout=io.StringIO())._save_stocks([self.row('TCS', 4150)])
+        self.assertIsNotNone(StockData.objects.get(symbol='TCS').checked_at)
+
+    def test_missing_fields_are_left_alone(self):
+        bulk_upsert_stocks([self.row('TCS', 4150, market_cap=15_000_000)])
+        counts = bulk_upsert_stocks([{'symbol': 'TCS', 'last_price': 4200}])
+        self.assertEqual(counts['updated'], 1)
+        stock = StockData.objects.get(symbol='TCS')
+        self.assertEqual(stock.company_name, STOCKS['TCS'])
+        self.assertEqual(stock.market_cap, 15_000_000)
+        self.assertEqual(stock.last_price, Decimal('4200.00'))
+
+    def test_last_row_per_symbol_wins(self):
+        counts = bulk_upsert_stocks([self.row('TCS', 4100), self.row('TCS', 4150)])
+        self.assertEqual(counts['created'], 1)
+        self.assertEqual(StockData.objects.get(symbol='TCS').last_price, Decimal('4150.00'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RefreshOrderTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.now = ist(19, 10)
+        calendar = MarketCalendar(['2026-10-20'], clock=lambda: self.now)
+        self.scheduler = RefreshScheduler(calendar, tier_for=lambda symbol: 'fno')
+        for symbol, age in (('TCS', 60), ('RELIANCE', 300), ('HDFCBANK', 10)):
+            StockData.objects.create(
+                symbol=symbol, company_name=STOCKS[symbol], last_price=100,
+                checked_at=self.now - timedelta(seconds=age)
+            )
+
+    def order(self, **kwargs):
+        return refresh_order(['TCS', 'RELIANCE', 'HDFCBANK', 'INFY'], scheduler=self.scheduler, **kwargs)
+
+    def test_never_fetched_first_then_longest_unchecked(self):
+        # HDFCBANK was checked 10s ago: not due at the fno interval
+        self.assertEqual(self.order(), ['INFY', 'RELIANCE', 'TCS'])
+
+    def test_searched_symbols_are_weighted_up(self):
+        for _ in range(100):
+            record_search_demand(['TCS'])
+        self.assertEqual(self.order(), ['INFY', 'TCS', 'RELIANCE'])
+
+    def test_force_includes_symbols_not_due(self):
+        self.assertEqual(self.order(force=True), ['INFY', 'RELIANCE', 'TCS', 'HDFCBANK'])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class QuoteDaemonTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .management.commands.run_quote_daemon import Command
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        snapshot = override_settings(QUOTE_SNAPSHOT_PATH=str(Path(directory) / 'quotes.snap'))
+        snapshot.enable()
+        self.addCleanup(snapshot.disable)
+
+        universe = mock.Mock(stocks={'TCS': STOCKS['TCS'], 'RELIANCE': STOCKS['RELIANCE']},
+                             indices={'NIFTY BANK': '^NSEBANK'})
+        for target in ('calc.management.commands.run_quote_daemon.get_universe', 'calc.views.get_universe'):
+            patcher = mock.patch(target, return_value=universe)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.now = ist(19, 10)
+        calendar = MarketCalendar(['2026-10-20'], clock=lambda: self.now)
+        scheduler = RefreshScheduler(calendar, tier_for=lambda symbol: 'fno' if symbol == 'TCS' else 'rest')
+        self.daemon = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        self.daemon._prepare(batch_size=500, scheduler=scheduler)
+
+    def queued(self):
+        jobs = []
+        while not self.daemon.jobs.empty():
+            rank, _, asset_type, symbols, _ = self.daemon.jobs.get_nowait()
+            jobs.append((rank, asset_type, symbols))
+        return jobs
+
+    def test_schedule_queues_batches_by_tier_once(self):
+        self.daemon._schedule(self.daemon.scheduler)
+        self.daemon._schedule(self.daemon.scheduler)
+        self.assertEqual(sorted(self.queued()), [
+            (0, 'index', ['^NSEBANK']), (1, 'stock', ['TCS']), (2, 'stock', ['RELIANCE']),
+        ])
+        self.assertEqual(self.daemon.pending, {'^NSEBANK', 'TCS', 'RELIANCE'})
+
+    def test_flush_writes_fetched_quotes_and_retries_failures_later(self):
+        self.daemon._schedule(self.daemon.scheduler)
+        for asset_type, symbol, quote in (
+            ('stock', 'TCS', make_quote('TCS', 4150.0, provider='nse')),
+            ('stock', 'RELIANCE', {'symbol': 'RELIANCE', 'success': False, 'error': 'timeout'}),
+            ('index', '^NSEBANK', make_quote('^NSEBANK', 52000.0, provider='nse', symbol_type='index')),
+        ):
+            self.daemon.results.put((asset_type, symbol, quote, 0.5))
+        self.daemon._flush()
+
+        stock = StockData.objects.get(symbol='TCS')
+        self.assertEqual(stock.last_price, Decimal('4150.00'))
+        self.assertEqual(stock.company_name, STOCKS['TCS'])
+        self.assertEqual(stock.checked_at, self.now)
+        self.assertFalse(StockData.objects.filter(symbol='RELIANCE').exists())
+        self.assertEqual(self.daemon.index_checked, {'^NSEBANK': self.now})
+        self.assertEqual((self.daemon.stats['fetched'], self.daemon.stats['failed']), (2, 1))
+        self.assertEqual(self.daemon.pending, set())
+
+        # The failed symbol waits out RETRY_DELAY; the others are not due yet
+        self.queued()
+        self.daemon._schedule(self.daemon.scheduler)
+        self.assertEqual(self.queued(), [])
+
+
+class StubProvider(QuoteProvider):
+    """Serves the symbols it has, records what it was asked for"""
+
+    def __init__(self, name, symbols=(), fails=False, fallback_only=False):
+        super().__init__()
+        self.name = name
+        self.symbols = set(symbols)
+        self.fails = fails
+        self.fallback_only = fallback_only
+        self.asked = []
+
+    def fetch_many(self, symbols, symbol_type):
+        self.asked.append(list(symbols))
+        if self.fails:
+            raise ProviderError('upstream down')
+        return {
+            symbol: make_quote(symbol, 100.0, provider=self.name, symbol_type=symbol_type)
+            for symbol in symbols if symbol in self.symbols
+        }
+
+
+class QuoteRouterTests(SimpleTestCase):
+    def test_healthiest_provider_is_tried_first(self):
+        nse = StubProvider('nse', ['TCS'])
+        yahoo = StubProvider('yahoo', ['TCS'])
+        router = QuoteRouter([nse, yahoo])
+        for _ in range(5):
+            router.health['nse'].record(2.0, True)
+            router.health['yahoo'].record(0.1, True)
+        self.assertEqual(router.get_stock_data('TCS')['data_source'], 'yahoo')
+        self.assertEqual(nse.asked, [])
+
+    def test_fails_over_for_missing_symbols_only(self):
+        nse = StubProvider('nse', ['TCS'])
+        yahoo = StubProvider('yahoo', ['TCS', 'INFY'])
+        quotes = QuoteRouter([nse, yahoo]).get_many(['TCS', 'INFY'])
+        self.assertEqual(yahoo.asked, [['INFY']])
+        self.assertEqual(quotes['TCS']['data_source'], 'nse')
+        self.assertEqual(quotes['INFY']['data_source'], 'yahoo')
+
+    def test_errors_count_against_a_provider(self):
+        router = QuoteRouter([StubProvider('nse', fails=True), StubProvider('yahoo', ['TCS'])])
+        with self.assertLogs('calc.quote_providers', 'WARNING'):
+            self.assertTrue(router.get_stock_data('TCS')['success'])
+        self.assertEqual(router.health_report()['nse']['error_rate'], 1.0)
+        self.assertEqual([provider.name for provider in router._ranked(1, 'stock')], ['yahoo', 'nse'])
+
+    def test_fallback_only_providers_go_last(self):
+        estimates = StubProvider('current_estimates', ['TCS', 'INFY'], fallback_only=True)
+        nse = StubProvider('nse', ['TCS'])
+        router = QuoteRouter([estimates, nse])
+        quotes = router.get_many(['TCS', 'INFY', 'SBIN'])
+        self.assertEqual(estimates.asked, [['INFY', 'SBIN']])
+        self.assertEqual(quotes['INFY']['data_source'], 'current_estimates')
+        self.assertEqual(quotes['SBIN'], {
+            'symbol': 'SBIN', 'success': False, 'error': 'No provider returned data', 'type': 'stock',
+        })
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.now = 1_000_000.0
+        clock = mock.patch('calc.circuit_breaker.time.time', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.breaker = CircuitBreaker('test:endpoint', failure_threshold=3, failure_window=60, recovery_timeout=30)
+
+    def test_opens_after_the_threshold(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 30
+        self.assertEqual(self.breaker.state(), HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        # A failed probe opens the circuit for another round
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state(), CLOSED)
+        self.assertEqual(self.breaker.report(), {'state': CLOSED, 'failures': 0})
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.now = 1_000_000.0
+        clock = mock.patch('calc.rate_limiter.time.time', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.bucket = TokenBucket('test', rate=1.0, burst=4, reserve=2)
+
+    def test_background_callers_leave_the_reserve(self):
+        self.assertTrue(self.bucket.acquire(BACKGROUND, timeout=0))
+        self.assertTrue(self.bucket.acquire(BACKGROUND, timeout=0))
+        self.assertFalse(self.bucket.acquire(BACKGROUND, timeout=0))
+        # The reserve is for interactive callers only
+        self.assertTrue(self.bucket.acquire(INTERACTIVE, timeout=0))
+        self.assertTrue(self.bucket.acquire(INTERACTIVE, timeout=0))
+        self.assertFalse(self.bucket.acquire(INTERACTIVE, timeout=0))
+
+    def test_wait_accounts_for_the_reserve(self):
+        for _ in range(2):
+            self.bucket.acquire(BACKGROUND, timeout=0)
+        self.assertEqual(self.bucket._take(BACKGROUND), 1.0)
+        self.now += 1
+        self.assertEqual(self.bucket._take(BACKGROUND), 0.0)
+
+    def test_tokens_refill_up_to_the_burst(self):
+        for _ in range(4):
+            self.bucket.acquire(INTERACTIVE, timeout=0)
+        self.now += 100
+        for _ in range(2):
+            self.assertTrue(self.bucket.acquire(BACKGROUND, timeout=0))
+        self.assertFalse(self.bucket.acquire(BACKGROUND, timeout=0))
+
+    def test_reserve_never_takes_the_whole_burst(self):
+        self.assertEqual(TokenBucket('small', rate=1.0, burst=2, reserve=5).reserve, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ImportInstrumentsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(invalidate_universe)
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def csv(self, name, lines):
+        path = self.directory / name
+        path.write_text('\n'.join(lines) + '\n')
+        return str(path)
+
+    def equity(self, *symbols):
+        return self.csv('EQUITY_L.csv', ['SYMBOL,NAME OF COMPANY, SERIES, ISIN NUMBER'] + [
+            f'{symbol},{STOCKS[symbol]},EQ,INE00000000{i}' for i, symbol in enumerate(symbols)
+        ])
+
+    def run_import(self, *args, **options):
+        out = io.StringIO()
+        call_command('import_instruments', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def stock(self, symbol):
+        return Instrument.objects.get(exchange='NSE', symbol=symbol)
+
+    def test_only_changes_are_written(self):
+        lots = self.csv('fo_mktlots.csv', ['UNDERLYING,SYMBOL,OCT-26', 'Tata Consultancy,TCS,175'])
+        self.run_import(equity=self.equity('TCS', 'RELIANCE'), fo_lots=lots)
+        self.assertEqual(self.stock('TCS').lot_size, 175)
+        self.assertIsNone(self.stock('RELIANCE').lot_size)
+
+        # An equity-only import keeps the lot sizes; a missing stock is delisted
+        output = self.run_import(equity=self.equity('TCS'))
+        self.assertIn('0 new, 0 changed, 1 delisted', output)
+        self.assertEqual(self.stock('TCS').lot_size, 175)
+        self.assertFalse(self.stock('RELIANCE').is_active)
+
+    def test_dry_run_writes_nothing(self):
+        output = self.run_import(equity=self.equity('TCS'), dry_run=True)
+        count = 1 + len(SEED_INDICES)
+        self.assertIn(f'{count} instruments in source: {count} new', output)
+        self.assertFalse(Instrument.objects.exists())
+
+    def test_universe_is_the_nse_listing(self):
+        self.run_import(equity=self.equity('TCS'))
+        Instrument.objects.create(exchange='BSE', symbol='TCS', name='TCS (BSE listing)')
+        Instrument.objects.create(exchange='BSE', symbol='BSEONLY', name='BSE only')
+        invalidate_universe()
+        universe = get_universe()
+        self.assertEqual(universe.stocks, {'TCS': STOCKS['TCS']})
+        self.assertEqual(universe.yahoo_tickers, {'TCS': 'TCS.NS'})
+
+
+class QuoteSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = Path(directory) / 'quotes.snap'
+
+    def test_write_then_read(self):
+        quote_time = datetime(2026, 10, 19, 4, tzinfo=timezone.utc)
+        write_snapshot({
+            'TCS': {'last_price': 4150.25, 'change_amount': 20.5, 'change_percent': 0.5,
+                    'volume': 123456, 'quote_time': quote_time, 'fetched_at': 1_792_000_000.0,
+                    'company_name': STOCKS['TCS'], 'market_cap': 15_000_000_000_000},
+            'RELIANCE': {'last_price': 1420.0, 'change_amount': -3.0, 'change_percent': -0.21, 'volume': 0,
+                         'quote_time': None, 'fetched_at': 1_792_000_001.0},
+        }, self.path)
+
+        snapshot = QuoteSnapshot(self.path)
+        self.assertEqual(len(snapshot), 2)
+        self.assertIn('TCS', snapshot)
+        self.assertIsNone(snapshot.get('INFY'))
+
+        quote = snapshot.get('TCS')
+        self.assertEqual(quote['last_price'], 4150.25)
+        self.assertEqual(quote['change_amount'], 20.5)
+        self.assertEqual(quote['change'], 0.5)
+        self.assertEqual(quote['volume'], 123456)
+        self.assertEqual(quote['quote_time'], quote_time)
+        self.assertEqual(quote['data_source'], 'snapshot')
+        self.assertEqual(quote['company_name'], STOCKS['TCS'])
+        self.assertEqual(quote['market_cap'], 15_000_000_000_000)
+        # Unknown names fall back to the symbol, unknown market caps to 0
+        self.assertEqual(snapshot.get('RELIANCE')['company_name'], 'RELIANCE')
+        self.assertEqual(snapshot.get('RELIANCE')['market_cap'], 0)
+        self.assertIsNone(snapshot.get('RELIANCE')['quote_time'])
+
+        self.assertTrue(math.isnan(snapshot.entries()['RELIANCE']['quote_time']))
+        self.assertEqual(snapshot.entries()['TCS']['fetched_at'], 1_792_000_000.0)
+
+    def test_rewrite_replaces_the_file(self):
+        write_snapshot({'TCS': {'last_price': 1.0}}, self.path)
+        old = QuoteSnapshot(self.path)
+        write_snapshot({'TCS': {'last_price': 2.0}}, self.path)
+        # Readers of the old mapping keep a complete snapshot
+        self.assertEqual(old.get('TCS')['last_price'], 1.0)
+        self.assertEqual(QuoteSnapshot(self.path).get('TCS')['last_price'], 2.0)
+
+    def test_other_files_are_rejected(self):
+        self.path.write_bytes(b'not a snapshot' * 4)
+        with self.assertRaises(ValueError):
+            QuoteSnapshot(self.path)
+
+    def test_update_keeps_names_the_rows_leave_out(self):
+        with override_settings(QUOTE_SNAPSHOT_PATH=str(self.path)):
+            update_snapshot([{'symbol': 'TCS', 'company_name': STOCKS['TCS'], 'last_price': 4150,
+                              'change': 20.5, 'pchange': 0.5, 'market_cap': 15_000_000}])
+            update_snapshot([{'symbol': 'TCS', 'last_price': 4160}])
+        quote = QuoteSnapshot(self.path).get('TCS')
+        self.assertEqual(quote['last_price'], 4160.0)
+        self.assertEqual(quote['company_name'], STOCKS['TCS'])
+        self.assertEqual(quote['market_cap'], 15_000_000)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StockRefreshPassTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = Path(directory) / 'quotes.snap'
+        snapshot = override_settings(QUOTE_SNAPSHOT_PATH=str(self.path))
+        snapshot.enable()
+        self.addCleanup(snapshot.disable)
+
+        universe = mock.Mock(stocks=STOCKS, indices=INDICES)
+        for target, value in (
+            ('calc.views.get_universe', mock.Mock(return_value=universe)),
+            ('calc.views.get_quotes_batch', lambda symbols, asset_type, refresh: {
+                symbol: make_quote(symbol, 100.0, provider='nse', market_cap=1_000) for symbol in symbols
+            }),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_one_snapshot_write_per_pass(self):
+        with mock.patch('calc.quote_snapshot.write_snapshot', wraps=write_snapshot) as write:
+            result = views.update_stock_database(['TCS', 'RELIANCE', 'HDFCBANK'], force=True, batch_size=1)
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(write.call_count, 1)
+        snapshot = QuoteSnapshot(self.path)
+        self.assertEqual(len(snapshot), 3)
+        self.assertEqual(snapshot.get('HDFCBANK')['company_name'], STOCKS['HDFCBANK'])
+        self.assertEqual(snapshot.get('HDFCBANK')['market_cap'], 1_000)
+
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class UserSettingsCacheTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        tiered_cache._tiers.clear()
+        self.user = User.objects.create_user('trader', password='secret')
+        clock = mock.patch('calc.tiered_cache.VERSION_CHECK_INTERVAL', 0)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_saves_reach_other_workers_before_the_ttl(self):
+        key = f'user_settings:{self.user.pk}'
+        self.assertEqual(views.get_user_settings(self.user), (Decimal('200000.00'), Decimal('1.00')))
+        # Another worker's tier, with the old values in its L1
+        other_worker = tiered_cache.TieredCache('user_settings', 10, 30)
+        self.assertEqual(other_worker.get(key), (Decimal('200000.00'), Decimal('1.00')))
+
+        user_settings = UserSettings.objects.get(user=self.user)
+        user_settings.capital = Decimal('500000.00')
+        user_settings.save()
+
+        self.assertIsNone(other_worker.get(key))
+        self.assertEqual(views.get_user_settings(self.user), (Decimal('500000.00'), Decimal('1.00')))
+        self.assertEqual(other_worker.get(key), (Decimal('500000.00'), Decimal('1.00')))
+
+
+class CacheCodecTests(SimpleTestCase):
+    def quote_entry(self, **quote):
+        return {
+            'quote': {
+                'symbol': 'TCS', 'company_name': 'Tata Consultancy Services Limited',
+                'last_price': 4150.25, 'change': 0.5, 'change_amount': 20.5, 'change_percent': 0.5,
+                'volume': 123456, 'market_cap': 15_000_000, 'quote_time': datetime(2026, 10, 19, 4, tzinfo=timezone.utc),
+                'success': True, 'data_source': 'nse', 'type': 'stock', **quote,
+            },
+            'fetched_at': 1_792_000_000.5,
+        }
+
+    def test_quote_round_trip(self):
+        codec = QuoteEntryCodec()
+        for entry in (self.quote_entry(), self.quote_entry(company_name='TCS', quote_time=None)):
+            self.assertEqual(codec.decode(codec.encode(entry)), entry)
+
+    def test_quote_outside_the_schema_is_not_encoded(self):
+        codec = QuoteEntryCodec()
+        self.assertIsNone(codec.encode(self.quote_entry(data_source='other')))
+        self.assertIsNone(codec.encode(self.quote_entry(quote_time=datetime(2026, 10, 19, 9))))
+        entry = self.quote_entry()
+        entry['quote']['extra'] = 1
+        self.assertIsNone(codec.encode(entry))
+        self.assertIsNone(codec.decode(b'\x02' + codec.encode(self.quote_entry())[1:]))
+
+    def test_search_hits_round_trip_per_index_version(self):
+        saved = search_index.current_index()
+        self.addCleanup(lambda: search_index.get_search_index(lambda: saved[0], version=saved[1]))
+        index = search_index.get_search_index(lambda: StockSearchIndex(STOCKS, INDICES), version=1)
+
+        codec = SearchHitsCodec()
+        value = (index.search('BANK') + index.suggest('RELAINCE'), 'exact')
+        payload = codec.encode(value)
+        self.assertEqual(codec.decode(payload), value)
+
+        # Entry ids mean nothing against another instrument version
+        search_index.get_search_index(lambda: StockSearchIndex(STOCKS, INDICES), version=2)
+        self.assertIsNone(codec.decode(payload))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CachePersistenceTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        self.cache = cache
+        cache.clear()
+        tiered_cache._tiers.clear()
+        self.addCleanup(tiered_cache._tiers.clear)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.universe = mock.Mock(stocks=STOCKS, indices=INDICES, version='persistence-tests')
+        patcher = mock.patch('calc.cache_persistence.get_universe', return_value=self.universe)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        saved = search_index.current_index()
+        self.addCleanup(lambda: search_index.get_search_index(lambda: saved[0], version=saved[1]))
+
+    def store(self, symbol, age, asset_type='stock'):
+        entry = {
+            'quote': make_quote(symbol, 50.0, provider='nse', symbol_type=asset_type),
+            'fetched_at': time.time() - age,
+        }
+        tiered_cache.get_tier('quotes').set(quote_cache_key(symbol, asset_type), entry, None)
+        return entry
+
+    def test_round_trip_after_a_restart(self):
+        tcs = self.store('TCS', age=10)
+        nifty_bank = self.store('^NSEBANK', age=10, asset_type='index')
+        # Past its hard TTL: saved, but not worth restoring
+        self.store('RELIANCE', age=quote_cache.quote_ttls('stock')[1] + 1)
+        record_search_demand(['TCS', 'TCS'])
+        index = search_index.get_search_index(
+            lambda: StockSearchIndex(STOCKS, INDICES), version=self.universe.version
+        )
+        self.assertEqual(cache_persistence.save_caches(self.directory), 3)
+
+        # A fresh container: empty cache, no index yet
+        self.cache.clear()
+        tiered_cache._tiers.clear()
+        search_index.get_search_index(lambda: None, version=None)
+
+        restored = cache_persistence.load_caches(self.directory)
+        self.assertEqual(restored, {'quotes': 2, 'search_index': True})
+        quotes = tiered_cache.get_tier('quotes')
+        self.assertEqual(quotes.get(quote_cache_key('TCS')), tcs)
+        self.assertEqual(quotes.get(quote_cache_key('^NSEBANK', 'index')), nifty_bank)
+        self.assertIsNone(quotes.get(quote_cache_key('RELIANCE')))
+        self.assertEqual(search_counts(['TCS']), {'TCS': 2})
+        rebuilt, version = search_index.current_index()
+        self.assertEqual(version, self.universe.version)
+        self.assertEqual([hit.symbol for hit in rebuilt.search('TCS')], [hit.symbol for hit in index.search('TCS')])
+
+    def test_index_for_another_universe_is_not_reused(self):
+        search_index.get_search_index(lambda: StockSearchIndex(STOCKS, INDICES), version=self.universe.version)
+        cache_persistence.save_caches(self.directory)
+        self.universe.stocks = {**STOCKS, 'INFY': 'Infosys Limited'}
+        self.assertFalse(cache_persistence.load_caches(self.directory)['search_index'])
+
+    def test_restore_keeps_newer_quotes(self):
+        self.store('TCS', age=10)
+        cache_persistence.save_caches(self.directory)
+        newer = self.store('TCS', age=0)
+        self.assertEqual(cache_persistence.load_caches(self.directory)['quotes'], 0)
+        self.assertEqual(tiered_cache.get_tier('quotes').get_shared(quote_cache_key('TCS')), newer)
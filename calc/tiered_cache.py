@@ -0,0 +1,214 @@
+# calc/tiered_cache.py
+"""
+Two-tier cache: a bounded per-process LRU (L1) in front of the shared Django
+cache (L2), one tier per namespace.
+
+Reads try L1, then L2, and copy L2 hits into L1. An L1 copy is trusted for
+at most the namespace's `ttl` seconds, so writes made by other workers show
+up within that time. Changes that must reach every worker sooner call
+invalidate(): it bumps the namespace version in L2, and each process drops
+its L1 for that namespace the next time it checks the version (at most every
+VERSION_CHECK_INTERVAL seconds).
+Namespaces with a codec (cache_codecs.CODECS) are stored in L2 in its
+compact binary form and decoded on the way into L1, so L1 hits cost no
+decoding. Configure sizes and TTLs with TIERED_CACHE in settings.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from .cache_codecs import CODECS
+
+DEFAULT_TIERS = {
+    'quotes': {'size': 2000, 'ttl': 5},
+    'search': {'size': 1000, 'ttl': 120},
+    'user_settings': {'size': 1000, 'ttl': 30},
+}
+FALLBACK_TIER = {'size': 500, 'ttl': 30}
+
+# Seconds a process trusts its copy of a namespace version
+VERSION_CHECK_INTERVAL = 1.0
+
+_MISSING = object()
+
+
+class TieredCache:
+    """Per-process LRU of one namespace, backed by the shared cache"""
+
+    def __init__(self, namespace, size, ttl, codec=None):
+        self.namespace = namespace
+        self.size = size
+        self.ttl = ttl
+        self.codec = codec
+        self.version_key = f'tiered:{namespace}:version'
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self.stats = {
+            'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'undecodable': 0,
+        }
+
+    def _encode(self, value):
+        if self.codec is None:
+            return value
+        payload = self.codec.encode(value)
+        return value if payload is None else payload
+
+    def _decode(self, stored):
+        """Value for what L2 returned, or _MISSING if the codec cannot read it"""
+        if self.codec is None or not isinstance(stored, bytes):
+            return stored
+        value = self.codec.decode(stored)
+        if value is None:
+            self.stats['undecodable'] += 1
+            return _MISSING
+        return value
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        version = cache.get(self.version_key, 0)
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.stats['invalidations'] += 1
+                self._l1.clear()
+                self._version = version
+            self._checked_at = now
+
+    def _l1_get(self, key, now):
+        """L1 value for key, or _MISSING; caller holds the lock"""
+        entry = self._l1.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at <= now:
+            del self._l1[key]
+            return _MISSING
+        self._l1.move_to_end(key)
+        return value
+
+    def _remember(self, key, value, timeout=None):
+        """Copy a value into L1 for the tier TTL (or the entry's own, if shorter)"""
+        ttl = self.ttl if timeout is None else min(self.ttl, timeout)
+        with self._lock:
+            self._l1[key] = (value, time.monotonic() + ttl)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.size:
+                self._l1.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def get(self, key, default=None):
+        self._check_version()
+        with self._lock:
+            value = self._l1_get(key, time.monotonic())
+        if value is not _MISSING:
+            self.stats['l1_hits'] += 1
+            return value
+
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            value = self._decode(value)
+        if value is _MISSING:
+            self.stats['misses'] += 1
+            return default
+        self.stats['l2_hits'] += 1
+        self._remember(key, value)
+        return value
+
+    def get_shared(self, key, default=None):
+        """L2 value for key, skipping L1: for polling another worker's write"""
+        value = self._decode(cache.get(key, _MISSING))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys):
+        """{key: value} for the keys found in either tier"""
+        self._check_version()
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                value = self._l1_get(key, now)
+                if value is not _MISSING:
+                    found[key] = value
+        self.stats['l1_hits'] += len(found)
+
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            shared = {}
+            for key, stored in cache.get_many(remaining).items():
+                value = self._decode(stored)
+                if value is not _MISSING:
+                    shared[key] = value
+            self.stats['l2_hits'] += len(shared)
+            self.stats['misses'] += len(remaining) - len(shared)
+            for key, value in shared.items():
+                self._remember(key, value)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=None):
+        cache.set(key, self._encode(value), timeout)
+        self._remember(key, value, timeout)
+
+    def set_many(self, mapping, timeout=None):
+        if not mapping:
+            return
+        cache.set_many({key: self._encode(value) for key, value in mapping.items()}, timeout)
+        for key, value in mapping.items():
+            self._remember(key, value, timeout)
+
+    def delete(self, key):
+        """Drop key from L2 and this process's L1 (other workers' copies age out)"""
+        cache.delete(key)
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def delete_many(self, keys):
+        cache.delete_many(keys)
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    def invalidate(self):
+        """Make every process drop its L1 copies of this namespace"""
+        cache.set(self.version_key, time.time_ns(), None)
+        with self._lock:
+            self._l1.clear()
+            self._checked_at = 0.0
+
+    def report(self):
+        lookups = self.stats['l1_hits'] + self.stats['l2_hits'] + self.stats['misses']
+        hits = self.stats['l1_hits'] + self.stats['l2_hits']
+        return {
+            **self.stats,
+            'l1_entries': len(self._l1),
+            'hit_ratio': round(hits / lookups, 3) if lookups else None,
+        }
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def get_tier(namespace):
+    """This process's tier for namespace, sized from TIERED_CACHE"""
+    tier = _tiers.get(namespace)
+    if tier is None:
+        with _tiers_lock:
+            tier = _tiers.get(namespace)
+            if tier is None:
+                config = {**DEFAULT_TIERS, **getattr(settings, 'TIERED_CACHE', {})}
+                options = {**FALLBACK_TIER, **config.get(namespace, {})}
+                tier = _tiers[namespace] = TieredCache(
+                    namespace, options['size'], options['ttl'], CODECS.get(namespace)
+                )
+    return tier
+
+
+def tier_report():
+    """{namespace: counters} for every tier used in this process"""
+    return {namespace: tier.report() for namespace, tier in _tiers.items()}
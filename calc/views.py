@@ -16,11 +16,17 @@ import json
 import hmac
 import hashlib
 import logging
-import yfinance as yf
+import re
+import time
 from django.core.cache import cache
 import requests
 from datetime import datetime, timedelta
-from .stock_utils import stock_fetcher
+from .search_index import StockSearchIndex, get_search_index
+from .instruments import get_universe
+from .stock_store import bulk_upsert_stocks, mark_checked, publish_snapshot, quote_row
+from .refresh import record_search_demand, refresh_order
+from .rate_limiter import INTERACTIVE, request_priority
+from .tiered_cache import get_tier
 from .models import (
     UserSettings,
     CalculationHistory,
@@ -31,6 +37,10 @@ from .models import (
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Searches whose hits go to the shared cache: symbol- or name-like queries of
+# bounded length, so arbitrary input cannot fill it with one-off keys
+CACHEABLE_SEARCH = re.compile(r'[A-Z0-9&.^ -]{1,32}')
+
 # Razorpay client initialization (uncomment when you have credentials)
 # import razorpay
 # razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
@@ -135,16 +145,10 @@ def user_logout(request):
 def dashboard(request):
     """Main dashboard view with risk calculator"""
     # Get or create user settings
-    user_settings, created = UserSettings.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'capital': Decimal('200000.00'),
-            'risk_percent': Decimal('1.00')
-        }
-    )
+    capital, risk_percent = get_user_settings(request.user)
     
     # Calculate risk in rupees
-    risk_rs = (user_settings.capital * user_settings.risk_percent) / 100
+    risk_rs = (capital * risk_percent) / 100
     
     # Get recent history
     recent_history = CalculationHistory.objects.filter(
@@ -153,8 +157,8 @@ def dashboard(request):
     
     context = {
         'user': request.user,
-        'user_capital': user_settings.capital,
-        'user_risk_percent': user_settings.risk_percent,
+        'user_capital': capital,
+        'user_risk_percent': risk_percent,
         'risk_rs': risk_rs,
         'recent_history': recent_history,
     }
@@ -199,6 +203,7 @@ def update_settings(request):
         
         user_settings.capital = capital
         user_settings.risk_percent = risk_percent
+        # Saving drops the cached copy (models.drop_cached_user_settings)
         user_settings.save()
         
         return JsonResponse({
@@ -358,213 +363,89 @@ def clear_history(request):
 # ============ Enhanced Stock Search API with Real-time Data ============
 
 def get_comprehensive_nse_indices():
-    """Get comprehensive list of NSE indices with their yfinance symbols"""
-    return {
-        # Broad-based Indices
-        'NIFTY': '^NSEI',
-        'NIFTY50': '^NSEI',
-        'NIFTY100': '^CNX100',
-        'NIFTY200': '^CNX200',
-        'NIFTY500': '^CNX500',
-        'NIFTY TOTAL MARKET': '^CNXTM',
-        'NIFTY NEXT 50': '^NSMIDCP',
-        'NIFTY MIDCAP 100': '^NSEMDCP50',
-        'NIFTY MIDCAP 150': '^NSEMDCP150',
-        'NIFTY SMALLCAP 100': '^NSESMLCAP',
-        'NIFTY SMALLCAP 250': '^NSESML250',
-        'NIFTY MICROCAP 250': '^NSEMIC250',
-        'NIFTY LARGEMIDCAP 250': '^NSELMC250',
-        
-        # Sectoral Indices
-        'NIFTY AUTO': '^CNXAUTO',
-        'NIFTY BANK': '^NSEBANK',
-        'NIFTY FIN SERVICE': '^CNXFINANCE',
-        'NIFTY FMCG': '^CNXFMCG',
-        'NIFTY IT': '^CNXIT',
-        'NIFTY MEDIA': '^CNXMEDIA',
-        'NIFTY METAL': '^CNXMETAL',
-        'NIFTY PHARMA': '^CNXPHARMA',
-        'NIFTY PSU BANK': '^CNXPSUBANK',
-        'NIFTY PVT BANK': '^CNXPVTBANK',
-        'NIFTY REALTY': '^CNXREALTY',
-        'NIFTY ENERGY': '^CNXENERGY',
-        'NIFTY INFRA': '^CNXINFRA',
-        'NIFTY COMMODITIES': '^CNXCOMMODITY',
-        'NIFTY CONSUMPTION': '^CNXCONSUMPTION',
-        'NIFTY CPSE': '^CNXCPSE',
-        'NIFTY INDIA CONSUMPTION': '^CNXCONSUMER',
-        'NIFTY OIL GAS': '^CNXOILGAS',
-        'NIFTY HEALTHCARE': '^CNXHEALTH',
-        'NIFTY SERVICES': '^CNXSERVICE',
-        'NIFTY MNC': '^CNXMNC',
-        'NIFTY PSE': '^CNXPSE',
-        'NIFTY SME EMERGE': '^CNXSME',
-        
-        # Thematic Indices
-        'FINNIFTY': '^NSEBANK',  # Financial Services
-        'BANKNIFTY': '^NSEBANK',
-        'NIFTY ALPHA 50': '^CNXALPHA50',
-        'NIFTY DIVIDEND OPPORTUNITIES 50': '^CNXDIV50',
-        'NIFTY GROWTH SECTORS 15': '^CNXGROWTH15',
-        'NIFTY HIGH BETA 50': '^CNXHIGHBETA50',
-        'NIFTY LOW VOLATILITY 50': '^CNXLOWVOL50',
-        'NIFTY MOMENTUM 30': '^CNXMOMENTUM30',
-        'NIFTY QUALITY 30': '^CNXQUALITY30',
-        'NIFTY VALUE 50': '^CNXVALUE50',
-        
-        # BSE Indices
-        'SENSEX': '^BSESN',
-        'BSE100': '^BSE100',
-        'BSE200': '^BSE200',
-        'BSE500': '^BSE500',
-        'BSE MIDCAP': '^BSEMID',
-        'BSE SMALLCAP': '^BSESML',
-    }
+    """NSE/BSE indices with their yfinance symbols, from the instrument master"""
+    return get_universe().indices
 
 
 def get_nifty_500_stocks():
-    """Get NIFTY 500 stocks list with company names - comprehensive database"""
-    return {
-        # NIFTY 50 Stocks
-        'ADANIENT': 'Adani Enterprises Limited',
-        'ADANIPORTS': 'Adani Ports and Special Economic Zone Limited',
-        'APOLLOHOSP': 'Apollo Hospitals Enterprise Limited',
-        'ASIANPAINT': 'Asian Paints Limited',
-        'AXISBANK': 'Axis Bank Limited',
-        'BAJAJ-AUTO': 'Bajaj Auto Limited',
-        'BAJFINANCE': 'Bajaj Finance Limited',
-        'BAJAJFINSV': 'Bajaj Finserv Limited',
-        'BPCL': 'Bharat Petroleum Corporation Limited',
-        'BHARTIARTL': 'Bharti Airtel Limited',
-        'BRITANNIA': 'Britannia Industries Limited',
-        'CIPLA': 'Cipla Limited',
-        'COALINDIA': 'Coal India Limited',
-        'DIVISLAB': 'Divi\'s Laboratories Limited',
-        'DRREDDY': 'Dr. Reddy\'s Laboratories Limited',
-        'EICHERMOT': 'Eicher Motors Limited',
-        'GRASIM': 'Grasim Industries Limited',
-        'HCLTECH': 'HCL Technologies Limited',
-        'HDFCBANK': 'HDFC Bank Limited',
-        'HDFCLIFE': 'HDFC Life Insurance Company Limited',
-        'HEROMOTOCO': 'Hero MotoCorp Limited',
-        'HINDALCO': 'Hindalco Industries Limited',
-        'HINDUNILVR': 'Hindustan Unilever Limited',
-        'ICICIBANK': 'ICICI Bank Limited',
-        'ITC': 'ITC Limited',
-        'INDUSINDBK': 'IndusInd Bank Limited',
-        'INFY': 'Infosys Limited',
-        'JSWSTEEL': 'JSW Steel Limited',
-        'KOTAKBANK': 'Kotak Mahindra Bank Limited',
-        'LT': 'Larsen & Toubro Limited',
-        'M&M': 'Mahindra & Mahindra Limited',
-        'MARUTI': 'Maruti Suzuki India Limited',
-        'NESTLEIND': 'Nestle India Limited',
-        'NTPC': 'NTPC Limited',
-        'ONGC': 'Oil and Natural Gas Corporation Limited',
-        'POWERGRID': 'Power Grid Corporation of India Limited',
-        'RELIANCE': 'Reliance Industries Limited',
-        'SBILIFE': 'SBI Life Insurance Company Limited',
-        'SHREECEM': 'Shree Cement Limited',
-        'SBIN': 'State Bank of India',
-        'SUNPHARMA': 'Sun Pharmaceutical Industries Limited',
-        'TCS': 'Tata Consultancy Services Limited',
-        'TATACONSUM': 'Tata Consumer Products Limited',
-        'TATAMOTORS': 'Tata Motors Limited',
-        'TATASTEEL': 'Tata Steel Limited',
-        'TECHM': 'Tech Mahindra Limited',
-        'TITAN': 'Titan Company Limited',
-        'ULTRACEMCO': 'UltraTech Cement Limited',
-        'UPL': 'UPL Limited',
-        'WIPRO': 'Wipro Limited',
-        
-        # Additional popular stocks
-        'ABB': 'ABB India Limited',
-        'ACC': 'ACC Limited',
-        'AUBANK': 'AU Small Finance Bank Limited',
-        'ABBOTINDIA': 'Abbott India Limited',
-        'ADANIGREEN': 'Adani Green Energy Limited',
-        'ADANIPOWER': 'Adani Power Limited',
-        'ADANITRANS': 'Adani Transmission Limited',
-        'ADANIGAS': 'Adani Total Gas Limited',
-        'AMBUJACEM': 'Ambuja Cements Limited',
-        'APOLLOTYRE': 'Apollo Tyres Limited',
-        'ASHOKLEY': 'Ashok Leyland Limited',
-        'AUROPHARMA': 'Aurobindo Pharma Limited',
-        'BANDHANBNK': 'Bandhan Bank Limited',
-        'BERGEPAINT': 'Berger Paints India Limited',
-        'BIOCON': 'Biocon Limited',
-        'BOSCHLTD': 'Bosch Limited',
-        'CHOLAFIN': 'Cholamandalam Investment and Finance Company Limited',
-        'COLPAL': 'Colgate Palmolive (India) Limited',
-        'CONCOR': 'Container Corporation of India Limited',
-        'COROMANDEL': 'Coromandel International Limited',
-        'DABUR': 'Dabur India Limited',
-        'DLF': 'DLF Limited',
-        'DMART': 'Avenue Supermarts Limited',
-        'FEDERALBNK': 'Federal Bank Limited',
-        'GAIL': 'GAIL (India) Limited',
-        'GLAND': 'Gland Pharma Limited',
-        'GMRINFRA': 'GMR Infrastructure Limited',
-        'GODREJCP': 'Godrej Consumer Products Limited',
-        'GODREJPROP': 'Godrej Properties Limited',
-        'HAVELLS': 'Havells India Limited',
-        'HDFC': 'Housing Development Finance Corporation Limited',
-        'HDFCAMC': 'HDFC Asset Management Company Limited',
-        'ICICIPRULI': 'ICICI Prudential Life Insurance Company Limited',
-        'IDFCFIRSTB': 'IDFC First Bank Limited',
-        'IGL': 'Indraprastha Gas Limited',
-        'INDIAMART': 'IndiaMART InterMESH Limited',
-        'IOC': 'Indian Oil Corporation Limited',
-        'IRCTC': 'Indian Railway Catering and Tourism Corporation Limited',
-        'JINDALSTEL': 'Jindal Steel & Power Limited',
-        'JSWENERGY': 'JSW Energy Limited',
-        'LICI': 'Life Insurance Corporation of India',
-        'LTIM': 'LTIMindtree Limited',
-        'LUPIN': 'Lupin Limited',
-        'MARICO': 'Marico Limited',
-        'MFSL': 'Max Financial Services Limited',
-        'MPHASIS': 'Mphasis Limited',
-        'MRF': 'MRF Limited',
-        'NAUKRI': 'Info Edge (India) Limited',
-        'NMDC': 'NMDC Limited',
-        'OBEROIRLTY': 'Oberoi Realty Limited',
-        'OFSS': 'Oracle Financial Services Software Limited',
-        'PAGEIND': 'Page Industries Limited',
-        'PEL': 'Piramal Enterprises Limited',
-        'PERSISTENT': 'Persistent Systems Limited',
-        'PETRONET': 'Petronet LNG Limited',
-        'PIDILITIND': 'Pidilite Industries Limited',
-        'PIIND': 'PI Industries Limited',
-        'PNB': 'Punjab National Bank',
-        'POLYCAB': 'Polycab India Limited',
-        'PVR': 'PVR Limited',
-        'RBLBANK': 'RBL Bank Limited',
-        'RECLTD': 'REC Limited',
-        'SAIL': 'Steel Authority of India Limited',
-        'SBICARD': 'SBI Cards and Payment Services Limited',
-        'SIEMENS': 'Siemens Limited',
-        'SRF': 'SRF Limited',
-        'TORNTPHARM': 'Torrent Pharmaceuticals Limited',
-        'TRENT': 'Trent Limited',
-        'TVSMOTOR': 'TVS Motor Company Limited',
-        'VEDL': 'Vedanta Limited',
-        'VOLTAS': 'Voltas Limited',
-        'WHIRLPOOL': 'Whirlpool of India Limited',
-        'ZEEL': 'Zee Entertainment Enterprises Limited',
-        'ZOMATO': 'Zomato Limited',
-    }
+    """Active NSE stocks with company names, from the instrument master"""
+    return get_universe().stocks
+
+
+def get_stock_search_index():
+    """Symbol/company/index search index, built once per process per instrument import"""
+    universe = get_universe()
+    return get_search_index(
+        lambda: StockSearchIndex(universe.stocks, universe.indices), version=universe.version
+    )
+
+
+def search_index_hits(query, fuzzy_enabled=True):
+    """
+    (hits, match_mode) for an upper-cased query: index matches, else fuzzy
+    suggestions ('fuzzy') when enabled. Short symbol/name queries are cached
+    per instrument version, so workers reuse each other's lookups.
+    """
+    query = ' '.join(query.split())
+    universe = get_universe()
+    stock_limit = max(15, getattr(settings, 'STOCK_SEARCH_MAX_QUOTES', 10))
+    # Built first: cached hits are decoded against this index
+    search_index = get_stock_search_index()
+    search_cache = get_tier('search')
+    key = None
+    if CACHEABLE_SEARCH.fullmatch(query):
+        key = f'search:{universe.version}:{int(fuzzy_enabled)}:{stock_limit}:{query.replace(" ", "_")}'
+        cached = search_cache.get(key)
+        if cached is not None:
+            return cached
+
+    hits = search_index.search(query, stock_limit=stock_limit)
+    match_mode = 'exact'
+    # Nothing matched as typed: suggest close spellings from the index
+    # instead of probing upstream with guessed tickers
+    if not hits and fuzzy_enabled:
+        hits = search_index.suggest(query)
+        if hits:
+            match_mode = 'fuzzy'
+
+    if key is not None:
+        search_cache.set(key, (hits, match_mode), getattr(settings, 'STOCK_SEARCH_CACHE_TTL', 3600))
+    return hits, match_mode
+
+
+def get_user_settings(user):
+    """(capital, risk_percent) for user, through the user_settings cache tier"""
+    key = f'user_settings:{user.pk}'
+    settings_cache = get_tier('user_settings')
+    cached = settings_cache.get(key)
+    if cached is not None:
+        return cached
+
+    user_settings, created = UserSettings.objects.get_or_create(
+        user=user,
+        defaults={
+            'capital': Decimal('200000.00'),
+            'risk_percent': Decimal('1.00')
+        }
+    )
+    values = (user_settings.capital, user_settings.risk_percent)
+    # Saves delete the entry and invalidate every worker's L1 copy; the
+    # timeout bounds staleness from bulk updates, which send no signal
+    settings_cache.set(key, values, getattr(settings, 'USER_SETTINGS_CACHE_TTL', 3600))
+    return values
 
 
 
 # Replace this function in calc/views.py
 
-from .stock_utils import stock_fetcher
+from .quote_cache import get_quote, get_quotes, get_quotes_batch, quote_ttl
 
 def get_real_time_stock_data(symbol, symbol_type='stock'):
     """
-    Enhanced real-time stock/index data fetching with rate limiting
+    Enhanced real-time stock/index data fetching, served from the shared
+    per-symbol quote cache
     """
-    return stock_fetcher.get_stock_data(symbol, symbol_type)
+    return get_quote(symbol, symbol_type)
 # Alternative: Add this as a fallback API function
 def get_stock_data_alternative_api(symbol):
     """
@@ -592,115 +473,126 @@ def get_stock_data_alternative_api(symbol):
 def search_stocks(request):
     """Enhanced API endpoint for comprehensive NSE stock search with real-time data"""
     try:
+        started = time.monotonic()
         query = request.GET.get('q', '').strip().upper()
+        # fuzzy=0 disables typo-tolerant suggestions when nothing matches exactly
+        fuzzy_enabled = request.GET.get('fuzzy', '1') != '0'
         
         if len(query) < 1:
             return JsonResponse({'stocks': []})
         
-        # Check cache first (2-minute cache for real-time data)
-        cache_key = f'stock_search_realtime_{query}'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.info(f"Serving cached result for query: {query}")
-            return JsonResponse({
-                'stocks': cached_result,
-                'cached': True,
-                'query': query
-            })
-        
+        # Results are assembled per request; quotes come from the per-symbol
+        # quote cache, so "REL", "RELI" and "RELIANCE" share one RELIANCE quote
         stocks = []
-        nifty_500_stocks = get_nifty_500_stocks()
-        nse_indices = get_comprehensive_nse_indices()
+        search_index = get_stock_search_index()
+        hits, match_mode = search_index_hits(query, fuzzy_enabled)
+        
+        # Fetch every candidate quote concurrently under one deadline; quotes
+        # that miss it are returned as pending instead of holding the request
+        max_quotes = getattr(settings, 'STOCK_SEARCH_MAX_QUOTES', 10)
+        deadline = getattr(settings, 'STOCK_SEARCH_DEADLINE', 3.0)
+        index_hits = [hit for hit in hits if hit.kind == 'index']
+        stock_hits = [hit for hit in hits if hit.kind == 'stock'][:max_quotes]
+        # A user is waiting: these calls may spend the rate-limit tokens that
+        # background refresh jobs leave in reserve
+        with request_priority(INTERACTIVE):
+            quotes = get_quotes(
+                [(hit.ticker, 'index') for hit in index_hits]
+                + [(hit.symbol, 'stock') for hit in stock_hits],
+                timeout=deadline
+            )
         
-        # Priority 1: Check for exact index matches
+        # Priority 1: Index matches
         index_matches = []
-        for index_name, yf_symbol in nse_indices.items():
-            if query == index_name or (len(query) >= 3 and query in index_name):
-                try:
-                    real_time_data = get_real_time_stock_data(yf_symbol, 'index')
-                    
-                    if real_time_data.get('success'):
-                        index_matches.append({
-                            'symbol': index_name,
-                            'company_name': f'{index_name} Index',
-                            'last_price': real_time_data['last_price'],
-                            'change': real_time_data['change'],
-                            'change_amount': real_time_data['change_amount'],
-                            'volume': real_time_data.get('volume', 0),
-                            'market_cap': 0,  # Not applicable for indices
-                            'type': 'index',
-                            'priority': 1,
-                            'data_source': real_time_data.get('data_source', 'unknown')
-                        })
-                except Exception as e:
-                    logger.warning(f"Failed to get real-time data for index {index_name}: {str(e)}")
-                    continue
-                
-                # Limit index results to prevent timeout
-                if len(index_matches) >= 3:
-                    break
-        
-        # Priority 2: Search in NIFTY 500 stocks
-        stock_matches = []
-        
-        # Exact symbol matches first
-        if query in nifty_500_stocks:
-            stock_matches.append((query, nifty_500_stocks[query], 1))
-        
-        # Partial symbol matches
-        for symbol, company_name in nifty_500_stocks.items():
-            if query != symbol and query in symbol:
-                stock_matches.append((symbol, company_name, 2))
-                if len(stock_matches) >= 15:
-                    break
-        
-        # Company name matches
-        if len(stock_matches) < 15:
-            for symbol, company_name in nifty_500_stocks.items():
-                if query in company_name.upper() and not any(s[0] == symbol for s in stock_matches):
-                    stock_matches.append((symbol, company_name, 3))
-                    if len(stock_matches) >= 15:
-                        break
+        for hit in index_hits:
+            real_time_data = quotes[(hit.ticker, 'index')]
+            
+            if real_time_data is None:
+                index_matches.append({
+                    'symbol': hit.symbol,
+                    'company_name': hit.name,
+                    'last_price': 0.00,
+                    'change': 0.00,
+                    'change_amount': 0.00,
+                    'volume': 0,
+                    'market_cap': 0,
+                    'type': 'index',
+                    'priority': hit.priority,
+                    'match_score': hit.score,
+                    'pending': True,
+                    'data_source': 'pending'
+                })
+            elif real_time_data.get('success'):
+                index_matches.append({
+                    'symbol': hit.symbol,
+                    'company_name': hit.name,
+                    'last_price': real_time_data['last_price'],
+                    'change': real_time_data['change'],
+                    'change_amount': real_time_data['change_amount'],
+                    'volume': real_time_data.get('volume', 0),
+                    'market_cap': 0,  # Not applicable for indices
+                    'type': 'index',
+                    'priority': hit.priority,
+                    'match_score': hit.score,
+                    'stale': real_time_data.get('stale', False),
+                    'data_source': real_time_data.get('data_source', 'unknown')
+                })
+            else:
+                logger.warning(f"Failed to get real-time data for index {hit.symbol}: {real_time_data.get('error')}")
         
-        # Fetch real-time data for stocks (limit to 10 to prevent timeout)
+        # Priority 2: Stock matches (exact symbol, partial symbol, company name)
         stock_results = []
-        for symbol, company_name, priority in stock_matches[:10]:
-            try:
-                real_time_data = get_real_time_stock_data(symbol, 'stock')
-                
-                if real_time_data.get('success'):
-                    stock_results.append({
-                        'symbol': symbol,
-                        'company_name': company_name,
-                        'last_price': real_time_data['last_price'],
-                        'change': real_time_data['change'],
-                        'change_amount': real_time_data['change_amount'],
-                        'volume': real_time_data.get('volume', 0),
-                        'market_cap': real_time_data.get('market_cap', 0),
-                        'type': 'stock',
-                        'priority': priority,
-                        'data_source': real_time_data.get('data_source', 'unknown'),
-                        'note': real_time_data.get('note', '')
-                    })
-                else:
-                    # Include stock with error info
-                    stock_results.append({
-                        'symbol': symbol,
-                        'company_name': company_name,
-                        'last_price': 0.00,
-                        'change': 0.00,
-                        'change_amount': 0.00,
-                        'volume': 0,
-                        'market_cap': 0,
-                        'type': 'stock',
-                        'priority': priority,
-                        'error': real_time_data.get('error', 'Data unavailable'),
-                        'data_source': 'error'
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error processing stock {symbol}: {str(e)}")
-                continue
+        for hit in stock_hits:
+            real_time_data = quotes[(hit.symbol, 'stock')]
+            
+            if real_time_data is None:
+                # Quote still in flight; the client can search again shortly
+                stock_results.append({
+                    'symbol': hit.symbol,
+                    'company_name': hit.name,
+                    'last_price': 0.00,
+                    'change': 0.00,
+                    'change_amount': 0.00,
+                    'volume': 0,
+                    'market_cap': 0,
+                    'type': 'stock',
+                    'priority': hit.priority,
+                    'match_score': hit.score,
+                    'pending': True,
+                    'data_source': 'pending'
+                })
+            elif real_time_data.get('success'):
+                stock_results.append({
+                    'symbol': hit.symbol,
+                    'company_name': hit.name,
+                    'last_price': real_time_data['last_price'],
+                    'change': real_time_data['change'],
+                    'change_amount': real_time_data['change_amount'],
+                    'volume': real_time_data.get('volume', 0),
+                    'market_cap': real_time_data.get('market_cap', 0),
+                    'type': 'stock',
+                    'priority': hit.priority,
+                    'match_score': hit.score,
+                    'stale': real_time_data.get('stale', False),
+                    'data_source': real_time_data.get('data_source', 'unknown'),
+                    'note': real_time_data.get('note', '')
+                })
+            else:
+                # Include stock with error info
+                stock_results.append({
+                    'symbol': hit.symbol,
+                    'company_name': hit.name,
+                    'last_price': 0.00,
+                    'change': 0.00,
+                    'change_amount': 0.00,
+                    'volume': 0,
+                    'market_cap': 0,
+                    'type': 'stock',
+                    'priority': hit.priority,
+                    'match_score': hit.score,
+                    'error': real_time_data.get('error', 'Data unavailable'),
+                    'data_source': 'error'
+                })
         
         # Combine and sort results
         all_results = index_matches + stock_results
@@ -716,50 +608,55 @@ def search_stocks(request):
             else:
                 return (priority, symbol)  # By priority then alphabetically
         
-        all_results.sort(key=sort_key)
+        if match_mode == 'fuzzy':
+            # Suggestions keep the index's ranking by similarity
+            all_results.sort(key=lambda item: -item['match_score'])
+        else:
+            all_results.sort(key=sort_key)
         
         # Limit results
-        stocks = all_results[:12]
+        stocks = all_results[:getattr(settings, 'STOCK_SEARCH_MAX_RESULTS', 12)]
         
-        # If no results found, try direct yfinance search
-        if not stocks:
+        # If no results found, try the query as a ticker upstream, within
+        # what is left of the deadline; only ticker-like queries are probed
+        if not stocks and CACHEABLE_SEARCH.fullmatch(query):
             logger.info(f"No matches found, trying direct search for: {query}")
             direct_patterns = [f"{query}.NS", f"{query}.BO", query]
+            with request_priority(INTERACTIVE):
+                direct_quotes = get_quotes(
+                    [(pattern, 'stock') for pattern in direct_patterns],
+                    timeout=max(0.0, deadline - (time.monotonic() - started))
+                )
             for pattern in direct_patterns:
-                try:
-                    real_time_data = get_real_time_stock_data(pattern, 'stock')
-                    
-                    if real_time_data.get('success'):
-                        stocks.append({
-                            'symbol': query,
-                            'company_name': real_time_data.get('company_name', query),
-                            'last_price': real_time_data['last_price'],
-                            'change': real_time_data['change'],
-                            'change_amount': real_time_data['change_amount'],
-                            'volume': real_time_data.get('volume', 0),
-                            'market_cap': real_time_data.get('market_cap', 0),
-                            'type': 'stock',
-                            'note': 'Direct search result',
-                            'data_source': real_time_data.get('data_source', 'direct')
-                        })
-                        break
-                except Exception as e:
-                    logger.error(f"Direct search failed for {pattern}: {str(e)}")
-                    continue
-        
-        # Cache results for 2 minutes (real-time data)
-        if stocks:
-            cache.set(cache_key, stocks, 120)  # 2 minutes cache
-            logger.info(f"Cached {len(stocks)} results for query: {query}")
+                real_time_data = direct_quotes[(pattern, 'stock')]
+                
+                if real_time_data and real_time_data.get('success'):
+                    stocks.append({
+                        'symbol': query,
+                        'company_name': real_time_data.get('company_name', query),
+                        'last_price': real_time_data['last_price'],
+                        'change': real_time_data['change'],
+                        'change_amount': real_time_data['change_amount'],
+                        'volume': real_time_data.get('volume', 0),
+                        'market_cap': real_time_data.get('market_cap', 0),
+                        'type': 'stock',
+                        'note': 'Direct search result',
+                        'data_source': real_time_data.get('data_source', 'direct')
+                    })
+                    break
+        
+        # Feeds the refresh scheduler: searched symbols are refreshed sooner
+        record_search_demand(stock['symbol'] for stock in stocks[:3] if stock['type'] == 'stock')
         
         return JsonResponse({
             'stocks': stocks,
             'total_found': len(stocks),
             'query': query,
+            'match_mode': match_mode,
             'data_source': 'Real-time + NIFTY 500 + NSE Indices',
-            'indices_available': len(nse_indices),
-            'stocks_database_size': len(nifty_500_stocks),
-            'cache_duration': '2 minutes',
+            'indices_available': search_index.index_count,
+            'stocks_database_size': search_index.stock_count,
+            'cache_duration': f"{quote_ttl('stock')} seconds per quote",
             'timestamp': timezone.now().isoformat()
         })
         
@@ -875,55 +772,76 @@ def search_stocks(request):
         })
 
 
-def update_stock_database():
+def update_stock_database(symbols=None, time_budget=None, force=False, batch_size=25):
     """
     Background task to update stock database periodically
     Call this from a Django management command or celery task
+    
+    Refreshes the symbols that are due (per the NSE session calendar), most
+    overdue first (oldest check, weighted by how often they are searched and
+    saved), until time_budget seconds are spent; the next run picks up where
+    this one stopped.
     """
     stock_list = get_nifty_500_stocks()
+    if time_budget is None:
+        time_budget = getattr(settings, 'STOCK_REFRESH_TIME_BUDGET', 60)
+    
+    # The market-hours scheduler decides what is due: every few seconds for
+    # indices and F&O names in session, once after the close overnight
+    order = refresh_order(symbols or list(stock_list), force=force)
     updated_count = 0
     failed_count = 0
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'touched': 0}
+    # Saved rows go to the quote snapshot in one write at the end of the pass
+    saved_rows = []
     
-    logger.info(f"Starting database update for {len(stock_list)} stocks")
+    logger.info(f"Starting database update: {len(order)} of {len(symbols or stock_list)} stocks due")
     
-    for symbol, company_name in list(stock_list.items())[:50]:  # Limit to prevent timeout
-        try:
-            real_time_data = get_real_time_stock_data(symbol, 'stock')
-            
-            if real_time_data.get('success'):
-                stock_obj, created = StockData.objects.update_or_create(
-                    symbol=symbol,
-                    defaults={
-                        'company_name': company_name,
-                        'last_price': real_time_data['last_price'],
-                        'change': real_time_data['change_amount'],
-                        'pchange': real_time_data['change'],
-                        'volume': real_time_data.get('volume', 0),
-                        'market_cap': real_time_data.get('market_cap'),
-                        'is_active': True,
-                    }
-                )
-                updated_count += 1
-                
-                if created:
-                    logger.info(f"Created new stock entry: {symbol}")
-                else:
-                    logger.debug(f"Updated stock: {symbol}")
-                    
+    deadline = time.monotonic() + time_budget
+    attempted = 0
+    for start in range(0, len(order), batch_size):
+        if time.monotonic() >= deadline:
+            break
+        
+        batch = order[start:start + batch_size]
+        attempted += len(batch)
+        quotes = get_quotes_batch(batch, 'stock', refresh=True)
+        
+        rows = []
+        for symbol in batch:
+            real_time_data = quotes[symbol]
+            row = quote_row(symbol, real_time_data, stock_list.get(symbol))
+            if row:
+                rows.append(row)
             else:
                 failed_count += 1
                 logger.warning(f"Failed to get data for {symbol}: {real_time_data.get('error', 'Unknown error')}")
-                
+        
+        try:
+            batch_counts = bulk_upsert_stocks(rows, snapshot=False)
+            mark_checked(row['symbol'] for row in rows)
+            saved_rows.extend(rows)
+            updated_count += len(rows)
+            for key in counts:
+                counts[key] += batch_counts[key]
         except Exception as e:
-            failed_count += 1
-            logger.error(f"Exception updating {symbol}: {str(e)}")
-            continue
+            failed_count += len(rows)
+            logger.error(f"Exception saving {len(rows)} stocks: {str(e)}")
+    
+    if saved_rows:
+        publish_snapshot(saved_rows)
     
-    logger.info(f"Database update completed. Updated: {updated_count}, Failed: {failed_count}")
+    remaining = len(order) - attempted
+    logger.info(f"Database update completed. Updated: {updated_count}, Failed: {failed_count}, Remaining: {remaining}")
     return {
         'updated': updated_count,
         'failed': failed_count,
-        'total_attempted': updated_count + failed_count
+        'total_attempted': updated_count + failed_count,
+        'created': counts['created'],
+        'changed': counts['updated'],
+        'unchanged': counts['unchanged'],
+        'touched': counts['touched'],
+        'remaining': remaining,
     }
 
 
@@ -1,9 +1,48 @@
-import yfinance as yf
-import pandas as pd
-import time
+import logging
 from decimal import Decimal
 from datetime import datetime
-import requests
+from .http_replay import replayable
+from .instruments import get_universe
+from .rate_limiter import throttle
+
+logger = logging.getLogger(__name__)
+
+# Seconds an interactive caller waits for a Yahoo request slot
+THROTTLE_TIMEOUT = 10
+
+def _bar_time(hist):
+    """Timestamp of the last bar, as an aware datetime (daily bars can come back naive)"""
+    stamp = hist.index[-1]
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize('Asia/Kolkata')
+    return stamp.to_pydatetime()
+
+# yfinance does its own HTTP; these are the calls the record/replay harness captures.
+# yfinance (and pandas with it) is imported on first use: it costs every
+# worker hundreds of ms and tens of MB, and most never call Yahoo.
+@replayable('yahoo.info')
+def _ticker_info(symbol):
+    import yfinance as yf
+    return yf.Ticker(symbol).info
+
+@replayable('yahoo.history')
+def _ticker_history(symbol, period):
+    import yfinance as yf
+    return yf.Ticker(symbol).history(period=period)
+
+@replayable('yahoo.download')
+def _download(tickers):
+    import yfinance as yf
+    # 5 days so the previous close is there even after a holiday
+    return yf.download(
+        tickers=tickers,
+        period="5d",
+        interval="1d",
+        group_by="ticker",
+        auto_adjust=False,
+        threads=True,
+        progress=False,
+    )
 
 class YahooNSEFetcher:
     def __init__(self):
@@ -11,64 +50,16 @@ class YahooNSEFetcher:
         self.nse_symbols = self._get_comprehensive_nse_list()
     
     def _get_comprehensive_nse_list(self):
-        """Get comprehensive list of NSE stocks with .NS suffix"""
-        # Major NSE stocks - you can expand this list
-        symbols = [
-            'RELIANCE', 'TCS', 'HDFCBANK', 'INFY', 'HINDUNILVR', 'ICICIBANK',
-            'KOTAKBANK', 'BHARTIARTL', 'ITC', 'SBIN', 'BAJFINANCE', 'ASIANPAINT',
-            'MARUTI', 'HCLTECH', 'WIPRO', 'ADANIPORTS', 'APOLLOHOSP', 'AXISBANK',
-            'BAJAJ-AUTO', 'BAJAJFINSV', 'BPCL', 'BRITANNIA', 'CIPLA', 'COALINDIA',
-            'DIVISLAB', 'DRREDDY', 'EICHERMOT', 'GRASIM', 'HEROMOTOCO', 'HINDALCO',
-            'HDFC', 'INDUSINDBK', 'IOC', 'JSWSTEEL', 'M&M', 'NESTLEIND', 'NTPC',
-            'ONGC', 'POWERGRID', 'SUNPHARMA', 'TATAMOTORS', 'TATASTEEL', 'TECHM',
-            'TITAN', 'ULTRACEMCO', 'UPL', 'LT', 'ADANIENT', 'ADANIGREEN',
-            'AMBUJACEM', 'APOLLOTYRE', 'ASHOKLEY', 'AUROPHARMA', 'BANKINDIA',
-            'BERGEPAINT', 'BIOCON', 'BOSCHLTD', 'CANBK', 'COLPAL', 'CONCOR',
-            'CUMMINSIND', 'DABUR', 'DALBHARAT', 'DLF', 'FEDERALBNK', 'GAIL',
-            'GLENMARK', 'GODREJCP', 'HAVELLS', 'HDFCLIFE', 'HINDZINC', 'IBULHSGFIN',
-            'IDEA', 'IDFCFIRSTB', 'IGL', 'INDIANB', 'INDIGO', 'JINDALSTEL',
-            'JSWENERGY', 'JUBLFOOD', 'LICHSGFIN', 'LUPIN', 'MARICO', 'MINDTREE',
-            'MOTHERSUMI', 'MRF', 'MUTHOOTFIN', 'NATIONALUM', 'NAUKRI', 'NMDC',
-            'OFSS', 'OIL', 'PAGEIND', 'PEL', 'PETRONET', 'PFC', 'PIDILITIND',
-            'PNB', 'POLYCAB', 'PVR', 'RAMCOCEM', 'RBLBANK', 'RECLTD', 'SAIL',
-            'SHREECEM', 'SIEMENS', 'SRF', 'SUNTV', 'TATACOMM', 'TATACONSUM',
-            'TATAPOWER', 'TORNTPHARM', 'TRENT', 'TVSMOTOR', 'UBL', 'UNIONBANK',
-            'VEDL', 'VOLTAS', 'WHIRLPOOL', 'YESBANK', 'ZEEL', 'ACC', 'ADANIPOWER',
-            'ALBK', 'AMARAJABAT', 'ARVIND', 'ASHOKLEY', 'ASTRAZEN', 'ATUL',
-            'AUROPHARMA', 'BALRAMCHIN', 'BANDHANBNK', 'BANKBARODA', 'BATAINDIA',
-            'BEL', 'BHARATFORG', 'BHARTIARTL', 'BHEL', 'BIOCON', 'BLISSGVS',
-            'BOSCHLTD', 'BSOFT', 'CADILAHC', 'CANBK', 'CANFINHOME', 'CHAMBLFERT',
-            'CHOLAFIN', 'CROMPTON', 'CUB', 'DELTACORP', 'DIXON', 'EQUITAS',
-            'ESCORTS', 'EXIDEIND', 'FEDERALBNK', 'FORTIS', 'FSL', 'GICRE',
-            'GMRINFRA', 'GNFC', 'GODREJPROP', 'GRANULES', 'GRAPHITE', 'GSPL',
-            'GUJGASLTD', 'HEIDELBERG', 'HONAUT', 'IBREALEST', 'IDBI', 'IDFC',
-            'IFCI', 'IIFL', 'INDHOTEL', 'INDUSTOWER', 'INFIBEAM', 'IRB',
-            'IRCTC', 'ISEC', 'ITC', 'JETAIRWAYS', 'JINDALSTEL', 'JKCEMENT',
-            'JKLAKSHMI', 'JMFINANCIL', 'JSWENERGY', 'JUSTDIAL', 'KAJARIACER',
-            'KANSAINER', 'KTKBANK', 'L&TFH', 'LALPATHLAB', 'LAURUSLABS',
-            'LICI', 'LTIM', 'MANAPPURAM', 'MAZDOCK', 'METROPOLIS', 'MFSL',
-            'MGL', 'MHRIL', 'MIDHANI', 'MOTILALOFS', 'MPHASIS', 'MSM',
-            'NBCC', 'NETWORK18', 'NIACL', 'NLCINDIA', 'OBEROIRLTY', 'OFSS',
-            'ORIENTREF', 'PAYTM', 'PERSISTENT', 'POLICYBZR', 'POONAWALLA',
-            'PRAJIND', 'PRESTIGE', 'RAIN', 'RAJESHEXPO', 'REDINGTON',
-            'RELAXO', 'RNAM', 'ROUTE', 'RPOWER', 'RVNL', 'SCHAEFFLER',
-            'SHILPAMED', 'SHOPERSTOP', 'SOBHA', 'SPANDANA', 'STARHEALTH',
-            'SUNTECK', 'SUPRAJIT', 'SUZLON', 'SYMPHONY', 'TEAMLEASE',
-            'TIINDIA', 'TIMKEN', 'TIPSINDLTD', 'TITAGARH', 'TRIDENT',
-            'TRITURBINE', 'UJJIVAN', 'UNICHEMLAB', 'UNOMINDA', 'VGUARD',
-            'VINATIORGA', 'VSTIND', 'WELCORP', 'WELSPUNIND', 'WESTLIFE',
-            'ZENTEC', 'ZOMATO', 'ZYDUSLIFE'
-        ]
-        
-        # Add .NS suffix for Yahoo Finance
-        return [f"{symbol}.NS" for symbol in symbols]
+        """Yahoo tickers (.NS suffix) of the active stocks in the instrument master"""
+        return list(get_universe().yahoo_tickers.values())
     
     def fetch_stock_data(self, symbol):
         """Fetch data for a single stock"""
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            hist = ticker.history(period="1d")
+            throttle('yahoo', THROTTLE_TIMEOUT)
+            info = _ticker_info(symbol)
+            throttle('yahoo', THROTTLE_TIMEOUT)
+            hist = _ticker_history(symbol, "1d")
             
             if hist.empty:
                 return None
@@ -89,35 +80,101 @@ class YahooNSEFetcher:
                 'open': float(hist['Open'].iloc[-1]) if not hist['Open'].empty else 0,
                 'high': float(hist['High'].iloc[-1]) if not hist['High'].empty else 0,
                 'low': float(hist['Low'].iloc[-1]) if not hist['Low'].empty else 0,
+                'quote_time': _bar_time(hist),
             }
         except Exception as e:
-            print(f"Error fetching {symbol}: {e}")
+            logger.error(f"Error fetching {symbol}: {e}")
             return None
     
+    def fetch_batch(self, symbols, chunk_size=100):
+        """
+        Fetch OHLCV for many symbols with chunked multi-ticker downloads.
+        Prices only: company_name and market_cap are None (see fetch_metadata).
+        """
+        import pandas as pd
+
+        symbols = list(dict.fromkeys(symbols))
+        stocks = []
+        
+        for start in range(0, len(symbols), chunk_size):
+            chunk = symbols[start:start + chunk_size]
+            try:
+                throttle('yahoo', THROTTLE_TIMEOUT)
+                data = _download(chunk)
+            except Exception as e:
+                logger.error(f"Error downloading chunk {start // chunk_size + 1}: {e}")
+                continue
+            
+            for symbol in chunk:
+                try:
+                    hist = data[symbol] if isinstance(data.columns, pd.MultiIndex) else data
+                    hist = hist.dropna(subset=['Close'])
+                    if hist.empty:
+                        continue
+                    
+                    last = hist.iloc[-1]
+                    current_price = float(last['Close'])
+                    prev_close = float(hist['Close'].iloc[-2]) if len(hist) > 1 else current_price
+                    change = current_price - prev_close
+                    pchange = (change / prev_close) * 100 if prev_close > 0 else 0
+                    
+                    stocks.append({
+                        'symbol': symbol.replace('.NS', ''),
+                        'company_name': None,
+                        'last_price': current_price,
+                        'change': float(change),
+                        'pchange': float(pchange),
+                        'volume': int(last['Volume']) if not pd.isna(last['Volume']) else 0,
+                        'market_cap': None,
+                        'open': float(last['Open']),
+                        'high': float(last['High']),
+                        'low': float(last['Low']),
+                        'quote_time': _bar_time(hist),
+                    })
+                except Exception as e:
+                    logger.warning(f"Error reading {symbol}: {e}")
+            
+            logger.debug(f"Chunk {start // chunk_size + 1}: {min(start + chunk_size, len(symbols))}/{len(symbols)} symbols")
+        
+        return stocks
+    
+    def fetch_metadata(self, symbols):
+        """Slow per-symbol metadata (long name, market cap); refresh about once a day"""
+        metadata = {}
+        for symbol in dict.fromkeys(symbols):
+            ticker_symbol = symbol if symbol.endswith('.NS') else f"{symbol}.NS"
+            try:
+                throttle('yahoo')
+                info = _ticker_info(ticker_symbol)
+                metadata[ticker_symbol.replace('.NS', '')] = {
+                    'company_name': info.get('longName') or ticker_symbol.replace('.NS', ''),
+                    'market_cap': info.get('marketCap') or 0,
+                }
+            except Exception as e:
+                logger.warning(f"Error fetching metadata for {ticker_symbol}: {e}")
+        return metadata
+    
     def fetch_all_stocks(self, max_stocks=None):
         """Fetch data for all stocks"""
         symbols_to_fetch = self.nse_symbols[:max_stocks] if max_stocks else self.nse_symbols
         stocks = []
         
-        print(f"Fetching live data for {len(symbols_to_fetch)} stocks from Yahoo Finance...")
+        logger.info(f"Fetching live data for {len(symbols_to_fetch)} stocks from Yahoo Finance...")
         
         for i, symbol in enumerate(symbols_to_fetch):
             try:
                 stock_data = self.fetch_stock_data(symbol)
                 if stock_data:
                     stocks.append(stock_data)
-                    print(f"[{i+1}/{len(symbols_to_fetch)}] ✓ {stock_data['symbol']} - ₹{stock_data['last_price']:.2f}")
+                    logger.debug(f"[{i+1}/{len(symbols_to_fetch)}] ✓ {stock_data['symbol']} - ₹{stock_data['last_price']:.2f}")
                 else:
-                    print(f"[{i+1}/{len(symbols_to_fetch)}] ✗ {symbol} - No data")
-                
-                # Rate limiting to avoid being blocked
-                time.sleep(0.1)
+                    logger.debug(f"[{i+1}/{len(symbols_to_fetch)}] ✗ {symbol} - No data")
                 
             except Exception as e:
-                print(f"Error processing {symbol}: {e}")
+                logger.error(f"Error processing {symbol}: {e}")
                 continue
         
-        print(f"\nSuccessfully fetched live data for {len(stocks)} stocks!")
+        logger.info(f"Successfully fetched live data for {len(stocks)} stocks!")
         return stocks
     
     def get_stock_by_symbol(self, symbol):
@@ -209,3 +209,108 @@ RAZORPAY_WEBHOOK_SECRET = 'your_webhook_secret'
 RAZORPAY_KEY_ID = 'placeholder_key_id'
 RAZORPAY_KEY_SECRET = 'placeholder_key_secret'
 RAZORPAY_WEBHOOK_SECRET = 'placeholder_webhook_secret'
+
+# Live quote cache: quotes are fresh for `soft` seconds, then served stale
+# while refreshed in the background, and dropped after `hard`. Defaults per
+# asset type are in calc/quote_cache.py; override them with QUOTE_CACHE_TTLS,
+# e.g. {'stock': {'soft': 30, 'hard': 600}}.
+
+# Stock search: quotes fetched per search (concurrently, within the deadline
+# in seconds; late quotes come back as pending) and results returned
+STOCK_SEARCH_MAX_QUOTES = 10
+STOCK_SEARCH_DEADLINE = 3.0
+STOCK_SEARCH_MAX_RESULTS = 12
+QUOTE_FANOUT_WORKERS = 16
+
+# update_stocks: seconds of work per run
+STOCK_REFRESH_TIME_BUDGET = 60
+
+# Refresh cadence in seconds per NSE session phase and symbol tier; None means
+# refresh once after the session ends. Defaults are in calc/market_calendar.py;
+# override whole phases with STOCK_REFRESH_CADENCE.
+
+# NSE trading holidays (YYYY-MM-DD), from the exchange's annual circular.
+# Add the next year's list when NSE publishes it; the scheduler logs a
+# warning when the current year has no dates here.
+NSE_HOLIDAYS = [
+    '2025-02-26', '2025-03-14', '2025-03-31', '2025-04-10', '2025-04-14',
+    '2025-04-18', '2025-05-01', '2025-08-15', '2025-08-27', '2025-10-02',
+    '2025-10-21', '2025-10-22', '2025-11-05', '2025-12-25',
+    '2026-01-15', '2026-01-26', '2026-03-03', '2026-03-26', '2026-03-31',
+    '2026-04-03', '2026-04-14', '2026-05-01', '2026-05-28', '2026-06-26',
+    '2026-09-14', '2026-10-02', '2026-10-20', '2026-11-10', '2026-11-24',
+    '2026-12-25',
+]
+
+# Quote providers in preference order (see calc/quote_providers.py); the
+# router reorders them by measured latency and error rate and fails over down
+# the list. current_estimates (static prices) is only used when all else fails.
+QUOTE_PROVIDERS = ['nse_bulk', 'nse', 'yahoo', 'current_estimates']
+# Per-request upstream timeout in seconds
+QUOTE_PROVIDER_TIMEOUT = 5
+
+# Circuit breakers around upstream endpoints (calc/circuit_breaker.py), shared
+# by all workers through the cache. Per-endpoint overrides go under their name,
+# e.g. 'nse:quote-equity'. Set CIRCUIT_BREAKERS only to change the defaults.
+
+# Upstream request budgets shared by all workers through the cache
+# (calc/rate_limiter.py): requests per second, burst size, and tokens held
+# back for interactive searches. Override per provider with RATE_LIMITS.
+
+# Connection pools of the shared HTTP client (calc/http_client.py): per-host
+# changes to its default limits ('default' applies to every host)
+HTTP_POOL_LIMITS = {
+    'www.nseindia.com': {'max_connections': 8, 'max_keepalive_connections': 8},
+}
+
+# Record/replay of upstream calls (calc/http_replay.py): HTTP_REPLAY_MODE=record
+# captures live responses as fixtures, =replay serves them offline with the
+# injected latency and error rate. Off unless set.
+HTTP_REPLAY = {
+    'mode': config('HTTP_REPLAY_MODE', default='') or None,
+    'fixtures_dir': BASE_DIR / 'fixtures' / 'http',
+    'latency': config('HTTP_REPLAY_LATENCY', default=0.0, cast=float),
+    'jitter': 0.0,
+    'error_rate': config('HTTP_REPLAY_ERROR_RATE', default=0.0, cast=float),
+    'error_status': None,
+}
+
+# Memory-mapped quote snapshot shared by all workers on a host
+# (calc/quote_snapshot.py); written by every StockData refresh
+QUOTE_SNAPSHOT_PATH = config('QUOTE_SNAPSHOT_PATH', default=str(BASE_DIR / 'var' / 'quotes.snap'))
+
+# Cache shared by all workers. Redis when REDIS_URL is set; otherwise a
+# file-based cache under var/ (calc/cache_backends.py) whose add/incr are
+# atomic between the workers of one host only. Set REDIS_URL as soon as more
+# than one host (or container) serves the app: the fill locks, circuit
+# breakers and rate limits are only shared through the cache. Each worker
+# keeps a small LRU in front of it (calc/tiered_cache.py).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'calc.cache_backends.HostFileCache',
+            'LOCATION': str(BASE_DIR / 'var' / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+# Per-worker L1 of the tiered cache: entries kept per namespace, and seconds
+# an entry is trusted before re-reading the shared cache. Defaults are in
+# calc/tiered_cache.py; override per namespace with TIERED_CACHE.
+
+# Cached quotes, search index and search counters are saved here every
+# CACHE_PERSIST_INTERVAL seconds and at shutdown (by one process per host),
+# and reloaded by start.sh and each booting worker (calc/cache_persistence.py).
+# The default under var/ only survives worker restarts: Render's filesystem
+# is reset on every deploy and instance restart, so mount a Render Disk and
+# set CACHE_PERSIST_DIR to a directory on it (e.g. /var/data/warm).
+CACHE_PERSIST_DIR = config('CACHE_PERSIST_DIR', default=str(BASE_DIR / 'var' / 'warm'))
+CACHE_PERSIST_INTERVAL = config('CACHE_PERSIST_INTERVAL', default=300, cast=int)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'risk_calculator.settings')
 
 application = get_wsgi_application()
+
+# Each worker starts from the caches persisted by the previous ones
+from calc import cache_persistence  # noqa: E402
+
+cache_persistence.start()
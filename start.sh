@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+# Start command: prime the caches from CACHE_PERSIST_DIR (and the providers)
+# before any worker takes traffic, then hand over to gunicorn
+set -o errexit
+python manage.py warm_caches || echo "Cache warm-up failed, workers will start cold"
+exec gunicorn risk_calculator.wsgi:application "$@"